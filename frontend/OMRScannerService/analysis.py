@@ -0,0 +1,120 @@
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+
+from answer_key import CHOICES, POPCOUNT, load_answer_key, set_file_name
+from scoring import MarkBatch
+from results_store import load_results
+
+# --- Item Analysis ---
+# Classical test statistics for a whole exam from its (sheets x questions x 4) mark tensor, all as NumPy reductions:
+#   difficulty      share of sheets answering the question correctly (p)
+#   discrimination  corrected point-biserial: correlation of the item with the total score of the other items
+#   options         share of sheets choosing A..D, leaving it blank or marking several bubbles
+#   KR-20           internal-consistency reliability of the keyed questions
+OPTION_LABELS = list(CHOICES) + ['Blank', 'Multi']
+# Option index per 4-bit marked mask: 0-3 for a single choice, 4 blank, 5 several marks
+OPTION_CODE = np.array([4 if bits == 0 else bits.bit_length() - 1 if POPCOUNT[bits] == 1 else 5 for bits in range(16)], dtype=np.int8)
+HARD, EASY, LOW_DISCRIMINATION = 0.2, 0.9, 0.2
+
+def option_codes(batch):
+    """(S, Q) option index per sheet and question: 0-3 a single choice, 4 blank, 5 several marks, -1 not detected."""
+    return np.where(batch.detected, OPTION_CODE[batch.marked_bits], -1)
+
+def item_analysis(batch, key):
+    """Item statistics over every sheet of batch with at least one detected question. Returns a dict of arrays and scalars."""
+    graded = batch.detected.any(axis=1)
+    question_count = batch.marked.shape[1]
+    masks = key.masks_for(question_count)
+    keyed = masks != 0
+    # One 4-bit mask per graded sheet and keyed question; correctness and the chosen option both come from it
+    bits = batch.marked_bits[np.ix_(graded, keyed)]
+    detected = batch.detected[np.ix_(graded, keyed)]
+    correct = ((POPCOUNT[bits] == 1) & ((bits & masks[keyed]) != 0) & detected).astype(np.float64)
+    sheets, items = correct.shape
+
+    total = correct.sum(axis=1)
+    difficulty = correct.mean(axis=0) if sheets else np.full(items, np.nan)
+    rest = total[:, None] - correct
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = ((correct - difficulty) * (rest - rest.mean(axis=0))).mean(axis=0)
+        discrimination = covariance / (correct.std(axis=0) * rest.std(axis=0))
+        variance = total.var()
+        kr20 = items / (items - 1) * (1 - (difficulty * (1 - difficulty)).sum() / variance) if items > 1 and variance > 0 else float('nan')
+
+    codes = OPTION_CODE[bits]
+    flat = (np.arange(items) * len(OPTION_LABELS) + codes)[detected]
+    counts = np.bincount(flat, minlength=items * len(OPTION_LABELS)).reshape(items, len(OPTION_LABELS))
+    options = counts / np.maximum(detected.sum(axis=0), 1)[:, None]
+    return {'sheets': sheets, 'questions': (np.flatnonzero(keyed) + 1), 'key_masks': masks[keyed],
+            'difficulty': difficulty, 'discrimination': discrimination, 'options': options,
+            'mean_score': float(total.mean()) if sheets else float('nan'), 'score_sd': float(total.std()) if sheets else float('nan'),
+            'kr20': float(kr20)}
+
+def item_flags(stats):
+    """Short review notes per question: too hard / easy, weak or negative discrimination, a distractor beating the key."""
+    flags = []
+    for p, r, options, mask in zip(stats['difficulty'], stats['discrimination'], stats['options'], stats['key_masks']):
+        notes = []
+        if p < HARD: notes.append('hard')
+        elif p > EASY: notes.append('easy')
+        if r < -0.05: notes.append('negative discrimination')
+        elif r < LOW_DISCRIMINATION: notes.append('low discrimination')
+        keyed_share = max(options[k] for k in range(4) if mask >> k & 1)
+        if any(options[k] > keyed_share for k in range(4) if not mask >> k & 1): notes.append('distractor beats key')
+        flags.append(notes)
+    return flags
+
+def to_report(stats):
+    """JSON-ready report: exam summary plus one entry per keyed question."""
+    flags = item_flags(stats)
+    round_or_none = lambda v: None if np.isnan(v) else round(float(v), 3)
+    return {'sheets': stats['sheets'], 'items': len(stats['questions']), 'mean_score': round_or_none(stats['mean_score']),
+            'score_sd': round_or_none(stats['score_sd']), 'kr20': round_or_none(stats['kr20']),
+            'questions': [{'question': int(q), 'key': ','.join(CHOICES[k] for k in range(4) if int(m) >> k & 1),
+                           'difficulty': round_or_none(p), 'discrimination': round_or_none(r),
+                           'options': {label: round(float(v), 3) for label, v in zip(OPTION_LABELS, o)}, 'flags': f}
+                          for q, m, p, r, o, f in zip(stats['questions'], stats['key_masks'], stats['difficulty'],
+                                                      stats['discrimination'], stats['options'], flags)]}
+
+def print_report(report):
+    print(f"{report['sheets']} sheets, {report['items']} items, mean score {report['mean_score']} (sd {report['score_sd']}), KR-20 {report['kr20']}")
+    print(f"{'Q':>3} {'key':<5}{'p':>6}{'r_pb':>7}  " + ''.join(f"{label:>7}" for label in OPTION_LABELS) + "  flags")
+    for item in report['questions']:
+        p = '-' if item['difficulty'] is None else f"{item['difficulty']:.2f}"
+        r = '-' if item['discrimination'] is None else f"{item['discrimination']:.2f}"
+        print(f"{item['question']:>3} {item['key']:<5}{p:>6}{r:>7}  " + ''.join(f"{v:>7.1%}" for v in item['options'].values()) + f"  {', '.join(item['flags'])}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Item difficulty, discrimination, option distribution and KR-20 for a graded exam.")
+    parser.add_argument('source', help="Results store directory, or a .npz MarkBatch")
+    parser.add_argument('--answer-key', required=True, help="Answer key JSON the exam is scored against")
+    parser.add_argument('--set', dest='set_name', help="Only analyse sheets of this set (defaults to the key's set, if any)")
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    key = load_answer_key(args.answer_key)
+    if args.source.endswith('.npz'): batch = MarkBatch.load(args.source)
+    else:
+        rows, batch = load_results(args.source)
+        set_name = args.set_name or key.set_name
+        if set_name:
+            keep = np.array([set_file_name(r['Set']) == set_file_name(set_name) for r in rows], dtype=bool)
+            batch = MarkBatch(batch.fills[keep], batch.marked[keep], batch.detected[keep],
+                              [p for p, k in zip(batch.image_paths, keep) if k], [r for r, k in zip(batch.roll_numbers, keep) if k])
+    if not batch.detected.any():
+        logging.error(f"No graded sheets to analyse in {args.source}" + (f" for set {set_name!r}" if not args.source.endswith('.npz') and set_name else ""))
+        return 1
+    start = time.perf_counter()
+    report = to_report(item_analysis(batch, key))
+    logging.info(f"Analysed {report['sheets']} sheets in {(time.perf_counter() - start) * 1000:.0f} ms")
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(report, f, indent=1)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
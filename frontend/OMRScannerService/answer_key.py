@@ -0,0 +1,120 @@
+import os
+import re
+import json
+import logging
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+# --- Compiled Answer Keys ---
+# Keys use the same shape as ExamSet.answer_key in the PDF service: {"1": "B", "2": "D", "23": "A,C", ...},
+# question numbers 1-based, choices A-D, several accepted choices comma separated.
+CHOICES = 'ABCD'
+CHOICE_BITS = np.array([1, 2, 4, 8], dtype=np.uint8)
+POPCOUNT = np.array([bin(bits).count('1') for bits in range(16)], dtype=np.uint8)  # Marked choices per 4-bit mask
+
+def marked_bits(marks):
+    """Packs a boolean (..., 4) marked array into one 4-bit mask per question (bit k = choice k)."""
+    return np.packbits(np.asarray(marks, dtype=bool), axis=-1, bitorder='little')[..., 0]
+
+class AnswerKey:
+    """One 4-bit mask per question (bit k set = choice k accepted); 0 means the question is not scored."""
+    def __init__(self, masks, exam_id=None, set_name=None):
+        self.masks = np.asarray(masks, dtype=np.uint8)
+        self.exam_id = exam_id
+        self.set_name = set_name
+
+    @property
+    def keyed(self):
+        return self.masks != 0
+
+    @property
+    def total_questions(self):
+        return int(np.count_nonzero(self.masks))
+
+    @property
+    def version(self):
+        """Content hash of the compiled masks; changes whenever the key would score a sheet differently."""
+        return hashlib.sha1(np.trim_zeros(self.masks, 'b').tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def from_dict(cls, answer_key, exam_id=None, set_name=None):
+        """
+        Compiles an ExamSet-style answer key; raises ValueError on invalid question numbers. Answers that are not A-D letters
+        (free text, blanks) are skipped with a warning: those questions stay unscored and out of the denominator.
+        """
+        parsed = {}; skipped = []
+        for qno, answer in answer_key.items():
+            if not str(qno).strip().isdigit() or int(qno) < 1: raise ValueError(f"Invalid question number in answer key: {qno!r}")
+            letters = [token.strip().upper() for token in re.split(r'[,\s]+', str(answer or '')) if token.strip()]
+            if not letters or any(letter not in CHOICES for letter in letters):
+                skipped.append(int(qno)); continue
+            parsed[int(qno)] = sum(1 << CHOICES.index(letter) for letter in set(letters))
+        if skipped:
+            logging.warning(f"Answer key for exam {exam_id or '-'} set {set_name or '-'}: questions {sorted(skipped)} have no A-D answer and are not scored.")
+        masks = np.zeros(max(parsed, default=0), dtype=np.uint8)
+        for qno, mask in parsed.items(): masks[qno - 1] = mask
+        return cls(masks, exam_id, set_name)
+
+    @classmethod
+    def from_choice_indexes(cls, answer_key):
+        """Compiles the legacy {0-based question: choice index or [indexes]} dict used by app.ANSWER_KEY."""
+        return cls.from_dict({str(q + 1): ','.join(CHOICES[i] for i in (a if isinstance(a, list) else [a])) for q, a in answer_key.items()})
+
+    def masks_for(self, question_count):
+        """Masks padded (or cut) to the number of questions printed on the sheet."""
+        masks = np.zeros(question_count, dtype=np.uint8)
+        n = min(question_count, len(self.masks))
+        masks[:n] = self.masks[:n]
+        return masks
+
+    def score(self, marks):
+        """
+        Scores marked matrices in one vectorized step. marks is a boolean (..., questions, 4) array (one sheet or a batch).
+        A question is correct when exactly one choice is marked and that choice is accepted by the key.
+        """
+        bits = marked_bits(marks)
+        return (POPCOUNT[bits] == 1) & ((bits & self.masks_for(bits.shape[-1])) != 0)
+
+    def letters(self, question_index):
+        """Accepted choices of a 0-based question as shown to users, e.g. "A, C"; 'N/A' if unscored."""
+        mask = int(self.masks[question_index]) if question_index < len(self.masks) else 0
+        return ", ".join(CHOICES[k] for k in range(4) if mask >> k & 1) or 'N/A'
+
+    def choice_indexes(self, question_index):
+        mask = int(self.masks[question_index]) if question_index < len(self.masks) else 0
+        return [k for k in range(4) if mask >> k & 1]
+
+# --- Loading Keys per Exam / Set ---
+def set_file_name(set_name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', set_name.strip()) or 'default'
+
+def load_answer_key(path):
+    """
+    Loads a key file: either a bare answer_key dict or a document with an "answer_key" field
+    (optionally "exam_id" and "set_name"), e.g. an exam set exported from the PDF service.
+    Cached per modification time, so a corrected key file is picked up without a restart.
+    """
+    return _load_answer_key(path, os.path.getmtime(path))
+
+@lru_cache(maxsize=256)
+def _load_answer_key(path, mtime):
+    with open(path) as f: data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get('answer_key'), dict):
+        key = AnswerKey.from_dict(data['answer_key'], data.get('exam_id'), data.get('set_name'))
+    else: key = AnswerKey.from_dict(data)
+    gaps = np.flatnonzero(~key.keyed) + 1
+    if gaps.size: logging.warning(f"Answer key {path} leaves questions {gaps.tolist()} unkeyed: they are not scored and not counted in the percentage.")
+    return key
+
+def find_answer_key(key_dir, exam_id, set_name=None):
+    """Resolves <key_dir>/<exam_id>/<set_name>.json (or <exam_id>.json for single-set exams); None if absent."""
+    exam_dir = os.path.join(key_dir, set_file_name(str(exam_id)))
+    candidates = [os.path.join(exam_dir, f"{set_file_name(set_name)}.json")] if set_name else []
+    candidates.append(os.path.join(key_dir, f"{set_file_name(str(exam_id))}.json"))
+    for path in candidates:
+        if os.path.isfile(path):
+            key = load_answer_key(path)
+            return AnswerKey(key.masks, key.exam_id or exam_id, key.set_name or set_name)
+    return None
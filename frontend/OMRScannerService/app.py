@@ -1,9 +1,17 @@
 import cv2
 import numpy as np
 from imutils import contours
+from layout import SheetLayout, sample_bubbles, validate_samples
+from answer_key import CHOICE_BITS, AnswerKey
+from scoring import encode_marks
 import os
+import sys
 import csv
+import time
 import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # --- New Function: Setup Logging ---
 def setup_logging():
@@ -18,8 +26,32 @@ def setup_logging():
             ]
         )
 
-# --- 1. Define the Answer Key and Choice Mapping ---
+# --- New: Stage Timing and Lazy Debug Output ---
+class StageTimer:
+    """Collects wall-clock milliseconds per grading stage; stages timed from several section threads add up."""
+    def __init__(self):
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with self.lock: self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+def save_debug_image(debug_dir, name, make_image):
+    """Writes a debug visualization only when debug_dir is set; make_image is only called then."""
+    if not debug_dir: return
+    os.makedirs(debug_dir, exist_ok=True)
+    path = os.path.join(debug_dir, f"{name}.jpg")
+    if not cv2.imwrite(path, make_image()): logging.warning(f"Could not write debug image {path}")
+
+# --- 1. Define the Default Answer Key and Choice Mapping ---
 # NOTE: This OMR sheet has 4 columns of 15 questions = 60 total.
+# Per-exam/set keys are loaded with answer_key.py; this one is used when no key is given.
+SHEET_QUESTIONS = 60
 ANSWER_KEY = {
     0: 1, 1: 3, 2: 0, 3: 2, 4: 1, 5: 0, 6: 1, 7: 2, 8: 3, 9: 0, 10: 1, 11: 3, 12: 0, 13: 2, 14: 1,
     15: 0, 16: 3, 17: 2, 18: 1, 19: 0, 20: 1, 21: 2, 22: [0, 2], 23: 3, 24: 1, 25: 0, 26: 2, 27: 3, 28: 1, 29: 0,
@@ -27,6 +59,7 @@ ANSWER_KEY = {
     45: 1, 46: 3, 47: 0, 48: 2, 49: 1, 50: 3, 51: 0, 52: 1, 53: 2, 54: 3, 55: 0, 56: 1, 57: 2, 58: 3, 59: 0
 }
 CHOICE_MAP = {0: 'A', 1: 'B', 2: 'C', 3: 'D'}
+DEFAULT_ANSWER_KEY = AnswerKey.from_choice_indexes(ANSWER_KEY)
 
 
 # --- 2. Alignment Functions (Unchanged) ---
@@ -41,42 +74,154 @@ def reorder(myPoints):
     myPointsNew[2] = myPoints[np.argmax(diff)]
     return myPointsNew
 
-def find_fiducial_markers(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+# Images are decoded (JPEG DCT scaling) down to at least WORKING_SIDE px on the long side, fiducials are searched on a
+# pyramid level of at most FIDUCIAL_SEARCH_SIDE px (in the four corner windows first, the whole page only as a fallback)
+# and refined in small full-resolution windows; only the final warp reads the full image and its output is capped at
+# MAX_PAPER_SIDE, so bubble size filters keep working on big photos.
+WORKING_SIDE = 1600
+FIDUCIAL_SEARCH_SIDE = 900
+MAX_PAPER_SIDE = 2400
+MARKER_MIN_AREA, MARKER_MAX_AREA = 100, 10000
+CORNER_FRACTION = 0.25  # Markers are first looked for only in this fraction of the width and height at each image corner
+
+# The roll number block and the four MCQ columns are independent regions, graded on a small thread pool
+# (OpenCV releases the GIL). Batch workers set this to 1: there the process pool already uses every core.
+SECTION_THREADS = int(os.environ.get('OMR_SECTION_THREADS', min(5, os.cpu_count() or 1)))
+_section_pool = None
+
+def set_section_threads(count):
+    global SECTION_THREADS, _section_pool
+    if _section_pool is not None: _section_pool.shutdown(wait=False); _section_pool = None
+    SECTION_THREADS = max(1, int(count))
+
+def run_sections(tasks):
+    """Runs (function, args) tasks on the section pool and returns their results in task order."""
+    global _section_pool
+    if SECTION_THREADS <= 1 or len(tasks) <= 1: return [fn(*args) for fn, args in tasks]
+    if _section_pool is None: _section_pool = ThreadPoolExecutor(SECTION_THREADS, thread_name_prefix='omr-section')
+    futures = [_section_pool.submit(fn, *args) for fn, args in tasks]
+    return [f.result() for f in futures]
+
+def image_size_from_header(data):
+    """(width, height) from a JPEG SOF or PNG IHDR header without decoding pixels; None for other formats."""
+    if data[:8].tobytes() == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return int.from_bytes(data[16:20].tobytes(), 'big'), int.from_bytes(data[20:24].tobytes(), 'big')
+    if data[:2].tobytes() != b'\xff\xd8': return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF: return None
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7: i += 2; continue
+        length = int(data[i + 2]) << 8 | int(data[i + 3])
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return int(data[i + 7]) << 8 | int(data[i + 8]), int(data[i + 5]) << 8 | int(data[i + 6])
+        i += 2 + length
+    return None
+
+REDUCED_COLOR_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+REDUCED_GRAYSCALE_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+def load_image(image_path, working_side=WORKING_SIDE, color=True):
+    """
+    Reads an image, decoding large files at 1/2, 1/4 or 1/8 size when that still leaves working_side pixels.
+    With color=False the decoder returns the luma plane directly (grading itself never needs color).
+    """
+    try: data = np.fromfile(image_path, dtype=np.uint8)
+    except OSError: return None
+    return decode_image(data, working_side, color, image_path)
+
+def decode_image(data, working_side=WORKING_SIDE, color=True, name='image'):
+    """Decodes encoded image bytes (uint8 array) the way load_image does. Returns None if they are not a readable image."""
+    if data.size == 0: return None
+    size = image_size_from_header(data)
+    if size is not None:
+        for factor, flag in (REDUCED_COLOR_FLAGS if color else REDUCED_GRAYSCALE_FLAGS):
+            if max(size) / factor >= working_side:
+                logging.info(f"Decoding {name} at 1/{factor} size.")
+                return cv2.imdecode(data, flag)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE)
+
+def detect_marker_candidates(gray, min_area, max_area):
+    """Square dark blobs within the area range, largest first, as (cx, cy, size) tuples."""
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     _, thresh = cv2.threshold(blurred, 200, 255, cv2.THRESH_BINARY_INV)
-    cnts, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    marker_contours = []
+    cnts, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    candidates = []
     for c in cnts:
         (x, y, w, h) = cv2.boundingRect(c)
         aspect_ratio = w / float(h)
         area = cv2.contourArea(c)
-        if 0.8 <= aspect_ratio <= 1.2 and 100 < area < 10000:
-            marker_contours.append(c)
-    if len(marker_contours) < 4:
-        logging.error(f"Found only {len(marker_contours)} fiducial markers. Cannot align.")
-        return None
-    marker_contours = sorted(marker_contours, key=cv2.contourArea, reverse=True)[:4]
-    points = []
-    for c in marker_contours:
-        M = cv2.moments(c)
-        if M["m00"] != 0:
-            cX = int(M["m10"] / M["m00"]); cY = int(M["m01"] / M["m00"])
-            points.append([cX, cY])
-        else:
-            (x, y, w, h) = cv2.boundingRect(c)
-            points.append([x + w // 2, y + h // 2])
-    if len(points) != 4:
-        logging.error(f"Could not determine center for all 4 markers. Found {len(points)}.")
+        if 0.8 <= aspect_ratio <= 1.2 and min_area < area < max_area:
+            M = cv2.moments(c)
+            if M["m00"] != 0: cX = M["m10"] / M["m00"]; cY = M["m01"] / M["m00"]
+            else: cX = x + w / 2.0; cY = y + h / 2.0
+            candidates.append((area, cX, cY, max(w, h)))
+    candidates.sort(key=lambda item: item[0], reverse=True)
+    return [(cX, cY, size) for _, cX, cY, size in candidates]
+
+def refine_marker(gray, cx, cy, size):
+    """Re-locates a coarse marker estimate inside a small full-resolution window around it."""
+    half = int(size * 1.5) + 4
+    x0, y0 = max(int(cx) - half, 0), max(int(cy) - half, 0)
+    window = gray[y0:int(cy) + half + 1, x0:int(cx) + half + 1]
+    if window.size == 0: return cx, cy
+    candidates = detect_marker_candidates(window, MARKER_MIN_AREA, MARKER_MAX_AREA)
+    if not candidates: return cx, cy
+    wx, wy, _ = min(candidates, key=lambda m: (m[0] + x0 - cx) ** 2 + (m[1] + y0 - cy) ** 2)
+    return wx + x0, wy + y0
+
+def find_corner_markers(gray, min_area, max_area, fraction=CORNER_FRACTION):
+    """
+    One marker per corner window (tl, tr, bl, br) as (cx, cy, size) tuples: of the candidates at least half as big as the
+    window's largest, the one nearest the image corner. None when a corner has no candidate or the four disagree in
+    size by more than 2x (e.g. a filled bubble won a corner).
+    """
+    h, w = gray.shape[:2]
+    ch, cw = max(int(h * fraction), 1), max(int(w * fraction), 1)
+    markers = []
+    for x0, y0 in ((0, 0), (w - cw, 0), (0, h - ch), (w - cw, h - ch)):
+        candidates = detect_marker_candidates(gray[y0:y0 + ch, x0:x0 + cw], min_area, max_area)
+        if not candidates: return None
+        corner_x, corner_y = (0 if x0 == 0 else cw), (0 if y0 == 0 else ch)
+        cx, cy, size = min((c for c in candidates if c[2] >= candidates[0][2] / 2),
+                           key=lambda c: (c[0] - corner_x) ** 2 + (c[1] - corner_y) ** 2)
+        markers.append((cx + x0, cy + y0, size))
+    sizes = [size for _, _, size in markers]
+    return markers if max(sizes) <= 2 * min(sizes) else None
+
+def find_fiducial_markers(image, search_side=FIDUCIAL_SEARCH_SIDE):
+    """Locates the four corner markers in a BGR or grayscale image. Returns them ordered for four_point_transform, or None."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = gray
+    while max(small.shape[:2]) > search_side: small = cv2.pyrDown(small)
+    scale = small.shape[1] / float(gray.shape[1])
+    min_area, max_area = MARKER_MIN_AREA * scale ** 2, MARKER_MAX_AREA * scale ** 2
+
+    markers = find_corner_markers(small, min_area, max_area)
+    if markers is None:
+        logging.info("Not every page corner holds a fiducial marker. Searching the whole page.")
+        markers = detect_marker_candidates(small, min_area, max_area)
+    if len(markers) >= 4:
+        points = [refine_marker(gray, cX / scale, cY / scale, size / scale) if scale < 1.0 else (cX, cY) for cX, cY, size in markers[:4]]
+    elif scale < 1.0:
+        logging.warning(f"Found only {len(markers)} fiducial markers at 1/{1 / scale:.0f} scale. Searching full resolution.")
+        markers = detect_marker_candidates(gray, MARKER_MIN_AREA, MARKER_MAX_AREA)
+        points = [(cX, cY) for cX, cY, _ in markers[:4]]
+    else: points = []
+    if len(points) < 4:
+        logging.error(f"Found only {len(points)} fiducial markers. Cannot align.")
         return None
     return reorder(np.array(points, dtype="float32"))
 
-def four_point_transform(image, pts):
+def four_point_transform(image, pts, max_side=MAX_PAPER_SIDE):
     (tl, tr, bl, br) = pts
     widthA = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2)); widthB = np.sqrt(((tr[0] - tl[0]) ** 2) + ((tr[1] - tl[1]) ** 2))
     maxWidth = max(int(widthA), int(widthB))
     heightA = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2)); heightB = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
     maxHeight = max(int(heightA), int(heightB))
+    if max_side and max(maxWidth, maxHeight) > max_side:
+        shrink = max_side / float(max(maxWidth, maxHeight))
+        maxWidth, maxHeight = int(maxWidth * shrink), int(maxHeight * shrink)
     dst = np.array([[0, 0], [maxWidth - 1, 0], [0, maxHeight - 1], [maxWidth - 1, maxHeight - 1]], dtype="float32")
     matrix = cv2.getPerspectiveTransform(pts, dst)
     return cv2.warpPerspective(image, matrix, (maxWidth, maxHeight))
@@ -91,6 +236,17 @@ def get_intensity_threshold(intensities, min_jump=15):
     if best_jump > min_jump: return intensities[best_index] + best_jump / 2
     else: return np.mean(intensities) - 5
 
+def bubble_fill(gray, contour):
+    """Mean gray level inside a bubble, measured on its bounding-rect ROI with a small local mask."""
+    (x, y, w, h) = cv2.boundingRect(contour)
+    mask = np.zeros((h, w), dtype="uint8")
+    cv2.drawContours(mask, [contour], -1, 255, -1, offset=(-x, -y))
+    return cv2.mean(gray[y:y + h, x:x + w], mask=mask)[0]
+
+def measure_bubble_fills(gray, bubbles):
+    # Keyed by id(): sort_contours/row grouping reorder the same contour objects, so each bubble is measured once.
+    return {id(c): bubble_fill(gray, c) for c in bubbles}
+
 def group_bubbles_into_rows(bubbles, tolerance=10):
     if not bubbles: return []
     bubbles = contours.sort_contours(bubbles, method="top-to-bottom")[0]
@@ -105,25 +261,48 @@ def group_bubbles_into_rows(bubbles, tolerance=10):
     return rows
 
 # --- 4. NEW Separator Logic ---
-def find_horizontal_separator(image):
-    h_img, w_img = image.shape[:2]
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
-    cnts, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+# The printed rules are found from row / column projection profiles of the ink mask: one counting pass, then runs of
+# (nearly) fully inked rows or columns. Bubbles never ink more than about a third of a row or column. When the profile
+# is not conclusive (no rule, or not exactly three column rules) the contour / morphology search below is used.
+def profile_runs(profile, min_count):
+    """(start, length) of every run of consecutive profile entries >= min_count."""
+    above = np.concatenate(([False], profile >= min_count, [False]))
+    edges = np.flatnonzero(above[1:] != above[:-1])
+    return [(int(a), int(b - a)) for a, b in zip(edges[::2], edges[1::2])]
+
+def find_horizontal_separator(ink_mask):
+    """y of the long horizontal rule between the roll number block and the MCQ area, or -1."""
+    h_img, w_img = ink_mask.shape[:2]
+    for y, run in profile_runs(np.count_nonzero(ink_mask, axis=1), w_img * 0.8):
+        if run < 20: return y + (run // 2)
+    logging.info("No horizontal rule in the row profile. Searching contours.")
+    return find_horizontal_separator_by_contours(ink_mask)
+
+def find_vertical_separators(ink_mask):
+    """Finds the three main vertical lines that separate the MCQ columns."""
+    h, w = ink_mask.shape[:2]
+    runs = [(x, run) for x, run in profile_runs(np.count_nonzero(ink_mask, axis=0), h * 0.7) if run < 25]
+    if len(runs) == 3:
+        separator_xs = [x for x, _ in runs]
+        logging.info(f"Found vertical separators at x={separator_xs[0]}, x={separator_xs[1]}, x={separator_xs[2]}")
+        return separator_xs
+    logging.info(f"Column profile found {len(runs)} vertical rules. Falling back to morphology.")
+    return find_vertical_separators_by_morphology(ink_mask)
+
+def find_horizontal_separator_by_contours(ink_mask):
+    h_img, w_img = ink_mask.shape[:2]
+    cnts, _ = cv2.findContours(ink_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     for c in cnts:
         x, y, w, h = cv2.boundingRect(c)
         if w > w_img * 0.8 and h < 20:
             return y + (h // 2)
     return -1
     
-def find_vertical_separators(image):
-    """Finds the three main vertical lines that separate the MCQ columns."""
-    h, w = image.shape[:2]
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+def find_vertical_separators_by_morphology(ink_mask):
+    h, w = ink_mask.shape[:2]
     
     vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 50))
-    detected_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+    detected_lines = cv2.morphologyEx(ink_mask, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
     
     cnts, _ = cv2.findContours(detected_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     lines = []
@@ -154,13 +333,16 @@ def find_vertical_separators(image):
     return None, None, None
 
 # --- 5. Roll Number Decoding (UNCHANGED as per your request) ---
-def decode_roll_number(roll_section_image, output_image_to_draw, y_offset):
-    if roll_section_image is None or roll_section_image.size == 0: return "N/A"
-    h, w = roll_section_image.shape[:2]
-    crop_y_start = int(h * 0.315); bubble_area = roll_section_image[crop_y_start:, :]
-    gray = cv2.cvtColor(bubble_area, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(gray, 220, 255, cv2.THRESH_BINARY_INV)[1]
-    cnts, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def bubble_center(contour, x_offset=0, y_offset=0):
+    (x, y, w, h) = cv2.boundingRect(contour)
+    return [x + w / 2.0 + x_offset, y + h / 2.0 + y_offset, (w + h) / 4.0]
+
+def decode_roll_number(roll_gray, roll_mask, y_offset, geometry=None):
+    """Decodes the roll number digits from views of the roll block (grayscale and bubble mask)."""
+    if roll_gray is None or roll_gray.size == 0: return "N/A"
+    h, w = roll_gray.shape[:2]
+    crop_y_start = int(h * 0.315); gray = roll_gray[crop_y_start:, :]
+    cnts, _ = cv2.findContours(roll_mask[crop_y_start:, :], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     bubble_contours = []
     for c in cnts:
         (x, y, w, h) = cv2.boundingRect(c); ar = w / float(h)
@@ -180,41 +362,115 @@ def decode_roll_number(roll_section_image, output_image_to_draw, y_offset):
     elif len(columns) == 5: bubble_columns = columns
     else: logging.error(f"Expected 5 or 6 columns for roll number, but found {len(columns)}."); return "Column Count Error"
     decoded_roll = []
-    all_bubble_intensities = [cv2.mean(gray, mask=cv2.drawContours(np.zeros(gray.shape, dtype="uint8"), [c], -1, 255, -1))[0] for c in bubble_contours]
-    grading_threshold = get_intensity_threshold(all_bubble_intensities)
+    fills = measure_bubble_fills(gray, bubble_contours)
+    grading_threshold = get_intensity_threshold(list(fills.values()))
     logging.info(f"Roll number grading threshold: {grading_threshold:.2f}")
     for column in bubble_columns:
         column_sorted, _ = contours.sort_contours(column, method="top-to-bottom")
         if not (9 <= len(column_sorted) <= 11): logging.warning(f"A roll number column has {len(column_sorted)} bubbles. Skipping."); decoded_roll.append("X"); continue
         marked_count = 0; marked_digit = -1
         for i, bubble_c in enumerate(column_sorted):
-            mask = np.zeros(gray.shape, dtype="uint8"); cv2.drawContours(mask, [bubble_c], -1, 255, -1)
-            if cv2.mean(gray, mask=mask)[0] < grading_threshold: marked_digit = i; marked_count += 1
+            if fills[id(bubble_c)] < grading_threshold: marked_digit = i; marked_count += 1
         if marked_count == 1: decoded_roll.append(str(marked_digit))
         else: decoded_roll.append("E")
+        if geometry is not None and len(column_sorted) == 10:
+            geometry['roll'].append([bubble_center(c, 0, crop_y_start + y_offset) for c in column_sorted])
     return "".join(decoded_roll)
 
 # --- 6. NEW MCQ Section Grading Function ---
-def grade_mcq_section(section_image, question_offset, output_image, section_x_offset, section_y_offset):
-    if section_image is None or section_image.size == 0: return [], 0
-    
-    gray = cv2.cvtColor(section_image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(gray, 220, 255, cv2.THRESH_BINARY_INV)[1]
+def draw_contour_boxes(image, cnts):
+    debug_image = image.copy()
+    for c in cnts:
+        (x, y, w, h) = cv2.boundingRect(c)
+        cv2.rectangle(debug_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    return debug_image
+
+# Confidence: a choice whose fill sits within REVIEW_CONFIDENCE x (half the sheet contrast) of its threshold is uncertain
+REVIEW_CONFIDENCE = 0.25
+DEFAULT_CONFIDENCE_SCALE = 60.0  # Half contrast assumed when a sheet has no marked (or no blank) bubbles
+MIN_CONFIDENCE_SCALE = 15.0
+
+class SheetMarks:
+    """Per-sheet bubble readings: fill intensity, marked flag and box of every choice, filled in by either grading path."""
+    def __init__(self, question_count=SHEET_QUESTIONS):
+        self.fills = np.full((question_count, 4), np.nan, dtype=np.float32)
+        self.marked = np.zeros((question_count, 4), dtype=bool)
+        self.detected = np.zeros(question_count, dtype=bool)
+        self.boxes = np.zeros((question_count, 4, 4), dtype=np.int32)
+        self.thresholds = np.full(question_count, np.nan, dtype=np.float32)
+
+    def record(self, question_num, fills, threshold, boxes):
+        if question_num >= len(self.detected): return
+        self.fills[question_num] = fills
+        self.marked[question_num] = np.asarray(fills) < threshold
+        self.detected[question_num] = True
+        self.boxes[question_num] = boxes
+        self.thresholds[question_num] = threshold
+
+    def confidence(self):
+        """
+        Per-question confidence in [0, 1], NaN where not detected or no threshold is known: the distance of the choice
+        closest to its threshold, relative to half the sheet's contrast between unmarked and marked bubbles.
+        """
+        known = self.detected & ~np.isnan(self.thresholds)
+        if not known.any(): return np.full(len(self.detected), np.nan)
+        marked_fills = self.fills[known][self.marked[known]]; blank_fills = self.fills[known][~self.marked[known]]
+        contrast = float(np.median(blank_fills) - np.median(marked_fills)) if marked_fills.size and blank_fills.size else 2 * DEFAULT_CONFIDENCE_SCALE
+        scale = max(contrast / 2, MIN_CONFIDENCE_SCALE)
+        with np.errstate(invalid='ignore'):
+            confidence = np.clip(np.abs(self.fills - self.thresholds[:, None]).min(axis=1) / scale, 0.0, 1.0)
+        confidence[~known] = np.nan
+        return confidence
+
+    @classmethod
+    def from_encoded(cls, encoded, question_count=SHEET_QUESTIONS):
+        """Rebuilds readings from result['marks'] (see scoring.encode_marks); boxes are not kept there and stay zero."""
+        marks = cls(question_count)
+        bits = np.full(question_count, -1, dtype=np.int16)
+        row = encoded['marked'][:question_count]
+        bits[:len(row)] = row
+        marks.detected = bits >= 0
+        marks.marked = ((np.maximum(bits, 0)[:, None] & CHOICE_BITS) != 0) & marks.detected[:, None]
+        for q, f in enumerate(encoded['fills'][:question_count]):
+            if f is not None: marks.fills[q] = f
+        return marks
+
+def score_sheet(marks, key, output_image=None):
+    """Scores all questions in one vectorized step. Returns (answers, correct_count) for the detected questions."""
+    correct = key.score(marks.marked) & marks.detected
+    marked_count = marks.marked.sum(axis=1)
+    answers = []
+    for question_num in np.flatnonzero(marks.detected).tolist():
+        count = marked_count[question_num]
+        student_answer_char = CHOICE_MAP[int(np.argmax(marks.marked[question_num]))] if count == 1 else ('Error' if count > 1 else 'Blank')
+        is_correct = bool(correct[question_num])
+        answers.append({'question': question_num + 1, 'student_answer': student_answer_char, 'correct_answer': key.letters(question_num), 'result': 'Correct' if is_correct else 'Incorrect'})
+        if output_image is not None: draw_answer_boxes(output_image, marks.boxes[question_num], key.choice_indexes(question_num), is_correct)
+    return answers, int(correct.sum())
+
+def draw_answer_boxes(output_image, boxes, correct_answers, is_correct):
+    """Outlines the correct choice(s) of a question: green if the student got it right, red otherwise. boxes are (x, y, w, h) per choice."""
+    color = (0, 255, 0) if is_correct else (0, 0, 255)
+    for answer_idx in correct_answers:
+        (x_b, y_b, w_b, h_b) = (int(v) for v in boxes[answer_idx])
+        cv2.rectangle(output_image, (x_b, y_b), (x_b + w_b, y_b + h_b), color, 3)
+
+def grade_mcq_section(gray, bubble_mask, question_offset, marks, section_x_offset, section_y_offset, debug_dir=None, geometry=None):
+    """Reads one 15-question column (views of the sheet's grayscale and bubble mask) into marks. Returns the number of questions found."""
+    if gray is None or gray.size == 0: return 0
     
-    cnts, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts, _ = cv2.findContours(bubble_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     all_contours = []
     
-    debug_section_image = section_image.copy()
     for c in cnts:
         (x, y, w, h) = cv2.boundingRect(c); ar = w / float(h)
         if 10 < w < 60 and 10 < h < 60 and 0.2 < ar < 2.0:
             all_contours.append(c)
-            cv2.rectangle(debug_section_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-    cv2.imshow(f"Debugging: Section {question_offset//15 + 1} Contours", debug_section_image)
+    save_debug_image(debug_dir, f"section{question_offset//15 + 1}_contours", lambda: draw_contour_boxes(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), all_contours))
             
     if len(all_contours) < 60:
         logging.warning(f"MCQ Section {question_offset//15 + 1} has only {len(all_contours)} contours.")
-        return [], 0
+        return 0
         
     all_contours, _ = contours.sort_contours(all_contours, method="left-to-right")
     columns = []; current_column = [all_contours[0]]
@@ -236,14 +492,14 @@ def grade_mcq_section(section_image, question_offset, output_image, section_x_of
     elif len(columns) == 4: bubble_columns = columns
     else:
         logging.error(f"MCQ Section {question_offset//15 + 1}: Expected 4 or 5 columns, found {len(columns)}.")
-        return [], 0
+        return 0
 
-    section_answers = []; section_correct = 0
-    all_bubble_intensities = [cv2.mean(gray, mask=cv2.drawContours(np.zeros(gray.shape, dtype="uint8"), [c], -1, 255, -1))[0] for col in bubble_columns for c in col]
-    grading_threshold = get_intensity_threshold(all_bubble_intensities)
+    found = 0
+    all_bubbles_in_section = [c for col in bubble_columns for c in col]
+    fills = measure_bubble_fills(gray, all_bubbles_in_section)
+    grading_threshold = get_intensity_threshold(list(fills.values()))
     logging.info(f"MCQ Section {question_offset//15 + 1} grading threshold: {grading_threshold:.2f}")
 
-    all_bubbles_in_section = [c for col in bubble_columns for c in col]
     question_rows = group_bubbles_into_rows(all_bubbles_in_section, tolerance=20)
 
     for row_idx, row in enumerate(question_rows):
@@ -251,34 +507,10 @@ def grade_mcq_section(section_image, question_offset, output_image, section_x_of
         if len(row) != 4: continue
             
         question_bubbles = contours.sort_contours(row, method="left-to-right")[0]
-        marked_choice_idx = -1; marked_count = 0
-        for choice_idx, bubble_contour in enumerate(question_bubbles):
-            mask = cv2.drawContours(np.zeros(gray.shape, dtype="uint8"), [bubble_contour], -1, 255, -1)
-            if cv2.mean(gray, mask=mask)[0] < grading_threshold:
-                marked_choice_idx = choice_idx; marked_count += 1
-
-        is_correct = False
-        correct_answers = ANSWER_KEY.get(question_num)
-        if marked_count == 1:
-            if isinstance(correct_answers, list) and marked_choice_idx in correct_answers: is_correct = True
-            elif marked_choice_idx == correct_answers: is_correct = True
-        
-        if is_correct: section_correct += 1
-        
-        student_answer_char = CHOICE_MAP.get(marked_choice_idx, 'Blank') if marked_count == 1 else ('Error' if marked_count > 1 else 'Blank')
-        if isinstance(correct_answers, list): correct_answer_char = ", ".join([CHOICE_MAP.get(ans) for ans in correct_answers])
-        else: correct_answer_char = CHOICE_MAP.get(correct_answers, 'N/A')
-        
-        section_answers.append({'question': question_num + 1, 'student_answer': student_answer_char, 'correct_answer': correct_answer_char, 'result': 'Correct' if is_correct else 'Incorrect'})
-
-        if correct_answers is not None:
-            color = (0, 255, 0) if is_correct else (0, 0, 255)
-            answers_to_draw = correct_answers if isinstance(correct_answers, list) else [correct_answers]
-            for answer_idx in answers_to_draw:
-                if answer_idx < len(question_bubbles):
-                    (x_b, y_b, w_b, h_b) = cv2.boundingRect(question_bubbles[answer_idx])
-                    cv2.rectangle(output_image, (x_b + section_x_offset, y_b + section_y_offset), (x_b + w_b + section_x_offset, y_b + h_b + section_y_offset), color, 3)
-    return section_answers, section_correct
+        boxes = [(x + section_x_offset, y + section_y_offset, w, h) for (x, y, w, h) in (cv2.boundingRect(c) for c in question_bubbles)]
+        marks.record(question_num, [fills[id(c)] for c in question_bubbles], grading_threshold, boxes); found += 1
+        if geometry is not None: geometry['mcq'][question_num] = [bubble_center(c, section_x_offset, section_y_offset) for c in question_bubbles]
+    return found
 
 
 # --- Function to Write Results to CSV (Unchanged) ---
@@ -298,75 +530,255 @@ def write_results_to_csv(image_path, roll_number, student_answers, score):
     except IOError as e:
         logging.error(f"Could not write to CSV file {csv_filename}. Reason: {e}")
 
-# --- Main Processing Function (MODIFIED) ---
-def process_omr_sheet(image_path):
-    setup_logging()
-    original_image = cv2.imread(image_path)
-    if original_image is None: logging.error(f"Could not load image from {image_path}"); return
+# --- 7. Grading Paths: Contour Detection and Calibrated Layout ---
+BUBBLE_INK_LEVEL = 220  # Bubble outlines and marks are darker than this
+ADAPTIVE_BLOCK, ADAPTIVE_OFFSET = 31, 20  # Slow path: ink is ADAPTIVE_OFFSET darker than the mean of its ~1-bubble-pitch neighbourhood
 
-    corners = find_fiducial_markers(original_image)
-    if corners is None: return
-        
-    paper = four_point_transform(original_image, corners)
-    
-    h_paper, w_paper = paper.shape[:2]
-    crop_margin_top = int(h_paper * 0.03); crop_margin_bottom = int(h_paper * 0.03)
-    crop_margin_x = int(w_paper * 0.05)
-    cropped_paper = paper[crop_margin_top:h_paper - crop_margin_bottom, crop_margin_x:]
-    cv2.imshow("Debugging: Cropped Paper", cv2.resize(cropped_paper, (int(w_paper*0.5), int(h_paper*0.5))))
-
-    h_crop, w_crop, _ = cropped_paper.shape
-    split_y = find_horizontal_separator(cropped_paper)
-    if split_y == -1:
-        logging.warning("Could not find horizontal separator. Falling back to 22% split.")
-        split_y = int(h_crop * 0.22)
-    logging.info(f"Final section split at y={split_y}")
-
-    roll_section = cropped_paper[0:split_y, :]
-    mcq_section_full = cropped_paper[split_y:, :] 
-    output_image = cropped_paper.copy()
-
-    roll_number = decode_roll_number(roll_section, output_image, 0)
-    logging.info(f"--- Decoded Roll Number: {roll_number} ---")
+class SheetPipeline:
+    """
+    Images of one aligned sheet, shared by every grading stage. The paper is converted to grayscale once and each
+    binary image is thresholded once on first use; stages get NumPy views of their regions instead of their own copies.
+    The BGR paper is only kept when something is drawn on it.
+    """
+    def __init__(self, paper_gray, crop_offset, paper=None, adaptive=False):
+        h = paper_gray.shape[0]
+        crop_x, crop_y = crop_offset
+        self.paper_gray = paper_gray
+        self.paper = paper
+        self.crop_offset = crop_offset
+        self.crop = (slice(crop_y, h - crop_y), slice(crop_x, None))
+        self.gray = paper_gray[self.crop]
+        self.adaptive = adaptive
+        self._bubble_mask = None
+        self._ink_mask = None
 
-    total_correct, all_student_answers = 0, []
-    split_x1, split_x2, split_x3 = find_vertical_separators(mcq_section_full)
-    
+    def robust(self):
+        """The same sheet with an adaptive (locally thresholded) bubble mask for the slow path; shares every image."""
+        pipeline = SheetPipeline(self.paper_gray, self.crop_offset, self.paper, adaptive=True)
+        pipeline._ink_mask = self._ink_mask
+        return pipeline
+
+    @property
+    def cropped_paper(self):
+        return self.paper[self.crop] if self.paper is not None else None
+
+    @property
+    def bubble_mask(self):
+        """Bubble outlines and marks of the cropped sheet: fixed ink level, or darker than the neighbourhood when adaptive."""
+        if self._bubble_mask is None:
+            if self.adaptive: self._bubble_mask = cv2.adaptiveThreshold(self.gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, ADAPTIVE_BLOCK, ADAPTIVE_OFFSET)
+            else: self._bubble_mask = cv2.threshold(self.gray, BUBBLE_INK_LEVEL, 255, cv2.THRESH_BINARY_INV)[1]
+        return self._bubble_mask
+
+    @property
+    def ink_mask(self):
+        """Otsu binarization of the cropped sheet, used to find the printed separator rules."""
+        if self._ink_mask is None: self._ink_mask = cv2.threshold(self.gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+        return self._ink_mask
+
+def grade_by_contours(pipeline, marks, timer, debug_dir=None, geometry=None):
+    """Discovers the layout on this sheet (separators, contours, clustering) and reads bubbles into marks. Returns (roll_number, error)."""
+    gray, bubble_mask = pipeline.gray, pipeline.bubble_mask
+    with timer.stage('separators'):
+        h_crop, w_crop = gray.shape[:2]
+        split_y = find_horizontal_separator(pipeline.ink_mask)
+        if split_y == -1:
+            logging.warning("Could not find horizontal separator. Falling back to 22% split.")
+            split_y = int(h_crop * 0.22)
+        logging.info(f"Final section split at y={split_y}")
+        split_x1, split_x2, split_x3 = find_vertical_separators(pipeline.ink_mask[split_y:, :])
+
+    # Every task writes only its own rows of marks (and its own geometry keys), so the merge is the same in any order.
+    # Nothing is drawn here: score_sheet() draws the overlay once all sections are done.
+    def timed(stage, fn, *args):
+        with timer.stage(stage): return fn(*args)
+
+    tasks = [(timed, ('roll', decode_roll_number, gray[:split_y, :], bubble_mask[:split_y, :], 0, geometry))]
     if split_x1 and split_x2 and split_x3:
-        section1 = mcq_section_full[:, :split_x1]
-        section2 = mcq_section_full[:, split_x1:split_x2]
-        section3 = mcq_section_full[:, split_x2:split_x3]
-        section4 = mcq_section_full[:, split_x3:]
-        
-        answers1, correct1 = grade_mcq_section(section1, 0, output_image, 0, split_y)
-        answers2, correct2 = grade_mcq_section(section2, 15, output_image, split_x1, split_y)
-        answers3, correct3 = grade_mcq_section(section3, 30, output_image, split_x2, split_y)
-        answers4, correct4 = grade_mcq_section(section4, 45, output_image, split_x3, split_y)
-        
-        total_correct = correct1 + correct2 + correct3 + correct4
-        all_student_answers = answers1 + answers2 + answers3 + answers4
-    else:
+        bounds = [0, split_x1, split_x2, split_x3, w_crop]
+        tasks += [(timed, ('mcq', grade_mcq_section, gray[split_y:, bounds[i]:bounds[i + 1]], bubble_mask[split_y:, bounds[i]:bounds[i + 1]],
+                           i * 15, marks, bounds[i], split_y, debug_dir, geometry)) for i in range(4)]
+    with timer.stage('sections'):
+        roll_number = run_sections(tasks)[0]
+    logging.info(f"--- Decoded Roll Number: {roll_number} ---")
+    if len(tasks) == 1:
         logging.error("Failed to split MCQ section by vertical lines. Grading aborted.")
+        return roll_number, "Could not find MCQ column separators"
+    return roll_number, None
 
-    score = (total_correct / 60.0) * 100 if len(ANSWER_KEY) > 0 else 0
-    logging.info(f"--- OMR Grading Results ---\nCorrect Answers: {total_correct} / 60\nScore: {score:.2f}%")
-    
-    all_student_answers.sort(key=lambda x: x['question'])
-    write_results_to_csv(image_path, roll_number, all_student_answers, score)
-    
-    cv2.putText(output_image, f"Roll: {roll_number}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 100, 0), 3)
-    cv2.putText(output_image, f"Score: {score:.2f}%", (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-    
-    h_final, w_final = output_image.shape[:2]
-    max_height = 900
-    if h_final > max_height:
-        ratio = max_height / h_final; result_image = cv2.resize(output_image, (int(w_final * ratio), max_height))
-    else: result_image = output_image
+def grade_with_layout(pipeline, layout, marks):
+    """Fast path: samples every calibrated bubble position at once into marks. Returns the roll number, or None if the sheet doesn't match the layout."""
+    gray = pipeline.paper_gray
+    fills, contrast = sample_bubbles(gray, layout)
+    if not validate_samples(gray, layout, contrast): return None
+    roll_count = layout.roll_centers.shape[0] * 10
+    roll_fills = fills[:roll_count].reshape(-1, 10); mcq_fills = fills[roll_count:].reshape(-1, 4)
+
+    roll_marked = roll_fills < get_intensity_threshold(roll_fills.ravel().tolist())
+    roll_number = "".join(str(int(np.argmax(column))) if column.sum() == 1 else "E" for column in roll_marked)
+    logging.info(f"--- Decoded Roll Number: {roll_number} ---")
+
+    grading_threshold = get_intensity_threshold(mcq_fills.ravel().tolist())
+    h, w = gray.shape[:2]; r = layout.bubble_radius * w
+    centers = layout.mcq_centers * (w, h) - pipeline.crop_offset
+    for question_num in range(len(mcq_fills)):
+        marks.record(question_num, mcq_fills[question_num], grading_threshold, [(int(cx - r), int(cy - r), int(2 * r), int(2 * r)) for cx, cy in centers[question_num]])
+    return roll_number
+
+def assess_sheet(marks, roll_number, key, confidence=None):
+    """
+    Per-sheet confidence and the reasons a grading should not be trusted as is: (confidence, reasons, low_confidence_questions).
+    Only keyed questions count, so the verdict depends on the key; confidence defaults to marks.confidence().
+    """
+    confidence = marks.confidence() if confidence is None else confidence
+    scored = key.masks_for(len(marks.detected)) != 0
+    reasons = []
+    missing = np.flatnonzero(scored & ~marks.detected)
+    if missing.size: reasons.append(f"{missing.size} questions not detected")
+    low = np.flatnonzero(scored & (confidence < REVIEW_CONFIDENCE))
+    if low.size: reasons.append(f"{low.size} ambiguous questions")
+    if not (roll_number and roll_number.isdigit()): reasons.append(f"roll number unreadable ({roll_number})")
+    known = confidence[scored & marks.detected]
+    known = known[~np.isnan(known)]
+    sheet_confidence = float(known.min() * marks.detected[scored].mean()) if known.size else 0.0
+    return sheet_confidence, reasons, (low + 1).tolist()
+
+# --- Main Processing Function (MODIFIED: headless, returns a structured result) ---
+def grade_omr_image(image, debug_dir=None, annotate=True, layout=None, geometry=None, answer_key=None, score=True):
+    """
+    Grades one OMR sheet image (BGR or grayscale array) without any GUI. Debug images are written to debug_dir only if set.
+    With a calibrated layout, bubbles are sampled at known positions and contour detection only runs if validation fails.
+    answer_key is a compiled AnswerKey for the sheet's exam/set (defaults to ANSWER_KEY).
+    With score=False only the marks are read (no answers, score or overlay); batch callers score them with score_batch.
+    """
+    timer = StageTimer()
+    key = answer_key or DEFAULT_ANSWER_KEY
+    result = {'success': False, 'error': None, 'roll_number': None, 'answers': [], 'score': 0,
+              'score_percentage': 0.0, 'total_questions': key.total_questions, 'layout_used': False, 'timings': timer.timings}
+    if key.exam_id is not None or key.set_name is not None: result.update(exam_id=key.exam_id, set_name=key.set_name)
+    with timer.stage('total'):
+        if image is None or image.size == 0:
+            result['error'] = "Empty image"; return result
+
+        with timer.stage('fiducials'):
+            # Grading only needs grayscale: convert once before the warp and only warp the color image if it is drawn on
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            corners = find_fiducial_markers(gray)
+        if corners is None:
+            result['error'] = "Could not find 4 fiducial markers"; return result
+        with timer.stage('warp'):
+            paper_gray = four_point_transform(gray, corners)
+            draw = annotate or debug_dir
+            paper = (four_point_transform(image, corners) if image.ndim == 3 else cv2.cvtColor(paper_gray, cv2.COLOR_GRAY2BGR)) if draw else None
+
+            h_paper, w_paper = paper_gray.shape[:2]
+            crop_offset = (int(w_paper * 0.05), int(h_paper * 0.03))
+            pipeline = SheetPipeline(paper_gray, crop_offset, paper)
+        save_debug_image(debug_dir, "cropped_paper", lambda: pipeline.cropped_paper)
+        output_image = pipeline.cropped_paper  # None unless drawing; a view, the paper itself is only used for the overlay
+        if geometry is not None: geometry.update(paper_shape=paper_gray.shape[:2], crop_offset=crop_offset)
+
+        marks = SheetMarks()
+        roll_number = None
+        if layout is not None:
+            with timer.stage('layout'):
+                roll_number = grade_with_layout(pipeline, layout, marks)
+            if roll_number is None:
+                logging.warning("Sheet failed layout validation. Falling back to contour detection.")
+                marks = SheetMarks()
+        if roll_number is not None: result['layout_used'] = True
+        else: roll_number, result['error'] = grade_by_contours(pipeline, marks, timer, debug_dir, geometry)
+
+        # Tier 2: only sheets the fast path is unsure about are re-read with the adaptive bubble mask; the better reading
+        # wins, and whatever is still uncertain is flagged for manual review instead of being accepted.
+        confidence, reasons, low_questions = assess_sheet(marks, roll_number, key)
+        result['tier'] = 'fast'
+        if reasons:
+            logging.info(f"Fast path unsure ({'; '.join(reasons)}). Re-grading with the robust path.")
+            with timer.stage('robust'):
+                robust_marks = SheetMarks()
+                robust_roll, robust_error = grade_by_contours(pipeline.robust(), robust_marks, StageTimer())
+                robust = assess_sheet(robust_marks, robust_roll, key)
+            if (len(robust[1]), -robust[0]) < (len(reasons), -confidence) and robust_marks.detected.sum() >= marks.detected.sum():
+                marks, roll_number, result['error'] = robust_marks, robust_roll, robust_error
+                confidence, reasons, low_questions = robust
+                result.update(tier='robust', layout_used=False)
+        result.update(confidence=round(confidence, 3), needs_review=bool(reasons), review_reasons=reasons, low_confidence_questions=low_questions)
+        if reasons: logging.warning(f"Sheet needs manual review: {'; '.join(reasons)}")
+
+        result.update({'success': result['error'] is None, 'roll_number': roll_number, 'marks': encode_marks(marks.fills, marks.marked, marks.detected, marks.confidence())})
+        if not score: return result
+
+        with timer.stage('score'):
+            all_student_answers, total_correct = score_sheet(marks, key, output_image)
+        percentage = (total_correct / key.total_questions) * 100 if key.total_questions > 0 else 0
+        logging.info(f"--- OMR Grading Results ---\nCorrect Answers: {total_correct} / {key.total_questions}\nScore: {percentage:.2f}%")
+
+        result.update({'answers': all_student_answers, 'score': total_correct, 'score_percentage': round(percentage, 2)})
+
+        if output_image is not None:
+            cv2.putText(output_image, f"Roll: {roll_number}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 100, 0), 3)
+            cv2.putText(output_image, f"Score: {percentage:.2f}%", (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
+            save_debug_image(debug_dir, "graded_sheet", lambda: output_image)
+            if annotate: result['annotated_image'] = output_image
+    return result
+
+def rescore_result(result, answer_key=None):
+    """
+    Scores a graded result's stored marks against another answer key without touching the image again. The review verdict
+    is re-assessed too, since it only covers keyed questions; which reading (fast or robust) was kept is not revisited.
+    """
+    key = answer_key or DEFAULT_ANSWER_KEY
+    marks = SheetMarks.from_encoded(result['marks'])
+    answers, total_correct = score_sheet(marks, key)
+    score = (total_correct / key.total_questions) * 100 if key.total_questions > 0 else 0
+    question_confidence = np.full(len(marks.detected), np.nan)
+    stored = result['marks']['confidence'][:len(question_confidence)]
+    question_confidence[:len(stored)] = [np.nan if c is None else c for c in stored]
+    confidence, reasons, low_questions = assess_sheet(marks, result.get('roll_number'), key, question_confidence)
+    rescored = {k: v for k, v in result.items() if k not in ('exam_id', 'set_name', 'annotated_image', 'processed_image')}
+    rescored.update({'answers': answers, 'score': total_correct, 'score_percentage': round(score, 2), 'total_questions': key.total_questions,
+                     'confidence': round(confidence, 3), 'needs_review': bool(reasons), 'review_reasons': reasons,
+                     'low_confidence_questions': low_questions})
+    if key.exam_id is not None or key.set_name is not None: rescored.update(exam_id=key.exam_id, set_name=key.set_name)
+    return rescored
+
+def calibrate_layout(image):
+    """Runs the contour path on a clean reference sheet and records every bubble center as a SheetLayout."""
+    geometry = {'roll': [], 'mcq': {}}
+    result = grade_omr_image(image, annotate=False, geometry=geometry)
+    if 'paper_shape' not in geometry: raise ValueError(f"Reference sheet could not be aligned: {result['error']}")
+    if not geometry['roll'] or len(geometry['roll']) != len(result['roll_number'] or ''):
+        raise ValueError(f"Not every roll number column was detected on the reference sheet (decoded '{result['roll_number']}')")
+    missing = [q + 1 for q in range(SHEET_QUESTIONS) if q not in geometry['mcq']]
+    if missing: raise ValueError(f"Questions {missing} were not detected on the reference sheet")
+
+    crop_x, crop_y = geometry['crop_offset']
+    roll = np.array(geometry['roll'], dtype=np.float64)
+    mcq = np.array([geometry['mcq'][q] for q in range(SHEET_QUESTIONS)], dtype=np.float64)
+    radius = float(np.median(np.concatenate([roll[..., 2].ravel(), mcq[..., 2].ravel()])))
+    offset = np.array([crop_x, crop_y], dtype=np.float64)
+    return SheetLayout.from_geometry(geometry['paper_shape'], roll[..., :2] + offset, mcq[..., :2] + offset, radius)
+
+def process_omr_sheet(image_path, debug_dir=None, write_csv=True, annotate=False, layout=None, answer_key=None, score=True):
+    """Loads an image from disk, grades it and (optionally) writes the per-sheet CSV. Returns the structured result."""
+    setup_logging()
+    start = time.perf_counter()
+    original_image = load_image(image_path, color=bool(annotate or debug_dir))
+    load_ms = (time.perf_counter() - start) * 1000.0
+    if original_image is None:
+        logging.error(f"Could not load image from {image_path}")
+        return {'success': False, 'error': f"Could not load image from {image_path}", 'image_path': image_path}
 
-    cv2.imshow("Graded Sheet", result_image)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    result = grade_omr_image(original_image, debug_dir=debug_dir, annotate=annotate, layout=layout, answer_key=answer_key, score=score)
+    result['image_path'] = image_path
+    result['timings']['load'] = load_ms
+    if result['error'] and result['roll_number'] is None: logging.error(result['error'])
+    elif write_csv and score: write_results_to_csv(image_path, result['roll_number'], result['answers'], result['score_percentage'])
+    return result
 
 if __name__ == "__main__":
-    image_file = 'scan/finalomr.jpeg'
-    process_omr_sheet(image_file)
\ No newline at end of file
+    # Single sheet: python app.py [image]. For scan folders use batch.py.
+    image_file = sys.argv[1] if len(sys.argv) > 1 else 'scan/finalomr.jpeg'
+    result = process_omr_sheet(image_file, debug_dir='debug')
+    if result.get('timings'): logging.info(f"Timings (ms): { {k: round(v, 1) for k, v in result['timings'].items()} }")
@@ -0,0 +1,122 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from app import DEFAULT_ANSWER_KEY, SHEET_QUESTIONS, process_omr_sheet, set_section_threads, setup_logging
+from layout import load_layout
+from answer_key import load_answer_key
+from results_store import ResultsWriter, read_summary
+from profiling import format_stage_table, profile_sheet, stage_percentiles
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp'}
+
+# --- 1. Collecting Scans ---
+def collect_scans(source):
+    """Returns a sorted list of image paths from a scan directory or a manifest file (one path per line, or a CSV with a 'path' column)."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        return sorted(paths)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        if source.lower().endswith('.csv'): entries = [row['path'] for row in csv.DictReader(f) if row.get('path')]
+        else: entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [p if os.path.isabs(p) else os.path.join(base_dir, p) for p in entries]
+
+def load_completed(output_dir, retry_failed=False):
+    """Sheets already in the results store, so an interrupted batch can resume where it stopped."""
+    completed = set()
+    for row in read_summary(output_dir):
+        if retry_failed and row['Status'] != 'OK': completed.discard(row['Image'])
+        else: completed.add(row['Image'])
+    return completed
+
+# --- 2. Worker Process ---
+def init_worker(section_threads=1):
+    # One OpenCV thread per process; the pool provides the parallelism and oversubscription hurts throughput.
+    cv2.setNumThreads(1)
+    set_section_threads(section_threads)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+
+def grade_one(image_path, layout_path=None, answer_key_path=None, profile_slow_ms=None, profile_dir=None):
+    """
+    Reads one scan's marks; scoring is left to the results writer, which scores whole chunks with score_batch.
+    A sheet slower than profile_slow_ms (load + total) is graded again under cProfile into profile_dir.
+    """
+    try:
+        layout = load_layout(layout_path) if layout_path else None
+        answer_key = load_answer_key(answer_key_path) if answer_key_path else None
+        result = process_omr_sheet(image_path, write_csv=False, annotate=False, layout=layout, answer_key=answer_key, score=False)
+        timings = result.get('timings', {})
+        if profile_slow_ms is not None and timings.get('load', 0) + timings.get('total', 0) >= profile_slow_ms:
+            result['profile'] = profile_sheet(image_path, profile_dir, layout=layout, answer_key=answer_key)
+    except Exception as e:
+        result = {'success': False, 'error': f"Unhandled error: {e}", 'image_path': image_path}
+    result.pop('annotated_image', None)
+    return result
+
+# --- 3. Batch Driver ---
+def run_batch(source, output_dir, workers=None, retry_failed=False, chunk_size=64, layout_path=None, answer_key_path=None, profile_slow_ms=None):
+    """
+    Grades every scan in source on a process pool, appending results to the store in output_dir. Returns a summary dict
+    including per-stage timing percentiles; sheets slower than profile_slow_ms get a cProfile dump in output_dir/profiles.
+    """
+    # Loaded here too so a malformed key fails fast instead of once per sheet; workers still need it for the review checks
+    answer_key = load_answer_key(answer_key_path) if answer_key_path else DEFAULT_ANSWER_KEY
+    writer = ResultsWriter(output_dir, SHEET_QUESTIONS, answer_key=answer_key)
+    scans = collect_scans(source)
+    completed = load_completed(output_dir, retry_failed)
+    pending = [p for p in scans if p not in completed]
+    workers = workers or os.cpu_count() or 1
+    logging.info(f"Found {len(scans)} scans, {len(completed)} already graded, {len(pending)} to grade on {workers} workers.")
+
+    graded = failed = review = 0
+    timings = []; profiles = []
+    profile_dir = os.path.join(output_dir, 'profiles')
+    start = time.perf_counter()
+    with writer, ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        # Submit in bounded windows so huge scan folders don't queue thousands of futures at once.
+        for window_start in range(0, len(pending), chunk_size * workers):
+            futures = [pool.submit(grade_one, p, layout_path, answer_key_path, profile_slow_ms, profile_dir) for p in pending[window_start:window_start + chunk_size * workers]]
+            for future in as_completed(futures):
+                result = future.result()
+                writer.write(result)
+                if result.get('timings'): timings.append(result['timings'])
+                if result.get('profile'): profiles.append(result['profile'])
+                graded += 1; failed += 0 if result.get('success') else 1; review += 1 if result.get('needs_review') else 0
+            elapsed = time.perf_counter() - start
+            logging.info(f"Graded {graded}/{len(pending)} sheets ({graded / elapsed:.1f} sheets/s)")
+
+    elapsed = time.perf_counter() - start
+    summary = {'total': len(scans), 'graded': graded, 'failed': failed, 'needs_review': review, 'skipped': len(scans) - len(pending),
+               'seconds': round(elapsed, 2), 'sheets_per_second': round(graded / elapsed, 2) if elapsed > 0 else 0.0,
+               'stages': stage_percentiles(timings) if timings else {}, 'profiles': profiles}
+    logging.info(f"Batch finished: { {k: v for k, v in summary.items() if k != 'stages'} }")
+    if timings: logging.info(f"Stage timings over {len(timings)} sheets:\n{format_stage_table(summary['stages'])}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a folder or manifest of scanned OMR sheets on all CPU cores.")
+    parser.add_argument('source', help="Scan directory, or a manifest file listing one image path per line")
+    parser.add_argument('-o', '--output', default='batch_results', help="Results store directory (summary.csv plus columnar marks, see results_store.py)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--retry-failed', action='store_true', help="Re-grade sheets that failed in a previous run")
+    parser.add_argument('--answer-key', default=None, help="Answer key JSON for this exam/set (ExamSet answer_key shape); default: built-in key")
+    parser.add_argument('--layout', default=None, help="Calibrated layout file (see layout.py) enabling the fixed-geometry fast path")
+    parser.add_argument('--profile-slow', type=float, default=None, metavar='MS', help="Write a cProfile dump (<output>/profiles/) for every sheet slower than MS milliseconds")
+    args = parser.parse_args(argv)
+    setup_logging()
+    summary = run_batch(args.source, args.output, workers=args.workers, retry_failed=args.retry_failed, layout_path=args.layout,
+                        answer_key_path=args.answer_key, profile_slow_ms=args.profile_slow)
+    print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+from app import SHEET_QUESTIONS, process_omr_sheet
+from layout import load_layout
+from scoring import MarkBatch
+from profiling import format_stage_table, stage_percentiles
+from synthetic import add_degrade_arguments, degrade_options, generate_corpus
+
+# --- Throughput and Accuracy Benchmark ---
+# Grades a corpus with known answers (truth.json from synthetic.py) one sheet at a time, so the numbers are
+# per-sheet latency on one core, and checks every roll number and answer against the ground truth.
+
+def accuracy(results, truths):
+    """Compares grader output with ground truth: roll numbers, per-question answer text, blank and multi-mark detection, review flags."""
+    expected = np.array([t['answers'][:SHEET_QUESTIONS] for t in truths], dtype=object)
+    got = MarkBatch.from_results(results, SHEET_QUESTIONS).answer_text()
+    match = got == expected
+    sheets = len(truths)
+    return {'sheets': sheets,
+            'failed_sheets': sum(1 for r in results if not r.get('success')),
+            'roll_accuracy': round(sum(r.get('roll_number') == t['roll_number'] for r, t in zip(results, truths)) / sheets, 4) if sheets else 0.0,
+            'answer_accuracy': round(float(match.mean()), 4) if match.size else 0.0,
+            'exact_sheets': int(match.all(axis=1).sum()),
+            'blank_recall': round(float(match[expected == 'Blank'].mean()), 4) if (expected == 'Blank').any() else None,
+            'multi_recall': round(float(match[expected == 'Error'].mean()), 4) if (expected == 'Error').any() else None,
+            'undetected_questions': int((got == '').sum()),
+            'robust_sheets': sum(1 for r in results if r.get('tier') == 'robust'),
+            'review_sheets': sum(1 for r in results if r.get('needs_review')),
+            # The number that must stay at 0: sheets accepted without review although something was read wrong
+            'accepted_with_errors': sum(1 for r, t, ok in zip(results, truths, match.all(axis=1))
+                                        if not r.get('needs_review') and r.get('success') and not (ok and r.get('roll_number') == t['roll_number']))}
+
+def run_benchmark(corpus_dir, layout_path=None, limit=None, repeat=1):
+    """Grades every sheet listed in corpus_dir/truth.json. Returns the report dict."""
+    with open(os.path.join(corpus_dir, 'truth.json')) as f: truth = json.load(f)
+    names = sorted(truth)[:limit]
+    layout = load_layout(layout_path) if layout_path else None
+
+    results = []; timings = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = []
+        for name in names:
+            result = process_omr_sheet(os.path.join(corpus_dir, name), write_csv=False, layout=layout)
+            results.append(result); timings.append(result.get('timings', {}))
+    elapsed = time.perf_counter() - start
+    graded = len(names) * repeat
+    return {'sheets_per_second': round(graded / elapsed, 2) if elapsed > 0 else 0.0, 'seconds': round(elapsed, 2),
+            'layout': bool(layout), 'stages': stage_percentiles(timings), 'accuracy': accuracy(results, [truth[n] for n in names]),
+            'mismatches': [{'image': n, 'roll_number': r.get('roll_number'), 'expected_roll': truth[n]['roll_number'], 'error': r.get('error')}
+                           for n, r in zip(names, results) if not r.get('success') or r.get('roll_number') != truth[n]['roll_number']][:20]}
+
+def print_report(report):
+    acc = report['accuracy']
+    print(f"Graded {acc['sheets']} sheets in {report['seconds']} s: {report['sheets_per_second']} sheets/s (layout: {'yes' if report['layout'] else 'no'})")
+    print(format_stage_table(report['stages']))
+    print(f"roll accuracy {acc['roll_accuracy']:.2%}, answer accuracy {acc['answer_accuracy']:.2%}, exact sheets {acc['exact_sheets']}/{acc['sheets']}, failed {acc['failed_sheets']}")
+    if acc['blank_recall'] is not None: print(f"blank recall {acc['blank_recall']:.2%}")
+    if acc['multi_recall'] is not None: print(f"multi-mark recall {acc['multi_recall']:.2%}")
+    print(f"robust path used {acc['robust_sheets']}, flagged for review {acc['review_sheets']}, accepted with errors {acc['accepted_with_errors']}")
+    for m in report['mismatches']: print(f"  {m['image']}: roll {m['roll_number']!r} (expected {m['expected_roll']}) {m['error'] or ''}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure grading speed and accuracy on sheets with known answers.")
+    parser.add_argument('corpus', nargs='?', help="Directory with truth.json (from synthetic.py); generated on the fly if omitted")
+    parser.add_argument('-n', '--count', type=int, default=50, help="Sheets to generate (or the first N of the corpus)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated corpus")
+    parser.add_argument('--layout', help="Grade with this calibrated layout file")
+    parser.add_argument('--repeat', type=int, default=1, help="Grade the corpus this many times (timings only)")
+    parser.add_argument('--json', help="Also write the report to this file")
+    add_degrade_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.corpus: report = run_benchmark(args.corpus, args.layout, args.count, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory(prefix='omr-bench-') as corpus:
+            generate_corpus(corpus, args.count, args.seed, **degrade_options(args))
+            report = run_benchmark(corpus, args.layout, repeat=args.repeat)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(report, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from app import rescore_result
+
+# --- Content-Hash Result Cache ---
+# Scanning stations re-upload the same sheet after jams and retries. Results are cached by the SHA-256 of the image bytes:
+#   sheets   image hash -> graded result with its raw marks (independent of the answer key)
+#   scores   (image hash, score key) -> the full result the service returned for that key; the score key is the key's
+#            version plus its exam and set, so exams sharing an identical key still get their own exam_id / set_name back
+# A repeat upload with the same key is answered from 'scores'; with a changed key the score and the review verdict are
+# recomputed from the marks and their per-question confidence.
+CACHE_VERSION = 3
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def score_key(key):
+    return json.dumps([key.version, key.exam_id, key.set_name])
+
+class GradeCache:
+    """SQLite-backed cache shared by the request threads of one service; entries older than max_age seconds are pruned."""
+    def __init__(self, path, max_age=30 * 86400):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.hits = self.rescored = self.misses = 0
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sheets (hash TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS scores (hash TEXT NOT NULL, key_version TEXT NOT NULL, result TEXT NOT NULL, "
+                            "has_image INTEGER NOT NULL, created REAL NOT NULL, PRIMARY KEY (hash, key_version))")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            row = self.db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or int(row[0]) != CACHE_VERSION:
+                self.db.execute("DELETE FROM sheets"); self.db.execute("DELETE FROM scores")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+        self.prune()
+
+    def lookup(self, image_hash, key, need_image=False):
+        """
+        (result, rescored) for these image bytes under this answer key, or (None, False) on a miss. need_image requires the annotated image,
+        which depends on the key, so a changed key can only be served from the marks when no image is wanted.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT result, has_image FROM scores WHERE hash = ? AND key_version = ?", (image_hash, score_key(key))).fetchone()
+            if row and (row[1] or not need_image):
+                self.hits += 1
+                return json.loads(row[0]), False
+            sheet = None if need_image else self.db.execute("SELECT result FROM sheets WHERE hash = ?", (image_hash,)).fetchone()
+        if sheet is None:
+            self.misses += 1
+            return None, False
+        result = rescore_result(json.loads(sheet[0]), key)
+        self.rescored += 1
+        self.put(image_hash, key, result)
+        return result, True
+
+    def put(self, image_hash, key, result):
+        """Caches a finished grading. Only sheets that got as far as reading marks are kept; failures are retried on re-upload."""
+        if not result.get('marks'): return
+        now = time.time()
+        sheet = {k: v for k, v in result.items() if k not in ('processed_image', 'annotated_image')}
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO sheets VALUES (?, ?, ?)", (image_hash, json.dumps(sheet), now))
+            self.db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                            (image_hash, score_key(key), json.dumps(result), int('processed_image' in result), now))
+
+    def prune(self):
+        cutoff = time.time() - self.max_age
+        with self.lock, self.db:
+            removed = self.db.execute("DELETE FROM sheets WHERE created < ?", (cutoff,)).rowcount
+            removed += self.db.execute("DELETE FROM scores WHERE created < ?", (cutoff,)).rowcount
+        if removed: logging.info(f"Pruned {removed} expired entries from {self.path}")
+
+    def stats(self):
+        with self.lock:
+            return {'entries': self.db.execute("SELECT COUNT(*) FROM sheets").fetchone()[0],
+                    'hits': self.hits, 'rescored': self.rescored, 'misses': self.misses}
+
+    def close(self):
+        with self.lock: self.db.close()
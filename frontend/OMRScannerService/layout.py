@@ -0,0 +1,105 @@
+import json
+import logging
+import argparse
+from functools import lru_cache
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+# --- Calibrated Sheet Layout ---
+# Bubble centers are stored in the normalized warped-paper frame (x / paper width, y / paper height),
+# i.e. the image returned by four_point_transform before any cropping, so one layout fits any scan resolution.
+LAYOUT_VERSION = 1
+
+@dataclass
+class SheetLayout:
+    roll_centers: np.ndarray  # (digits, 10, 2)
+    mcq_centers: np.ndarray  # (questions, 4, 2)
+    bubble_radius: float  # Normalized by paper width
+    paper_aspect: float  # Paper height / width of the reference sheet
+
+    @property
+    def all_centers(self):
+        return np.concatenate([self.roll_centers.reshape(-1, 2), self.mcq_centers.reshape(-1, 2)])
+
+    def to_dict(self):
+        return {'version': LAYOUT_VERSION, 'bubble_radius': self.bubble_radius, 'paper_aspect': self.paper_aspect,
+                'roll_centers': np.round(self.roll_centers, 6).tolist(), 'mcq_centers': np.round(self.mcq_centers, 6).tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != LAYOUT_VERSION: raise ValueError(f"Unsupported layout version: {data.get('version')}")
+        roll = np.asarray(data['roll_centers'], dtype=np.float64); mcq = np.asarray(data['mcq_centers'], dtype=np.float64)
+        if roll.ndim != 3 or roll.shape[1:] != (10, 2) or mcq.ndim != 3 or mcq.shape[1:] != (4, 2):
+            raise ValueError(f"Malformed layout: roll {roll.shape}, mcq {mcq.shape}")
+        return cls(roll, mcq, float(data['bubble_radius']), float(data['paper_aspect']))
+
+    def save(self, path):
+        with open(path, 'w') as f: json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def from_geometry(cls, paper_shape, roll_columns, mcq_questions, radius_px):
+        """Builds a layout from pixel centers measured on a reference sheet's warped paper."""
+        h, w = paper_shape[:2]
+        scale = np.array([w, h], dtype=np.float64)
+        return cls(np.asarray(roll_columns, dtype=np.float64) / scale, np.asarray(mcq_questions, dtype=np.float64) / scale,
+                   float(radius_px) / w, h / float(w))
+
+@lru_cache(maxsize=8)
+def load_layout(path):
+    """Loads a layout file; cached so worker processes parse it once."""
+    with open(path) as f: return SheetLayout.from_dict(json.load(f))
+
+# --- Vectorized Sampling with a Summed-Area Table ---
+def box_sums(integral, cx, cy, half):
+    h, w = integral.shape[0] - 1, integral.shape[1] - 1
+    x0 = np.clip(np.rint(cx - half), 0, w).astype(np.intp); x1 = np.clip(np.rint(cx + half) + 1, 0, w).astype(np.intp)
+    y0 = np.clip(np.rint(cy - half), 0, h).astype(np.intp); y1 = np.clip(np.rint(cy + half) + 1, 0, h).astype(np.intp)
+    sums = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return sums, np.maximum((x1 - x0) * (y1 - y0), 1)
+
+def sample_bubbles(gray_paper, layout):
+    """
+    Samples every bubble of the layout at once. Returns (fills, contrast), both flat arrays in all_centers order:
+    fills is the mean gray of the bubble interior, contrast is how much darker the bubble box is than the paper ring around it.
+    """
+    h, w = gray_paper.shape[:2]
+    integral = cv2.integral(gray_paper)
+    centers = layout.all_centers
+    cx, cy = centers[:, 0] * w, centers[:, 1] * h
+    r = layout.bubble_radius * w
+
+    inner_sum, inner_area = box_sums(integral, cx, cy, 0.55 * r)
+    body_sum, body_area = box_sums(integral, cx, cy, r)
+    outer_sum, outer_area = box_sums(integral, cx, cy, 1.4 * r)
+    ring = (outer_sum - body_sum) / np.maximum(outer_area - body_area, 1)
+    return inner_sum / inner_area, ring - body_sum / body_area
+
+def validate_samples(gray_paper, layout, contrast, min_contrast=20.0, min_fraction=0.97, aspect_tolerance=0.03):
+    """The fast path is trusted only if the paper shape matches and (nearly) every expected bubble is really there."""
+    h, w = gray_paper.shape[:2]
+    if abs(h / float(w) - layout.paper_aspect) > aspect_tolerance * layout.paper_aspect:
+        logging.warning(f"Paper aspect {h / float(w):.3f} does not match layout {layout.paper_aspect:.3f}.")
+        return False
+    fraction = float(np.mean(contrast > min_contrast))
+    if fraction < min_fraction:
+        logging.warning(f"Only {fraction:.1%} of layout bubbles found at their calibrated positions.")
+        return False
+    return True
+
+def main(argv=None):
+    from app import calibrate_layout, load_image, setup_logging
+    parser = argparse.ArgumentParser(description="Learn bubble positions from a cleanly scanned reference sheet.")
+    parser.add_argument('reference', help="Reference sheet image")
+    parser.add_argument('-o', '--output', default='layout.json', help="Layout file to write")
+    args = parser.parse_args(argv)
+    setup_logging()
+    image = load_image(args.reference)
+    if image is None: raise SystemExit(f"Could not load image from {args.reference}")
+    layout = calibrate_layout(image)
+    layout.save(args.output)
+    logging.info(f"Wrote layout with {layout.roll_centers.shape[0]} roll digits and {layout.mcq_centers.shape[0]} questions to {args.output}")
+
+if __name__ == "__main__":
+    main()
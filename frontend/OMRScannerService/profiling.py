@@ -0,0 +1,50 @@
+import os
+import cProfile
+
+import numpy as np
+
+import app
+
+# --- Stage Timing Aggregation and Outlier Profiles ---
+# Every graded result carries 'timings': milliseconds per stage of process_omr_sheet / grade_omr_image:
+#   load        read + decode the image file            fiducials  find the four corner markers
+#   warp        perspective transform + crop            separators horizontal / vertical rules (contour path)
+#   roll, mcq   bubble reading per section (summed over section threads; 'sections' is their wall time)
+#   layout      fixed-geometry fast path                robust     adaptive-threshold re-read of unsure sheets
+#   score       answer-key scoring and overlay          total      everything after load
+# Percentiles over a batch show which stage the slow sheets are slow in; outliers can be re-run under cProfile.
+STAGE_ORDER = ['load', 'fiducials', 'warp', 'layout', 'separators', 'roll', 'mcq', 'sections', 'robust', 'score', 'total']
+PERCENTILES = (50, 90, 99)
+
+def stage_percentiles(timings):
+    """Mean, p50 / p90 / p99 and max milliseconds per stage over a list of per-sheet timing dicts."""
+    names = [n for n in STAGE_ORDER if any(n in t for t in timings)] + sorted({k for t in timings for k in t} - set(STAGE_ORDER))
+    stats = {}
+    for name in names:
+        values = np.array([t[name] for t in timings if name in t], dtype=np.float64)
+        p = np.percentile(values, PERCENTILES)
+        stats[name] = {'sheets': len(values), 'mean_ms': round(float(values.mean()), 2),
+                       **{f"p{q}_ms": round(float(v), 2) for q, v in zip(PERCENTILES, p)}, 'max_ms': round(float(values.max()), 2)}
+    return stats
+
+def format_stage_table(stats):
+    """Fixed-width text table of stage_percentiles() output, one line per stage."""
+    lines = [f"{'stage':<11}{'sheets':>7}{'mean ms':>9}" + ''.join(f"{f'p{q} ms':>9}" for q in PERCENTILES) + f"{'max ms':>9}"]
+    for name, s in stats.items():
+        lines.append(f"{name:<11}{s['sheets']:>7}{s['mean_ms']:>9.1f}" + ''.join(f"{s[f'p{q}_ms']:>9.1f}" for q in PERCENTILES) + f"{s['max_ms']:>9.1f}")
+    return '\n'.join(lines)
+
+def profile_sheet(image_path, profile_dir, **grade_options):
+    """
+    Grades image_path again under cProfile and writes <profile_dir>/<image name>.prof (inspect with python -m pstats).
+    Section threads are switched off for the run: cProfile only sees the calling thread.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    dump_path = os.path.join(profile_dir, f"{os.path.splitext(os.path.basename(image_path))[0]}.prof")
+    threads = app.SECTION_THREADS
+    app.set_section_threads(1)
+    profiler = cProfile.Profile()
+    try: profiler.runcall(app.process_omr_sheet, image_path, write_csv=False, **grade_options)
+    finally: app.set_section_threads(threads)
+    profiler.dump_stats(dump_path)
+    return dump_path
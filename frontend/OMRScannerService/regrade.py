@@ -0,0 +1,74 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+
+from answer_key import load_answer_key, set_file_name
+from scoring import score_batch
+from results_store import META_FILE, SUMMARY_FIELDS, SUMMARY_FILE, load_results
+
+# --- Regrading from Stored Marks ---
+# A results store keeps every sheet's marked bits and fill intensities (see results_store.py), so a corrected answer
+# key only needs score_batch() over the stored tensor: no image is loaded. Every row is rewritten, including superseded
+# retries, so summary.csv stays row-aligned with marked.bin / fills.bin. A key for one set of a multi-set exam only
+# rescores the rows of that set; a key without a set name is refused for a store holding several sets.
+
+def regrade_store(store_dir, key, output_path=None):
+    """
+    Rescores the sheets of a store that key applies to. Writes the updated summary to output_path, or replaces the
+    store's summary.csv (atomically) when output_path is None. Returns counts of rescored sheets and changed scores.
+    Raises ValueError, without touching the store, when the key applies to none of its sheets or names no set while
+    the store holds sheets of several sets.
+    """
+    start = time.perf_counter()
+    with open(os.path.join(store_dir, META_FILE)) as f: meta = json.load(f)
+    rows, batch = load_results(store_dir, latest_only=False)
+    key_set = set_file_name(key.set_name) if key.set_name is not None else None  # "Set B" and "Set_B" name the same set
+    if key_set is None:
+        store_sets = sorted({row['Set'] for row in rows}, key=set_file_name)
+        if len({set_file_name(name) for name in store_sets}) > 1:
+            raise ValueError(f"{store_dir} holds sheets of sets {store_sets}: the answer key must name the set it is for")
+    scores = score_batch(batch, key)
+    rescored = changed = 0
+    rescored_sets = set()
+    for row, correct, percentage in zip(rows, scores['score'].tolist(), scores['score_percentage'].tolist()):
+        if key_set is not None and set_file_name(row['Set']) != key_set: continue
+        rescored += 1; rescored_sets.add(row['Set'])
+        if row['Correct'] != str(correct): changed += 1
+        row.update({'Correct': correct, 'Total Questions': scores['total_questions'], 'Score (%)': f"{percentage:.2f}"})
+        if key.exam_id is not None: row['Exam'] = key.exam_id
+    if not rescored:
+        raise ValueError(f"No sheet in {store_dir} belongs to set {key.set_name!r}" if key_set is not None else f"No sheets in {store_dir}")
+
+    fields = SUMMARY_FIELDS + [f"Q{i + 1}" for i in range(meta['question_count'])]
+    target = output_path or os.path.join(store_dir, SUMMARY_FILE)
+    tmp_path = f"{target}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader(); writer.writerows(rows)
+    os.replace(tmp_path, target)
+    if output_path is None:
+        versions = meta.setdefault('answer_key_versions', {})
+        for set_name in rescored_sets: versions[set_name] = key.version
+        with open(os.path.join(store_dir, META_FILE), 'w') as f: json.dump(meta, f)
+
+    summary = {'sheets': len(rows), 'rescored': rescored, 'changed': changed, 'total_questions': scores['total_questions'],
+               'answer_key_version': key.version, 'output': target, 'seconds': round(time.perf_counter() - start, 3)}
+    logging.info(f"Regraded {store_dir}: {summary}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rescore a results store against a corrected answer key without re-reading any image.")
+    parser.add_argument('store', help="Results store directory written by batch.py or the service")
+    parser.add_argument('--answer-key', required=True, help="Corrected answer key JSON")
+    parser.add_argument('-o', '--output', help="Write the regraded summary here instead of replacing the store's summary.csv")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try: summary = regrade_store(args.store, load_answer_key(args.answer_key), args.output)
+    except ValueError as e: parser.exit(1, f"Regrade failed: {e}\n")
+    print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
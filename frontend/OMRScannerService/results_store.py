@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import time
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from answer_key import CHOICE_BITS
+from scoring import MarkBatch, score_batch
+
+# --- Columnar Results Store ---
+# One directory per exam / batch instead of one CSV per sheet:
+#   summary.csv  one row per sheet (roll, score, status, Q1..Qn answers) - what the backend ingests in one read
+#   marked.bin   int8 (rows x questions) marked bitmask per question, -1 = not detected
+#   fills.bin    float16 (rows x questions x 4) bubble fill intensities
+#   meta.json    question count and dtypes
+#   review.csv   manual review queue: sheets the grader was not confident about, with the reasons (created on demand)
+# Rows are appended by a writer thread in buffered chunks; row i of the .bin files belongs to row i of summary.csv.
+# A writer given an answer key scores each chunk with score_batch, so batch workers can skip per-sheet scoring.
+STORE_VERSION = 1
+SUMMARY_FILE = 'summary.csv'
+MARKED_FILE = 'marked.bin'
+FILLS_FILE = 'fills.bin'
+META_FILE = 'meta.json'
+REVIEW_FILE = 'review.csv'
+SUMMARY_FIELDS = ['Image', 'Roll Number', 'Exam', 'Set', 'Status', 'Correct', 'Total Questions', 'Score (%)', 'Layout']
+REVIEW_FIELDS = ['Image', 'Roll Number', 'Exam', 'Set', 'Confidence', 'Tier', 'Reasons', 'Questions']
+
+def summary_row(result, answers):
+    return [result.get('image_path'), result.get('roll_number'), result.get('exam_id') or '', result.get('set_name') or '',
+            'OK' if result.get('success') else (result.get('error') or 'Failed'), result.get('score', 0), result.get('total_questions', 0),
+            f"{result.get('score_percentage', 0.0):.2f}", 'yes' if result.get('layout_used') else 'no'] + answers
+
+def review_row(result):
+    return [result.get('image_path'), result.get('roll_number'), result.get('exam_id') or '', result.get('set_name') or '',
+            result.get('confidence', ''), result.get('tier', ''), '; '.join(result.get('review_reasons', [])),
+            ' '.join(str(q) for q in result.get('low_confidence_questions', []))]
+
+class ResultsWriter:
+    """
+    Appends graded sheets to a results store from a dedicated thread; write() only enqueues. With an answer_key the
+    Correct / Total Questions / Score (%) columns come from score_batch over each chunk instead of the results' own scores.
+    """
+    def __init__(self, output_dir, question_count=60, flush_every=256, flush_interval=2.0, max_pending=4096, answer_key=None):
+        self.output_dir = output_dir
+        self.answer_key = answer_key
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.question_count = open_store(output_dir, question_count)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.rows_written = 0
+        self.thread = threading.Thread(target=self._run, name='omr-results-writer', daemon=True)
+        self.thread.start()
+
+    def write(self, result):
+        if self.error: raise RuntimeError(f"Results writer failed: {self.error}")
+        self.queue.put(result)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error: raise RuntimeError(f"Results writer failed: {self.error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        # A chunk is written once flush_every rows are buffered or its first row has waited flush_interval seconds,
+        # so a slow steady trickle (a watched scan folder) still reaches disk within seconds.
+        buffer = []; deadline = None
+        while True:
+            timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+            try: item = self.queue.get(timeout=timeout)
+            except queue.Empty: item = False
+            if item:
+                buffer.append(item)
+                if deadline is None: deadline = time.monotonic() + self.flush_interval
+            if buffer and (item is None or len(buffer) >= self.flush_every or time.monotonic() >= deadline):
+                try: self._flush(buffer)
+                except Exception as e:
+                    logging.error(f"Could not write results to {self.output_dir}: {e}")
+                    self.error = e
+                buffer = []; deadline = None
+            if item is None: return
+
+    def _flush(self, results):
+        batch = MarkBatch.from_results(results, self.question_count)
+        marked = np.where(batch.detected, batch.marked_bits, -1).astype(np.int8)
+        fills = batch.fills.astype(np.float16)
+        answers = batch.answer_text().tolist()
+        if self.answer_key is not None:
+            scores = score_batch(batch, self.answer_key)
+            results = [dict(r, score=int(correct), total_questions=scores['total_questions'], score_percentage=float(percentage))
+                       for r, correct, percentage in zip(results, scores['score'], scores['score_percentage'])]
+
+        # Columns first, summary last: on a crash open_store() trims the columns back to the summary's row count.
+        with open(os.path.join(self.output_dir, MARKED_FILE), 'ab') as f: marked.tofile(f)
+        with open(os.path.join(self.output_dir, FILLS_FILE), 'ab') as f: fills.tofile(f)
+        with open(os.path.join(self.output_dir, SUMMARY_FILE), 'a', newline='') as f:
+            csv.writer(f).writerows(summary_row(r, a) for r, a in zip(results, answers))
+        self.rows_written += len(results)
+        review = [review_row(r) for r in results if r.get('needs_review')]
+        if review:
+            review_path = os.path.join(self.output_dir, REVIEW_FILE)
+            new_file = not os.path.exists(review_path)
+            with open(review_path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if new_file: writer.writerow(REVIEW_FIELDS)
+                writer.writerows(review)
+
+def open_store(output_dir, question_count=60):
+    """Creates a store or reopens an existing one, repairing a partially written last chunk. Returns its question count."""
+    os.makedirs(output_dir, exist_ok=True)
+    meta_path = os.path.join(output_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f: question_count = json.load(f)['question_count']
+    else:
+        with open(meta_path, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'question_count': question_count, 'marked_dtype': 'int8', 'fills_dtype': 'float16'}, f)
+        with open(os.path.join(output_dir, SUMMARY_FILE), 'w', newline='') as f:
+            csv.writer(f).writerow(SUMMARY_FIELDS + [f"Q{i + 1}" for i in range(question_count)])
+
+    summary_path = os.path.join(output_dir, SUMMARY_FILE)
+    with open(summary_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            logging.warning(f"Dropping a partially written last row of {summary_path}.")
+            f.truncate(data.rfind(b'\n') + 1)
+    rows = len(read_summary(output_dir))
+    for name, row_bytes in ((MARKED_FILE, question_count), (FILLS_FILE, question_count * 4 * 2)):
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path): open(path, 'wb').close()
+        if os.path.getsize(path) != rows * row_bytes:
+            logging.warning(f"Trimming {path} to {rows} rows after an interrupted write.")
+            with open(path, 'r+b') as f: f.truncate(min(os.path.getsize(path), rows * row_bytes))
+    return question_count
+
+def read_summary(output_dir):
+    path = os.path.join(output_dir, SUMMARY_FILE)
+    if not os.path.exists(path): return []
+    with open(path, newline='') as f:
+        return [row for row in csv.DictReader(f)]
+
+def load_results(output_dir, latest_only=True):
+    """
+    Reads a whole store at once: (summary rows, MarkBatch). With latest_only, sheets graded more than once
+    (e.g. retried failures) keep only their last row.
+    """
+    with open(os.path.join(output_dir, META_FILE)) as f: question_count = json.load(f)['question_count']
+    rows = read_summary(output_dir)
+    marked = np.fromfile(os.path.join(output_dir, MARKED_FILE), dtype=np.int8)[:len(rows) * question_count].reshape(-1, question_count)
+    fills = np.fromfile(os.path.join(output_dir, FILLS_FILE), dtype=np.float16)[:len(rows) * question_count * 4].reshape(-1, question_count, 4)
+    rows = rows[:len(marked)]
+    if latest_only:
+        last = {}
+        for i, row in enumerate(rows): last[row['Image']] = i
+        keep = np.array(sorted(last.values()), dtype=np.intp)
+        rows = [rows[i] for i in keep]; marked = marked[keep]; fills = fills[keep]
+
+    detected = marked >= 0
+    batch = MarkBatch(fills.astype(np.float32), ((marked[..., None] & CHOICE_BITS) != 0) & detected[..., None], detected,
+                      [r['Image'] for r in rows], [r['Roll Number'] for r in rows])
+    return rows, batch
@@ -0,0 +1,80 @@
+import numpy as np
+
+from answer_key import CHOICE_BITS, POPCOUNT, marked_bits
+
+# --- Batch Mark Tensors ---
+# Every graded sheet carries its raw readings as result['marks'] = {'fills': [[4 floats] or None per question],
+# 'marked': [4-bit mask per question, -1 if the question was not detected], 'confidence': [per question or None]}
+# (confidence only on results straight from the grader). A batch stacks them into
+# (sheets x questions x 4) arrays so classification and scoring for a whole exam are a few NumPy operations.
+
+# Answer text per 4-bit marked mask: nothing marked is 'Blank', one bit is its letter, several bits are 'Error'
+ANSWER_TEXT = np.array(['Blank' if bits == 0 else 'ABCD'[bits.bit_length() - 1] if bits & (bits - 1) == 0 else 'Error' for bits in range(16)] + [''], dtype=object)
+
+def encode_marks(fills, marked, detected, confidence=None):
+    """Per-sheet JSON-friendly form of a (questions x 4) reading, optionally with its per-question confidence."""
+    bits = np.where(detected, (marked * CHOICE_BITS).sum(axis=1), -1)
+    encoded = {'fills': [[round(float(v), 1) for v in row] if ok else None for row, ok in zip(fills, detected)],
+               'marked': bits.astype(int).tolist()}
+    if confidence is not None: encoded['confidence'] = [None if np.isnan(c) else round(float(c), 3) for c in confidence]
+    return encoded
+
+class MarkBatch:
+    """Stacked readings for many sheets: fills (S, Q, 4) float32, marked (S, Q, 4) bool, detected (S, Q) bool."""
+    def __init__(self, fills, marked, detected, image_paths=None, roll_numbers=None):
+        self.fills = fills
+        self.marked = marked
+        self.detected = detected
+        self.image_paths = list(image_paths) if image_paths is not None else [None] * len(fills)
+        self.roll_numbers = list(roll_numbers) if roll_numbers is not None else [None] * len(fills)
+
+    def __len__(self):
+        return len(self.fills)
+
+    @classmethod
+    def from_results(cls, results, question_count=None):
+        """Stacks result['marks'] of graded sheets; sheets without marks (failed alignment) become all-undetected rows."""
+        question_count = question_count or max((len(r['marks']['marked']) for r in results if r.get('marks')), default=0)
+        bits = np.full((len(results), question_count), -1, dtype=np.int8)
+        fills = np.full((len(results), question_count, 4), np.nan, dtype=np.float32)
+        for i, r in enumerate(results):
+            marks = r.get('marks')
+            if not marks: continue
+            row = marks['marked'][:question_count]
+            bits[i, :len(row)] = row
+            fills[i, :len(row)] = [f if f is not None else (np.nan,) * 4 for f in marks['fills'][:question_count]]
+        detected = bits >= 0
+        marked = ((np.maximum(bits, 0)[..., None].astype(np.uint8) & CHOICE_BITS) != 0) & detected[..., None]
+        return cls(fills, marked, detected, [r.get('image_path') for r in results], [r.get('roll_number') for r in results])
+
+    def save(self, path):
+        np.savez_compressed(path, fills=self.fills, marked=self.marked, detected=self.detected,
+                            image_paths=np.array(self.image_paths, dtype=str), roll_numbers=np.array([str(r) for r in self.roll_numbers], dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['fills'], data['marked'], data['detected'], data['image_paths'].tolist(), data['roll_numbers'].tolist())
+
+    @property
+    def marked_bits(self):
+        return marked_bits(self.marked)
+
+    def answer_text(self):
+        """(S, Q) array of 'A'..'D', 'Blank', 'Error', or '' for undetected questions."""
+        return ANSWER_TEXT[np.where(self.detected, self.marked_bits, 16)]
+
+def score_batch(batch, key):
+    """
+    Classifies and scores every sheet of a batch at once against a compiled AnswerKey.
+    Returns (S, Q) boolean arrays blank / multi / correct and (S,) correct counts and percentages.
+    """
+    bits = batch.marked_bits
+    marked_count = POPCOUNT[bits]
+    keyed = key.masks_for(bits.shape[1]) != 0
+    correct = (marked_count == 1) & ((bits & key.masks_for(bits.shape[1])) != 0) & batch.detected
+    score = correct.sum(axis=1)
+    total = int(keyed.sum())
+    return {'blank': batch.detected & (marked_count == 0), 'multi': marked_count > 1, 'correct': correct,
+            'score': score, 'total_questions': total,
+            'score_percentage': np.round(score * (100.0 / total), 2) if total else np.zeros(len(batch))}
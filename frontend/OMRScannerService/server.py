@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import base64
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from flask import Flask, jsonify, request, send_file
+from werkzeug.utils import secure_filename
+
+from app import DEFAULT_ANSWER_KEY, SECTION_THREADS, SHEET_QUESTIONS, process_omr_sheet, setup_logging
+from batch import IMAGE_EXTENSIONS, init_worker
+from layout import load_layout
+from answer_key import AnswerKey, find_answer_key, set_file_name
+from results_store import SUMMARY_FILE, ResultsWriter
+from cache import GradeCache, image_hash
+from regrade import regrade_store
+
+# --- 1. Configuration (matches the omr-service entry in docker-compose.yml) ---
+HOST = os.environ.get('OMR_SERVICE_HOST', '0.0.0.0')
+PORT = int(os.environ.get('OMR_SERVICE_PORT', 8001))
+UPLOAD_DIR = os.environ.get('OMR_UPLOAD_DIR', 'uploads')
+WORKERS = int(os.environ.get('OMR_WORKERS', os.cpu_count() or 1))
+MAX_QUEUE = int(os.environ.get('OMR_MAX_QUEUE', WORKERS * 16))
+SYNC_TIMEOUT = float(os.environ.get('OMR_SYNC_TIMEOUT', 60))
+JOB_TTL = float(os.environ.get('OMR_JOB_TTL', 3600))
+KEEP_UPLOADS = os.environ.get('OMR_KEEP_UPLOADS', 'false').lower() == 'true'
+LAYOUT_FILE = os.environ.get('OMR_LAYOUT_FILE')
+ANSWER_KEY_DIR = os.environ.get('OMR_ANSWER_KEY_DIR', 'answer_keys')
+RESULTS_DIR = os.environ.get('OMR_RESULTS_DIR')
+CACHE_FILE = os.environ.get('OMR_CACHE_FILE', os.path.join('cache', 'omr_cache.sqlite3'))  # Empty disables the cache
+CACHE_TTL = float(os.environ.get('OMR_CACHE_TTL_DAYS', 30)) * 86400
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('OMR_MAX_UPLOAD_MB', 200)) * 1024 * 1024
+
+# --- 2. Worker Side ---
+def grade_upload(image_path, include_image=True, answer_key=None, filename=None):
+    """Runs in a worker process: grades one stored upload and returns the JSON-ready result the backend expects."""
+    try:
+        layout = load_layout(LAYOUT_FILE) if LAYOUT_FILE else None
+        result = process_omr_sheet(image_path, write_csv=False, annotate=include_image, layout=layout, answer_key=answer_key)
+        annotated = result.pop('annotated_image', None)
+        if annotated is not None:
+            ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            if ok: result['processed_image'] = base64.b64encode(buffer).decode('ascii')
+    except Exception as e:
+        logging.error(f"Failed to grade {image_path}: {e}")
+        result = {'success': False, 'error': 'OMR processing failed', 'details': str(e)}
+    finally:
+        if not KEEP_UPLOADS and os.path.exists(image_path): os.remove(image_path)
+    result['image_path'] = filename or os.path.basename(image_path)
+    return result
+
+# --- 3. Bounded Queue in Front of the Process Pool ---
+class GradingQueue:
+    """Process pool with a cap on queued + running sheets, so a flood of uploads is rejected instead of exhausting memory."""
+    def __init__(self, workers, max_pending):
+        # Unlike batch runs, desk uploads come one at a time, so each worker keeps its section threads for latency.
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(SECTION_THREADS,))
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, count):
+        with self.lock:
+            if self.pending + count > self.max_pending: return False
+            self.pending += count
+            return True
+
+    def submit(self, image_path, include_image=True, answer_key=None, filename=None, content_hash=None):
+        """Submits a sheet whose slot was already reserved. With content_hash, the finished result is added to the cache."""
+        future = self.pool.submit(grade_upload, image_path, include_image, answer_key, filename)
+        future.add_done_callback(lambda f: self._finished(f, answer_key, content_hash))
+        return future
+
+    def _finished(self, future, answer_key, content_hash):
+        self.release()
+        if future.cancelled() or future.exception() is not None: return
+        if grade_cache and content_hash: grade_cache.put(content_hash, answer_key or DEFAULT_ANSWER_KEY, future.result())
+        if exam_results: exam_results.record(future.result())
+
+    def release(self, count=1):
+        with self.lock: self.pending -= count
+
+class JobStore:
+    """In-memory per-sheet status for multi-file upload jobs; finished jobs expire after JOB_TTL seconds."""
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def create(self, filenames):
+        job_id = uuid.uuid4().hex
+        sheets = [{'index': i, 'filename': name, 'status': 'queued', 'result': None} for i, name in enumerate(filenames)]
+        with self.lock:
+            self._expire()
+            self.jobs[job_id] = {'job_id': job_id, 'created_at': time.time(), 'finished_at': None, 'sheets': sheets, 'futures': {}}
+        return job_id
+
+    def finish_sheet(self, job_id, index, result):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None: return
+            job['sheets'][index].update(status='done' if result.get('success') else 'failed', result=result)
+            job['futures'].pop(index, None)
+            if all(s['status'] in ('done', 'failed') for s in job['sheets']): job['finished_at'] = time.time()
+
+    def track(self, job_id, index, future):
+        with self.lock: self.jobs[job_id]['futures'][index] = future
+        def on_done(f):
+            try: result = f.result()
+            except Exception as e: result = {'success': False, 'error': 'OMR processing failed', 'details': str(e)}
+            self.finish_sheet(job_id, index, result)
+        future.add_done_callback(on_done)
+
+    def snapshot(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None: return None
+            sheets = [dict(s) for s in job['sheets']]
+            for index, future in job['futures'].items():
+                if future.running(): sheets[index]['status'] = 'processing'
+            finished_at = job['finished_at']
+        counts = {}
+        for s in sheets: counts[s['status']] = counts.get(s['status'], 0) + 1
+        return {'job_id': job_id, 'status': 'finished' if finished_at else 'running', 'total': len(sheets),
+                'counts': counts, 'sheets': sheets}
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j for j, job in self.jobs.items() if job['finished_at'] and now - job['finished_at'] > self.ttl]:
+            del self.jobs[job_id]
+
+class ExamResults:
+    """One results store per exam under RESULTS_DIR, appended to as sheets finish so the backend can fetch an exam in one read."""
+    def __init__(self, root):
+        self.root = root
+        self.writers = {}
+        self.lock = threading.Lock()
+
+    def store_dir(self, exam_id):
+        return os.path.join(self.root, set_file_name(str(exam_id or 'default')))
+
+    def record(self, result):
+        exam_id = result.get('exam_id') or 'default'
+        with self.lock:
+            writer = self.writers.get(exam_id)
+            if writer is None: writer = self.writers[exam_id] = ResultsWriter(self.store_dir(exam_id), SHEET_QUESTIONS, flush_interval=1.0)
+            # Under the lock: regrade() must not close this writer between the lookup and the write
+            writer.write({k: v for k, v in result.items() if k != 'processed_image'})
+
+    def regrade(self, exam_id, key):
+        """Rescores a whole exam store against a corrected key; its writer is flushed and closed first (reopened on the next sheet)."""
+        exam_id = exam_id or 'default'
+        with self.lock:
+            writer = self.writers.pop(exam_id, None)
+            if writer: writer.close()
+            return regrade_store(self.store_dir(exam_id), key)
+
+    def close(self):
+        with self.lock:
+            for writer in self.writers.values(): writer.close()
+            self.writers.clear()
+
+grading_queue = None
+job_store = JobStore(JOB_TTL)
+exam_results = ExamResults(RESULTS_DIR) if RESULTS_DIR else None
+if exam_results: atexit.register(exam_results.close)
+grade_cache = GradeCache(CACHE_FILE, CACHE_TTL) if CACHE_FILE else None
+if grade_cache: atexit.register(grade_cache.close)
+
+def get_queue():
+    # Created lazily so importing this module (or forking workers) doesn't spawn a pool.
+    global grading_queue
+    if grading_queue is None: grading_queue = GradingQueue(WORKERS, MAX_QUEUE)
+    return grading_queue
+
+def upload_extension(file_storage):
+    """Lower-case extension of an upload, or None for non-images."""
+    filename = secure_filename(file_storage.filename or '') or 'sheet.jpg'
+    ext = os.path.splitext(filename)[1].lower() or '.jpg'
+    return ext if ext in IMAGE_EXTENSIONS else None
+
+def save_upload(data, ext):
+    """Stores uploaded image bytes under UPLOAD_DIR with a unique, safe name. Returns the path."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}{ext}")
+    with open(path, 'wb') as f: f.write(data)
+    return path
+
+def cached_result(content_hash, answer_key, include_image, filename):
+    """A previous grading of the same image bytes, re-scored if the answer key changed; None on a miss."""
+    if not grade_cache: return None
+    result, rescored = grade_cache.lookup(content_hash, answer_key or DEFAULT_ANSWER_KEY, include_image)
+    if result is None: return None
+    if not include_image: result.pop('processed_image', None)
+    result.update(image_path=filename, cached=True)
+    if rescored and exam_results: exam_results.record(result)  # New key: the exam store gets the new score; exact repeats are not re-recorded
+    return result
+
+def resolve_answer_key(form):
+    """Answer key from an inline 'answer_key' JSON field, or looked up by 'exam_id' (+ 'set_name') under ANSWER_KEY_DIR. Raises ValueError."""
+    if form.get('answer_key'):
+        try: data = json.loads(form['answer_key'])
+        except json.JSONDecodeError as e: raise ValueError(f"answer_key is not valid JSON: {e}")
+        if not isinstance(data, dict): raise ValueError("answer_key must be a JSON object")
+        return AnswerKey.from_dict(data, form.get('exam_id'), form.get('set_name'))
+    if form.get('exam_id'):
+        key = find_answer_key(ANSWER_KEY_DIR, form['exam_id'], form.get('set_name'))
+        if key is None: raise ValueError(f"No answer key for exam {form['exam_id']} set {form.get('set_name') or '-'}")
+        return key
+    return None
+
+def queue_full_response(count):
+    q = get_queue()
+    return jsonify({'success': False, 'error': 'Grading queue is full, retry later',
+                    'details': {'pending': q.pending, 'max_pending': q.max_pending, 'requested': count}}), 503
+
+# --- 4. Routes ---
+@app.route('/health', methods=['GET'])
+def health():
+    q = get_queue()
+    return jsonify({'status': 'healthy', 'service': 'omr-service', 'workers': q.workers,
+                    'pending': q.pending, 'max_pending': q.max_pending, 'cache': grade_cache.stats() if grade_cache else None})
+
+@app.route('/process-omr', methods=['POST'])
+def process_omr():
+    """Grades one sheet synchronously (field 'image'); used by backend/routes/omr.js."""
+    upload = request.files.get('image')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'error': 'No image file provided'}), 400
+    try: answer_key = resolve_answer_key(request.form)
+    except ValueError as e: return jsonify({'success': False, 'error': str(e)}), 400
+    ext = upload_extension(upload)
+    if ext is None: return jsonify({'success': False, 'error': 'Unsupported image type'}), 400
+
+    data = upload.read()
+    content_hash = image_hash(data)
+    include_image = request.args.get('image', 'true').lower() != 'false'
+    result = cached_result(content_hash, answer_key, include_image, upload.filename)
+    if result is not None: return jsonify(result), 200 if result.get('success') else 422
+
+    if not get_queue().reserve(1): return queue_full_response(1)
+    future = get_queue().submit(save_upload(data, ext), include_image, answer_key, upload.filename, content_hash)
+    try: result = future.result(timeout=SYNC_TIMEOUT)
+    except Exception as e:
+        logging.error(f"Synchronous grading failed: {e}")
+        return jsonify({'success': False, 'error': 'OMR processing failed', 'details': str(e)}), 500
+    return jsonify(result), 200 if result.get('success') else 422
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queues many sheets (fields 'images' or 'image') and returns a job id to poll for per-sheet status."""
+    uploads = [f for f in request.files.getlist('images') + request.files.getlist('image') if f.filename]
+    if not uploads:
+        return jsonify({'success': False, 'error': 'No image files provided'}), 400
+    try: answer_key = resolve_answer_key(request.form)
+    except ValueError as e: return jsonify({'success': False, 'error': str(e)}), 400
+
+    include_image = request.args.get('image', 'false').lower() == 'true'
+    sheets = []  # (index, upload, ext, bytes, hash, cached result)
+    for index, upload in enumerate(uploads):
+        ext = upload_extension(upload)
+        if ext is None: sheets.append((index, upload, None, None, None, None)); continue
+        data = upload.read()
+        content_hash = image_hash(data)
+        sheets.append((index, upload, ext, data, content_hash, cached_result(content_hash, answer_key, include_image, upload.filename)))
+    to_grade = sum(1 for s in sheets if s[2] is not None and s[5] is None)
+    if not get_queue().reserve(to_grade): return queue_full_response(to_grade)
+
+    job_id = job_store.create([f.filename for f in uploads])
+    for index, upload, ext, data, content_hash, cached in sheets:
+        if ext is None: job_store.finish_sheet(job_id, index, {'success': False, 'error': 'Unsupported image type'})
+        elif cached is not None: job_store.finish_sheet(job_id, index, cached)
+        else: job_store.track(job_id, index, get_queue().submit(save_upload(data, ext), include_image, answer_key, upload.filename, content_hash))
+    logging.info(f"Queued job {job_id} with {len(uploads)} sheets")
+    return jsonify({'success': True, 'job_id': job_id, 'total': len(uploads), 'status_url': f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    snapshot = job_store.snapshot(job_id)
+    if snapshot is None: return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(snapshot)
+
+@app.route('/results/<exam_id>', methods=['GET'])
+def get_results(exam_id):
+    """Whole-exam summary CSV (one row per graded sheet) for the backend to ingest in one read."""
+    if not exam_results: return jsonify({'success': False, 'error': 'Result storage is disabled (set OMR_RESULTS_DIR)'}), 404
+    path = os.path.join(exam_results.store_dir(exam_id), SUMMARY_FILE)
+    if not os.path.exists(path): return jsonify({'success': False, 'error': 'No results for this exam'}), 404
+    return send_file(os.path.abspath(path), mimetype='text/csv', as_attachment=True, download_name=f"{set_file_name(exam_id)}_results.csv")
+
+@app.route('/results/<exam_id>/regrade', methods=['POST'])
+def regrade_results(exam_id):
+    """Rescores every stored sheet of an exam against a corrected key ('answer_key' JSON or 'set_name' lookup) from the stored marks."""
+    if not exam_results: return jsonify({'success': False, 'error': 'Result storage is disabled (set OMR_RESULTS_DIR)'}), 404
+    if not os.path.exists(os.path.join(exam_results.store_dir(exam_id), SUMMARY_FILE)):
+        return jsonify({'success': False, 'error': 'No results for this exam'}), 404
+    try: answer_key = resolve_answer_key({**request.form.to_dict(), 'exam_id': exam_id})
+    except ValueError as e: return jsonify({'success': False, 'error': str(e)}), 400
+    try: summary = exam_results.regrade(exam_id, answer_key)
+    except ValueError as e: return jsonify({'success': False, 'error': str(e)}), 400
+    summary.pop('output', None)
+    return jsonify({'success': True, **summary})
+
+if __name__ == "__main__":
+    setup_logging()
+    logging.info(f"Starting OMR service on {HOST}:{PORT} with {WORKERS} workers (max {MAX_QUEUE} queued sheets)")
+    app.run(host=HOST, port=PORT, threaded=True)
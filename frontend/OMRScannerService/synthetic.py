@@ -0,0 +1,136 @@
+import os
+import json
+import logging
+import argparse
+
+import cv2
+import numpy as np
+
+# --- Synthetic OMR Sheets ---
+# Renders sheets in the layout the grader expects (fiducial squares in the corners, a 5-digit roll grid above a
+# horizontal rule, 4 x 15 MCQ columns split by vertical rules) with known answers, then degrades them like a scan.
+# Ground truth uses the grader's answer text: 'A'..'D', 'Blank' for nothing marked, 'Error' for several marks.
+CHOICES = 'ABCD'
+ROLL_DIGITS = 5
+QUESTIONS = 60
+BUBBLE_RADIUS = 11
+
+def random_truth(rng, blank_rate=0.05, multi_rate=0.03, questions=QUESTIONS):
+    """Random roll number and per-question marked choice sets (empty = blank, two choices = multi-mark)."""
+    roll = ''.join(str(d) for d in rng.integers(0, 10, ROLL_DIGITS))
+    marks = []
+    for _ in range(questions):
+        u = rng.random()
+        if u < blank_rate: marks.append([])
+        elif u < blank_rate + multi_rate: marks.append(sorted(rng.choice(4, 2, replace=False).tolist()))
+        else: marks.append([int(rng.integers(0, 4))])
+    return roll, marks
+
+def answer_text(marks):
+    return ['Blank' if not m else CHOICES[m[0]] if len(m) == 1 else 'Error' for m in marks]
+
+def render_sheet(roll, marks, width=1240, height=1754, rng=None):
+    """Draws a clean sheet (BGR). Filled bubbles get a random pencil darkness."""
+    rng = rng or np.random.default_rng(0)
+    img = np.full((height, width, 3), 255, np.uint8)
+    for x, y in [(60, 60), (width - 60, 60), (60, height - 60), (width - 60, height - 60)]:
+        cv2.rectangle(img, (x - 20, y - 20), (x + 20, y + 20), (0, 0, 0), -1)
+
+    # Same geometry the grader crops to: 5% left margin, 3% top and bottom margins of the marker-bounded paper
+    paper_w, paper_h = width - 120, height - 120
+    x0 = 60 + int(paper_w * 0.05); y0 = 60 + int(paper_h * 0.03)
+    content_w = paper_w - int(paper_w * 0.05); content_h = paper_h - 2 * int(paper_h * 0.03)
+    split_y = y0 + int(content_h * 0.30)
+    cv2.line(img, (x0 + 10, split_y), (x0 + content_w - 10, split_y), (0, 0, 0), 4)
+
+    def bubble(x, y, filled):
+        if filled:
+            shade = int(rng.integers(0, 70))
+            cv2.circle(img, (x, y), BUBBLE_RADIUS, (shade, shade, shade), -1)
+        else: cv2.circle(img, (x, y), BUBBLE_RADIUS, (0, 0, 0), 2)
+
+    grid_top = y0 + int((split_y - y0) * 0.315) + 15
+    row_step = (split_y - grid_top - 15) / 10
+    for col, digit in enumerate(roll):
+        for d in range(10): bubble(x0 + 80 + col * 42, int(grid_top + d * row_step), str(d) == digit)
+
+    section_w = content_w / 4
+    for k in (1, 2, 3):
+        x = int(x0 + k * section_w)
+        cv2.line(img, (x, split_y + 25), (x, y0 + content_h - 15), (0, 0, 0), 3)
+    question_step = (y0 + content_h - split_y - 60) / 15
+    for q, chosen in enumerate(marks):
+        section, row = divmod(q, 15)
+        for choice in range(4): bubble(int(x0 + section * section_w + 60 + choice * 42), int(split_y + 50 + row * question_step), choice in chosen)
+    return img
+
+def degrade(img, rng, rotation=1.5, perspective=0.01, blur=0.5, noise=6.0, jpeg_quality=75, margin=0.04):
+    """
+    Scanner-like damage: the sheet is placed on a slightly larger bed with a random rotation (degrees, +/-) and corner
+    jitter (fraction of the size), then blurred (max Gaussian sigma), given Gaussian noise (sigma) and JPEG compressed.
+    Returns the re-decoded image.
+    """
+    h, w = img.shape[:2]
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    jitter = rng.uniform(-perspective, perspective, (4, 2)) * [w, h]
+    angle = np.deg2rad(rng.uniform(-rotation, rotation))
+    center = np.float32([w / 2, h / 2])
+    rot = np.float32([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    dst = (src + jitter - center) @ rot.T + center + [pad_x, pad_y]
+    matrix = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+    out = cv2.warpPerspective(img, matrix, (w + 2 * pad_x, h + 2 * pad_y), flags=cv2.INTER_LINEAR, borderValue=(245, 245, 245))
+
+    sigma = rng.uniform(0, blur) if blur > 0 else 0
+    if sigma > 0.3: out = cv2.GaussianBlur(out, (0, 0), sigma)
+    if noise > 0: out = np.clip(out + rng.normal(0, noise, out.shape), 0, 255).astype(np.uint8)
+    if jpeg_quality:
+        ok, buffer = cv2.imencode('.jpg', out, [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)])
+        if ok: out = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    return out
+
+def generate_sheet(seed, blank_rate=0.05, multi_rate=0.03, clean=False, **degrade_options):
+    """One synthetic sheet: (image, truth) where truth is {'roll_number', 'answers'} in the grader's answer text."""
+    rng = np.random.default_rng(seed)
+    roll, marks = random_truth(rng, blank_rate, multi_rate)
+    img = render_sheet(roll, marks, rng=rng)
+    if not clean: img = degrade(img, rng, **degrade_options)
+    return img, {'roll_number': roll, 'answers': answer_text(marks)}
+
+def generate_corpus(output_dir, count, seed=0, **options):
+    """Writes count sheets as JPEGs plus truth.json ({file name: truth}). Returns the truth mapping."""
+    os.makedirs(output_dir, exist_ok=True)
+    truth = {}
+    for i in range(count):
+        img, truth[f"sheet_{i:05d}.jpg"] = generate_sheet(seed + i, **options)
+        cv2.imwrite(os.path.join(output_dir, f"sheet_{i:05d}.jpg"), img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    with open(os.path.join(output_dir, 'truth.json'), 'w') as f: json.dump(truth, f, indent=1)
+    return truth
+
+def add_degrade_arguments(parser):
+    parser.add_argument('--blank-rate', type=float, default=0.05, help="Fraction of questions left blank")
+    parser.add_argument('--multi-rate', type=float, default=0.03, help="Fraction of questions with two marks")
+    parser.add_argument('--rotation', type=float, default=1.5, help="Max rotation in degrees")
+    parser.add_argument('--perspective', type=float, default=0.01, help="Max corner jitter as a fraction of the sheet size")
+    parser.add_argument('--blur', type=float, default=0.5, help="Max Gaussian blur sigma")
+    parser.add_argument('--noise', type=float, default=6.0, help="Gaussian noise sigma")
+    parser.add_argument('--jpeg-quality', type=int, default=75, help="JPEG quality of the simulated scan (0 = lossless)")
+    parser.add_argument('--clean', action='store_true', help="Render undistorted sheets")
+
+def degrade_options(args):
+    return {'blank_rate': args.blank_rate, 'multi_rate': args.multi_rate, 'clean': args.clean, 'rotation': args.rotation,
+            'perspective': args.perspective, 'blur': args.blur, 'noise': args.noise, 'jpeg_quality': args.jpeg_quality}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render synthetic OMR sheets with known answers.")
+    parser.add_argument('output_dir', help="Directory for the sheets and truth.json")
+    parser.add_argument('-n', '--count', type=int, default=100, help="Number of sheets")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the first sheet (sheet i uses seed + i)")
+    add_degrade_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    generate_corpus(args.output_dir, args.count, args.seed, **degrade_options(args))
+    logging.info(f"Wrote {args.count} sheets and truth.json to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from answer_key import AnswerKey
+from scoring import MarkBatch
+from analysis import item_analysis
+
+# Four sheets, key A / B / C and an unkeyed fourth question. Correct (1) / wrong (0):
+#   sheet 1: 1 1 1   total 3
+#   sheet 2: 1 1 0   total 2
+#   sheet 3: 1 0 0   total 1
+#   sheet 4: 0 0 0   total 0
+# A fifth sheet failed alignment (nothing detected) and must not count.
+# p = .75 .5 .25, sum p(1-p) = .625, total variance 1.25 -> KR-20 = 3/2 * (1 - .625 / 1.25) = .75
+# Corrected point-biserial (item vs. total of the other items): sqrt(3/11), sqrt(1/2), sqrt(3/11)
+ANSWERS = ['ABCA', 'ABDA', 'ACDA', 'DCDA']
+
+def fixture_batch():
+    marked = np.zeros((5, 4, 4), dtype=bool)
+    for s, answers in enumerate(ANSWERS):
+        for q, letter in enumerate(answers): marked[s, q, 'ABCD'.index(letter)] = True
+    detected = np.ones((5, 4), dtype=bool); detected[4] = False
+    return MarkBatch(np.zeros((5, 4, 4), dtype=np.float32), marked, detected)
+
+def test_item_statistics_match_hand_computed_values():
+    stats = item_analysis(fixture_batch(), AnswerKey.from_dict({"1": "A", "2": "B", "3": "C"}))
+    assert stats['sheets'] == 4 and stats['questions'].tolist() == [1, 2, 3]
+    assert stats['difficulty'] == pytest.approx([0.75, 0.5, 0.25])
+    assert stats['kr20'] == pytest.approx(0.75)
+    assert stats['discrimination'] == pytest.approx([np.sqrt(3 / 11), np.sqrt(1 / 2), np.sqrt(3 / 11)])
+    assert stats['mean_score'] == pytest.approx(1.5) and stats['score_sd'] == pytest.approx(np.sqrt(1.25))
+
+def test_option_shares():
+    stats = item_analysis(fixture_batch(), AnswerKey.from_dict({"1": "A", "2": "B", "3": "C"}))
+    # Columns A, B, C, D, Blank, Multi
+    assert stats['options'][1].tolist() == [0, 0.5, 0.5, 0, 0, 0]
+    assert stats['options'][2].tolist() == [0, 0, 0.25, 0.75, 0, 0]
+
+def test_single_item_has_no_reliability():
+    assert np.isnan(item_analysis(fixture_batch(), AnswerKey.from_dict({"1": "A"}))['kr20'])
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from answer_key import AnswerKey, marked_bits
+
+def test_masks_round_trip_through_letters():
+    key = AnswerKey.from_dict({"1": "B", "3": "a, c", "4": "D"}, exam_id='7', set_name='Set A')
+    assert key.masks.tolist() == [2, 0, 5, 8]
+    assert [key.letters(q) for q in range(5)] == ['B', 'N/A', 'A, C', 'D', 'N/A']
+    assert key.total_questions == 3 and key.keyed.tolist() == [True, False, True, True]
+    again = AnswerKey.from_dict({str(q + 1): key.letters(q) for q in range(len(key.masks)) if key.keyed[q]})
+    assert np.array_equal(again.masks, key.masks) and again.version == key.version
+
+def test_legacy_choice_indexes_compile_to_the_same_masks():
+    legacy = AnswerKey.from_choice_indexes({0: 1, 2: [0, 2], 3: 3})
+    assert np.array_equal(legacy.masks, AnswerKey.from_dict({"1": "B", "3": "A,C", "4": "D"}).masks)
+    assert legacy.choice_indexes(2) == [0, 2] and legacy.choice_indexes(9) == []
+
+def test_version_ignores_trailing_unkeyed_questions():
+    assert AnswerKey([2, 5]).version == AnswerKey([2, 5, 0, 0]).version != AnswerKey([2, 4]).version
+
+def test_masks_for_pads_and_cuts_to_the_sheet():
+    key = AnswerKey([1, 2, 4])
+    assert key.masks_for(5).tolist() == [1, 2, 4, 0, 0] and key.masks_for(2).tolist() == [1, 2]
+
+def test_marked_bits_packs_choices_little_endian():
+    marks = np.array([[0, 0, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [1, 0, 1, 1]], dtype=bool)
+    assert marked_bits(marks).tolist() == [0, 1, 4, 13]
+
+def test_score_needs_exactly_one_accepted_mark():
+    key = AnswerKey.from_dict({"1": "A", "2": "A,C", "3": "B"})
+    marks = np.zeros((4, 4), dtype=bool)
+    marks[0, 0] = True                   # Q1 right
+    marks[1, [0, 2]] = True              # Q2 both accepted choices marked: still a multi-mark
+    marks[2, 1] = True; marks[2, 3] = True
+    marks[3, 1] = True                   # Q4 not keyed
+    assert key.score(marks).tolist() == [True, False, False, False]
+
+@pytest.mark.parametrize('answer_key', [{"0": "A"}, {"x": "A"}, {"-1": "B"}])
+def test_invalid_question_numbers_are_rejected(answer_key):
+    with pytest.raises(ValueError): AnswerKey.from_dict(answer_key)
+
+def test_non_letter_answers_are_skipped(caplog):
+    key = AnswerKey.from_dict({"1": "B", "2": "Photosynthesis", "3": "", "4": None, "5": "A,E", "6": "C"}, exam_id='7')
+    assert key.masks.tolist() == [2, 0, 0, 0, 0, 4] and key.total_questions == 2
+    assert 'questions [2, 3, 4, 5]' in caplog.text
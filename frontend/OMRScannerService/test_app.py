@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pytest
+
+import synthetic
+from app import grade_omr_image
+from answer_key import AnswerKey
+
+@pytest.mark.parametrize('seed', [2, 5, 8])
+def test_grades_synthetic_sheet_headless(seed):
+    img, truth = synthetic.generate_sheet(seed)
+    result = grade_omr_image(img, annotate=False)
+    assert result['success'] and 'annotated_image' not in result
+    assert result['roll_number'] == truth['roll_number']
+    assert [a['student_answer'] for a in result['answers']] == truth['answers']
+    assert set(result['timings']) >= {'total'}
+
+def test_score_agrees_with_the_answer_key():
+    img, _ = synthetic.generate_sheet(4, clean=True)
+    key = AnswerKey.from_dict({str(q): 'ABCD'[q % 4] for q in range(1, 61)})
+    result = grade_omr_image(img, annotate=False, answer_key=key)
+    bits = np.array(result['marks']['marked'])
+    marks = (np.maximum(bits, 0)[:, None] & np.array([1, 2, 4, 8])) != 0
+    assert result['score'] == int((key.score(marks) & (bits >= 0)).sum())
+    assert result['total_questions'] == 60
+
+def test_debug_images_only_written_when_asked(tmp_path, monkeypatch):
+    img, _ = synthetic.generate_sheet(6, clean=True)
+    monkeypatch.chdir(tmp_path)
+    grade_omr_image(img, annotate=False)
+    assert not os.listdir(tmp_path)
+    grade_omr_image(img, debug_dir=str(tmp_path / 'debug'), annotate=False)
+    assert os.listdir(tmp_path / 'debug')
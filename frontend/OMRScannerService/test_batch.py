@@ -0,0 +1,57 @@
+import os
+import json
+
+import cv2
+
+import synthetic
+from batch import collect_scans, run_batch
+from results_store import read_summary
+
+KEY = {str(q): 'ABCD'[q % 4] for q in range(1, 61)}
+
+def write_scans(directory, seeds):
+    os.makedirs(directory, exist_ok=True)
+    truths = {}
+    for seed in seeds:
+        img, truth = synthetic.generate_sheet(seed, clean=True)
+        path = os.path.join(directory, f"s{seed}.png")
+        cv2.imwrite(path, img)
+        truths[path] = truth
+    return truths
+
+def test_collect_scans_from_a_folder_and_manifests(tmp_path):
+    for name in ('b.JPG', 'a.png', 'sub/c.tif', 'notes.txt'):
+        os.makedirs(os.path.dirname(tmp_path / 'scans' / name), exist_ok=True)
+        (tmp_path / 'scans' / name).write_bytes(b'')
+    scans = str(tmp_path / 'scans')
+    assert collect_scans(scans) == [os.path.join(scans, n) for n in ('a.png', 'b.JPG', 'sub/c.tif')]
+
+    (tmp_path / 'list.txt').write_text(f"# second pass\nscans/a.png\n\n{tmp_path}/scans/b.JPG\n")
+    assert collect_scans(str(tmp_path / 'list.txt')) == [str(tmp_path / 'scans/a.png'), str(tmp_path / 'scans/b.JPG')]
+    (tmp_path / 'list.csv').write_text("roll,path\n1,scans/sub/c.tif\n2,\n")
+    assert collect_scans(str(tmp_path / 'list.csv')) == [str(tmp_path / 'scans/sub/c.tif')]
+
+def test_batch_grades_resumes_and_retries(tmp_path):
+    truths = write_scans(str(tmp_path / 'scans'), [2, 3, 4])
+    (tmp_path / 'scans' / 'torn.png').write_bytes(b'not an image')
+    key_path = tmp_path / 'key.json'
+    key_path.write_text(json.dumps({'exam_id': '12', 'set_name': 'Set A', 'answer_key': KEY}))
+    store = str(tmp_path / 'store')
+
+    summary = run_batch(str(tmp_path / 'scans'), store, workers=1, answer_key_path=str(key_path))
+    assert (summary['total'], summary['graded'], summary['failed'], summary['skipped']) == (4, 4, 1, 0)
+    rows = {r['Image']: r for r in read_summary(store)}
+    for path, truth in truths.items():
+        row = rows[path]
+        assert row['Status'] == 'OK' and row['Roll Number'] == truth['roll_number'] and (row['Exam'], row['Set']) == ('12', 'Set A')
+        correct = sum(answer == KEY[str(q)] for q, answer in enumerate(truth['answers'], start=1))
+        assert int(row['Correct']) == correct and row['Total Questions'] == '60'
+        assert [row[f"Q{q}"] for q in range(1, 61)] == truth['answers']
+    assert rows[str(tmp_path / 'scans' / 'torn.png')]['Status'].startswith('Could not load image')
+
+    write_scans(str(tmp_path / 'scans'), [5])
+    summary = run_batch(str(tmp_path / 'scans'), store, workers=1, answer_key_path=str(key_path))
+    assert (summary['graded'], summary['skipped']) == (1, 4)
+    summary = run_batch(str(tmp_path / 'scans'), store, workers=1, retry_failed=True, answer_key_path=str(key_path))
+    assert (summary['graded'], summary['failed'], summary['skipped']) == (1, 1, 4)
+    assert len(read_summary(store)) == 6
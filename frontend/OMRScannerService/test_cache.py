@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import synthetic
+from app import grade_omr_image, rescore_result
+from answer_key import AnswerKey
+from cache import GradeCache, image_hash
+from scoring import encode_marks
+
+QUESTIONS = 60
+ALL_A = AnswerKey.from_dict({str(q): 'A' for q in range(1, QUESTIONS + 1)}, exam_id='7', set_name='Set A')
+
+@pytest.fixture(scope='module')
+def graded():
+    img, _ = synthetic.generate_sheet(4, clean=True)
+    return grade_omr_image(img, annotate=False, answer_key=ALL_A)
+
+def stored(confidence, detected, roll_number='1234'):
+    """A graded result whose Q1..Q4 all read 'A', with the given per-question confidence and detection."""
+    marked = np.zeros((QUESTIONS, 4), dtype=bool); marked[:, 0] = True
+    detected = np.asarray(detected + [True] * (QUESTIONS - len(detected)))
+    confidence = np.asarray(confidence + [0.9] * (QUESTIONS - len(confidence)), dtype=np.float64)
+    return {'success': True, 'roll_number': roll_number, 'needs_review': False, 'review_reasons': [], 'tier': 'fast',
+            'marks': encode_marks(np.zeros((QUESTIONS, 4)), marked & detected[:, None], detected, np.where(detected, confidence, np.nan))}
+
+def test_rescoring_with_the_same_key_keeps_the_verdict(graded):
+    rescored = rescore_result(graded, ALL_A)
+    for field in ('score', 'score_percentage', 'answers', 'needs_review', 'review_reasons', 'low_confidence_questions'):
+        assert rescored[field] == graded[field]
+    assert rescored['confidence'] == pytest.approx(graded['confidence'], abs=0.002)
+
+def test_review_verdict_follows_the_new_key():
+    result = stored(confidence=[0.9, 0.1, 0.9], detected=[True, True, False])
+    flagged = rescore_result(result, AnswerKey.from_dict({"1": "A", "2": "A", "3": "A"}))
+    assert flagged['needs_review'] and flagged['low_confidence_questions'] == [2]
+    assert flagged['review_reasons'] == ['1 questions not detected', '1 ambiguous questions']
+    clean = rescore_result(flagged, AnswerKey.from_dict({"1": "A", "4": "A"}))
+    assert not clean['needs_review'] and clean['review_reasons'] == [] and clean['low_confidence_questions'] == []
+    assert clean['score'] == 2 and clean['confidence'] == 0.9
+
+def test_unreadable_roll_number_needs_review_under_any_key():
+    result = rescore_result(stored(confidence=[0.9], detected=[True], roll_number='12?4'), AnswerKey.from_dict({"1": "A"}))
+    assert result['needs_review'] and result['review_reasons'] == ['roll number unreadable (12?4)']
+
+def test_cache_hit_miss_and_rescore(tmp_path, graded):
+    cache = GradeCache(str(tmp_path / 'cache.sqlite3'))
+    digest = image_hash(b'sheet bytes')
+    assert cache.lookup(digest, ALL_A) == (None, False)
+    cache.put(digest, ALL_A, graded)
+    assert cache.lookup(digest, ALL_A) == (graded, False)
+
+    key = AnswerKey.from_dict({"1": "A", "2": "B"}, exam_id='7', set_name='Set B')
+    result, rescored = cache.lookup(digest, key)
+    assert rescored and result == rescore_result(graded, key) and result['set_name'] == 'Set B'
+    assert cache.lookup(digest, key) == (result, False)  # The rescored result is cached under the new key
+    assert cache.lookup(digest, key, need_image=True) == (None, False)  # The annotated image depends on the key
+    assert cache.stats() == {'entries': 1, 'hits': 2, 'rescored': 1, 'misses': 2}
+
+def test_failed_gradings_are_not_cached(tmp_path):
+    cache = GradeCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put('abc', ALL_A, {'success': False, 'error': 'Could not find 4 fiducial markers'})
+    assert cache.lookup('abc', ALL_A) == (None, False)
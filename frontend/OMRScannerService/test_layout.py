@@ -0,0 +1,46 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import synthetic
+from app import calibrate_layout, grade_omr_image
+from layout import SheetLayout
+
+@pytest.fixture(scope='module')
+def layout():
+    img, _ = synthetic.generate_sheet(1, clean=True)
+    return calibrate_layout(img)
+
+def test_calibrated_layout_round_trips(layout, tmp_path):
+    assert layout.roll_centers.shape[1:] == (10, 2) and layout.mcq_centers.shape == (60, 4, 2)
+    layout.save(str(tmp_path / 'layout.json'))
+    again = SheetLayout.from_dict(layout.to_dict())
+    assert np.allclose(again.mcq_centers, layout.mcq_centers, atol=1e-6) and again.paper_aspect == layout.paper_aspect
+    with pytest.raises(ValueError): SheetLayout.from_dict({**layout.to_dict(), 'version': 99})
+    with pytest.raises(ValueError): SheetLayout.from_dict({**layout.to_dict(), 'mcq_centers': [[0.5, 0.5]]})
+
+@pytest.mark.parametrize('seed', [2, 3, 5])
+def test_fast_path_matches_the_contour_path(layout, seed):
+    img, truth = synthetic.generate_sheet(seed)
+    fast = grade_omr_image(img, annotate=False, layout=layout)
+    contours = grade_omr_image(img, annotate=False)
+    assert fast['layout_used'] and not contours['layout_used']
+    assert 'layout' in fast['timings'] and 'mcq' not in fast['timings']
+    for result in (fast, contours):
+        assert result['roll_number'] == truth['roll_number']
+        assert [a['student_answer'] for a in result['answers']] == truth['answers']
+    assert fast['score'] == contours['score']
+
+@pytest.mark.parametrize('change', [
+    {'paper_aspect': 2.0},  # A different paper shape
+    {'shift': 0.02},        # Bubbles are not where the layout expects them
+])
+def test_sheets_failing_validation_fall_back_to_contours(layout, change):
+    if 'shift' in change:
+        bad = dataclasses.replace(layout, roll_centers=layout.roll_centers + change['shift'], mcq_centers=layout.mcq_centers + change['shift'])
+    else: bad = dataclasses.replace(layout, **change)
+    img, truth = synthetic.generate_sheet(4)
+    result = grade_omr_image(img, annotate=False, layout=bad)
+    assert result['success'] and not result['layout_used'] and 'mcq' in result['timings']
+    assert [a['student_answer'] for a in result['answers']] == truth['answers']
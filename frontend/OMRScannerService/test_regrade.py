@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('OMR_CACHE_FILE', '')  # Importing server must not open the default cache in the working directory
+
+import server
+from answer_key import AnswerKey
+from scoring import encode_marks
+from regrade import regrade_store
+from results_store import META_FILE, SUMMARY_FILE, ResultsWriter, read_summary
+
+QUESTIONS = 4
+KEY_A = {"1": "A", "2": "B", "3": "C", "4": "D"}
+KEY_B = {"1": "D", "2": "C", "3": "B", "4": "A"}
+
+def sheet(name, set_name, answers, exam_id='7'):
+    marked = np.zeros((QUESTIONS, 4), dtype=bool)
+    for q, letter in enumerate(answers): marked[q, 'ABCD'.index(letter)] = True
+    return {'image_path': name, 'roll_number': name[:-4], 'exam_id': exam_id, 'set_name': set_name, 'success': True,
+            'score': 0, 'total_questions': QUESTIONS, 'score_percentage': 0.0,
+            'marks': encode_marks(np.zeros((QUESTIONS, 4)), marked, np.ones(QUESTIONS, dtype=bool))}
+
+def make_store(path, sheets):
+    with ResultsWriter(str(path), QUESTIONS) as writer:
+        for s in sheets: writer.write(s)
+    return str(path)
+
+def digest(store):
+    return {name: hashlib.md5(open(os.path.join(store, name), 'rb').read()).hexdigest() for name in (SUMMARY_FILE, META_FILE)}
+
+@pytest.fixture
+def multi_set(tmp_path):
+    return make_store(tmp_path / 'exam7', [sheet('a1.jpg', 'Set A', 'ABCD'), sheet('b1.jpg', 'Set B', 'DCBA'),
+                                           sheet('a2.jpg', 'Set A', 'ABCA'), sheet('b2.jpg', 'Set_B', 'DCAA')])
+
+def test_set_key_only_rescores_its_set(multi_set):
+    summary = regrade_store(multi_set, AnswerKey.from_dict(KEY_B, '7', 'Set B'))
+    assert summary['rescored'] == 2 and summary['changed'] == 2
+    rows = read_summary(multi_set)
+    assert [r['Correct'] for r in rows] == ['0', '4', '0', '3']
+    assert [r['Score (%)'] for r in rows] == ['0.00', '100.00', '0.00', '75.00']
+    with open(os.path.join(multi_set, META_FILE)) as f: versions = json.load(f)['answer_key_versions']
+    assert set(versions) == {'Set B', 'Set_B'}
+
+def test_key_without_set_is_refused_for_a_multi_set_store(multi_set):
+    before = digest(multi_set)
+    with pytest.raises(ValueError, match='must name the set'): regrade_store(multi_set, AnswerKey.from_dict(KEY_A))
+    assert digest(multi_set) == before
+
+def test_key_for_a_missing_set_is_refused(multi_set):
+    before = digest(multi_set)
+    with pytest.raises(ValueError): regrade_store(multi_set, AnswerKey.from_dict(KEY_A, '7', 'Set C'))
+    assert digest(multi_set) == before
+
+def test_key_without_set_rescores_a_single_set_store(tmp_path):
+    store = make_store(tmp_path / 'exam8', [sheet('a.jpg', '', 'ABCD'), sheet('b.jpg', '', 'ABDD')])
+    output = str(tmp_path / 'regraded.csv')
+    before = digest(store)
+    summary = regrade_store(store, AnswerKey.from_dict(KEY_A), output)
+    assert summary['rescored'] == 2 and digest(store) == before  # output_path leaves the store alone
+    with open(output) as f: lines = f.read().splitlines()
+    assert [line.split(',')[5] for line in lines[1:]] == ['4', '3']
+
+def test_regrade_route_maps_errors_to_400(tmp_path, multi_set, monkeypatch):
+    monkeypatch.setattr(server, 'exam_results', server.ExamResults(str(tmp_path)))
+    client = server.app.test_client()
+    response = client.post('/results/exam7/regrade', data={'answer_key': json.dumps(KEY_A)})
+    assert response.status_code == 400 and 'must name the set' in response.get_json()['error']
+    response = client.post('/results/exam7/regrade', data={'answer_key': json.dumps(KEY_B), 'set_name': 'Set B'})
+    assert response.status_code == 200 and response.get_json()['rescored'] == 2
+    assert client.post('/results/exam9/regrade', data={'answer_key': json.dumps(KEY_A)}).status_code == 404
+
+def test_sheets_recorded_around_a_regrade_are_kept(tmp_path):
+    results = server.ExamResults(str(tmp_path))
+    results.record(sheet('a1.jpg', 'Set A', 'ABCD', exam_id='9'))
+    assert results.regrade('9', AnswerKey.from_dict(KEY_A, '9', 'Set A'))['rescored'] == 1
+    results.record(sheet('a2.jpg', 'Set A', 'ABCA', exam_id='9'))
+    results.close()
+    assert [r['Image'] for r in read_summary(results.store_dir('9'))] == ['a1.jpg', 'a2.jpg']
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from answer_key import AnswerKey
+from scoring import encode_marks, score_batch
+from results_store import FILLS_FILE, MARKED_FILE, SUMMARY_FILE, ResultsWriter, load_results, open_store, read_summary
+
+QUESTIONS = 6
+
+def graded(name, seed, score=3):
+    rng = np.random.default_rng(seed)
+    marked = rng.random((QUESTIONS, 4)) < 0.3
+    detected = np.arange(QUESTIONS) != seed % QUESTIONS
+    fills = np.round(rng.uniform(0, 255, (QUESTIONS, 4)), 0)
+    return {'image_path': name, 'roll_number': f"10{seed}", 'success': True, 'score': score, 'total_questions': QUESTIONS,
+            'score_percentage': score * 100.0 / QUESTIONS, 'marks': encode_marks(fills, marked & detected[:, None], detected)}
+
+def test_writer_repair_and_load_round_trip(tmp_path):
+    store = str(tmp_path / 'store')
+    results = [graded(f"s{i}.jpg", i) for i in range(5)] + [graded('s1.jpg', 9, score=5)]  # s1 regraded
+    with ResultsWriter(store, QUESTIONS, flush_every=2) as writer:
+        for r in results: writer.write(r)
+
+    # An interrupted chunk: half a summary row and extra column bytes
+    with open(os.path.join(store, SUMMARY_FILE), 'a') as f: f.write('s7.jpg,107,,,OK')
+    with open(os.path.join(store, MARKED_FILE), 'ab') as f: f.write(b'\x01' * QUESTIONS)
+    with open(os.path.join(store, FILLS_FILE), 'ab') as f: f.write(b'\x00' * 10)
+    assert open_store(store, question_count=99) == QUESTIONS
+    assert len(read_summary(store)) == 6
+    assert os.path.getsize(os.path.join(store, MARKED_FILE)) == 6 * QUESTIONS
+
+    rows, batch = load_results(store, latest_only=False)
+    assert [r['Image'] for r in rows] == [r['image_path'] for r in results]
+    for i, r in enumerate(results):
+        assert batch.marked_bits[i][batch.detected[i]].tolist() == [b for b in r['marks']['marked'] if b >= 0]
+        assert batch.detected[i].tolist() == [b >= 0 for b in r['marks']['marked']]
+        expected = np.array([f if f is not None else [np.nan] * 4 for f in r['marks']['fills']], dtype=np.float32)
+        assert np.array_equal(batch.fills[i], expected, equal_nan=True)
+
+    rows, batch = load_results(store)
+    assert [r['Image'] for r in rows] == ['s0.jpg', 's2.jpg', 's3.jpg', 's4.jpg', 's1.jpg']
+    assert rows[-1]['Correct'] == '5' and batch.roll_numbers[-1] == '109'
+
+def test_reopened_store_appends(tmp_path):
+    store = str(tmp_path / 'store')
+    with ResultsWriter(store, QUESTIONS) as writer: writer.write(graded('a.jpg', 1))
+    with ResultsWriter(store, QUESTIONS) as writer: writer.write(graded('b.jpg', 2))
+    rows, batch = load_results(store)
+    assert [r['Image'] for r in rows] == ['a.jpg', 'b.jpg'] and batch.marked.shape == (2, QUESTIONS, 4)
+
+def test_writer_with_a_key_scores_chunks_with_score_batch(tmp_path):
+    store = str(tmp_path / 'store')
+    key = AnswerKey.from_dict({"1": "A", "2": "B,C", "4": "D", "6": "A"})
+    results = [graded(f"s{i}.jpg", i, score=99) for i in range(7)] + [{'image_path': 'bad.jpg', 'success': False, 'error': 'Empty image'}]
+    with ResultsWriter(store, QUESTIONS, flush_every=3, answer_key=key) as writer:
+        for r in results: writer.write(r)
+    rows, batch = load_results(store)
+    expected = score_batch(batch, key)
+    assert [int(r['Correct']) for r in rows] == expected['score'].tolist() and rows[-1]['Correct'] == '0'
+    assert [r['Score (%)'] for r in rows] == [f"{p:.2f}" for p in expected['score_percentage']]
+    assert {r['Total Questions'] for r in rows} == {'4'}
@@ -0,0 +1,46 @@
+import numpy as np
+
+from answer_key import AnswerKey
+from scoring import MarkBatch, encode_marks, score_batch
+
+def random_batch(sheets=40, questions=12, seed=3):
+    rng = np.random.default_rng(seed)
+    marked = rng.random((sheets, questions, 4)) < 0.3
+    detected = rng.random((sheets, questions)) < 0.95
+    fills = rng.uniform(0, 255, (sheets, questions, 4)).astype(np.float32)
+    return MarkBatch(fills, marked & detected[..., None], detected, [f"s{i}.jpg" for i in range(sheets)])
+
+def test_score_batch_matches_scalar_scoring():
+    batch = random_batch()
+    key = AnswerKey.from_dict({"1": "A", "2": "B,D", "4": "C", "5": "D", "9": "A,B,C", "10": "B"})
+    scored = score_batch(batch, key)
+    for i in range(len(batch)):
+        correct = key.score(batch.marked[i]) & batch.detected[i]
+        assert np.array_equal(scored['correct'][i], correct)
+        assert scored['score'][i] == correct.sum()
+        assert scored['score_percentage'][i] == round(correct.sum() * 100.0 / key.total_questions, 2)
+    assert scored['total_questions'] == key.total_questions == 6
+
+def test_blank_and_multi_classification():
+    batch = random_batch(sheets=10, questions=5, seed=11)
+    scored = score_batch(batch, AnswerKey([1] * 5))
+    counts = batch.marked.sum(axis=2)
+    assert np.array_equal(scored['blank'], batch.detected & (counts == 0))
+    assert np.array_equal(scored['multi'], counts > 1)
+
+def test_empty_key_scores_zero_percent():
+    scored = score_batch(random_batch(sheets=3), AnswerKey([]))
+    assert scored['total_questions'] == 0 and scored['score_percentage'].tolist() == [0, 0, 0]
+
+def test_from_results_round_trips_encoded_marks():
+    batch = random_batch(sheets=6, questions=8, seed=5)
+    fills = np.round(batch.fills, 1)
+    results = [{'image_path': p, 'roll_number': str(i), 'marks': encode_marks(fills[i], batch.marked[i], batch.detected[i])}
+               for i, p in enumerate(batch.image_paths)]
+    results.append({'image_path': 'failed.jpg', 'success': False})
+    stacked = MarkBatch.from_results(results)
+    assert np.array_equal(stacked.marked[:6], batch.marked) and np.array_equal(stacked.detected[:6], batch.detected)
+    assert np.allclose(stacked.fills[:6][batch.detected], fills[batch.detected])
+    assert not stacked.detected[6].any() and stacked.image_paths[6] == 'failed.jpg'
+    text = stacked.answer_text()
+    assert set(text[:6][~batch.detected]) <= {''} and set(text[6]) == {''}
@@ -0,0 +1,68 @@
+import io
+import os
+import time
+
+import cv2
+import pytest
+
+os.environ.setdefault('OMR_CACHE_FILE', '')  # Importing server must not open the default cache in the working directory
+
+import server
+import synthetic
+
+def upload(seed, name=None):
+    img, truth = synthetic.generate_sheet(seed, clean=True)
+    ok, buffer = cv2.imencode('.png', img)
+    return (io.BytesIO(buffer.tobytes()), name or f"sheet{seed}.png"), truth
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'UPLOAD_DIR', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(server, 'grade_cache', None)
+    monkeypatch.setattr(server, 'exam_results', None)
+    monkeypatch.setattr(server, 'grading_queue', server.GradingQueue(1, 2))
+    yield server.app.test_client()
+    server.grading_queue.pool.shutdown(wait=True)
+
+def poll(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = client.get(f"/jobs/{job_id}").get_json()
+        if snapshot['status'] == 'finished': return snapshot
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish: {snapshot}")
+
+def test_job_is_polled_to_completion(client):
+    (first, truth_first), (second, truth_second) = upload(2), upload(3)
+    response = client.post('/jobs', data={'images': [first, second, (io.BytesIO(b'x'), 'notes.txt')]}, content_type='multipart/form-data')
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['total'] == 3 and job['status_url'] == f"/jobs/{job['job_id']}"
+
+    snapshot = poll(client, job['job_id'])
+    assert snapshot['counts'] == {'done': 2, 'failed': 1}
+    sheets = snapshot['sheets']
+    assert [s['result']['roll_number'] for s in sheets[:2]] == [truth_first['roll_number'], truth_second['roll_number']]
+    assert sheets[2]['result']['error'] == 'Unsupported image type'
+    assert server.get_queue().pending == 0 and not os.listdir(server.UPLOAD_DIR)
+
+def test_full_queue_is_rejected_without_queueing(client):
+    sheets = [upload(seed)[0] for seed in (4, 5, 6)]
+    response = client.post('/jobs', data={'images': sheets}, content_type='multipart/form-data')
+    assert response.status_code == 503
+    assert response.get_json()['details'] == {'pending': 0, 'max_pending': 2, 'requested': 3}
+    assert server.get_queue().pending == 0
+
+    assert server.get_queue().reserve(2)
+    response = client.post('/process-omr', data={'image': upload(7)[0]}, content_type='multipart/form-data')
+    assert response.status_code == 503 and client.get('/health').get_json()['pending'] == 2
+    server.get_queue().release(2)
+
+def test_sync_grading_and_unknown_jobs(client):
+    image, truth = upload(8)
+    response = client.post('/process-omr?image=false', data={'image': image}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['roll_number'] == truth['roll_number'] and 'processed_image' not in result
+    assert client.get('/jobs/nope').status_code == 404
+    assert client.post('/jobs', data={}, content_type='multipart/form-data').status_code == 400
@@ -0,0 +1,66 @@
+import os
+import time
+import threading
+
+import cv2
+
+import synthetic
+from results_store import read_summary
+from watch import ANNOTATED_DIR, WatchDaemon
+
+def drop_sheet(directory, seed, name=None):
+    img, truth = synthetic.generate_sheet(seed, clean=True)
+    path = os.path.join(directory, name or f"s{seed}.png")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, img)
+    return path, truth
+
+def test_once_grades_the_folder_and_resumes(tmp_path):
+    scans, store = str(tmp_path / 'scans'), str(tmp_path / 'store')
+    truths = dict(drop_sheet(scans, seed) for seed in (2, 3))
+    truths.update([drop_sheet(scans, 4, 'station2/s4.png')])
+    for name, data in (('torn.png', b'not an image'), ('.s9.png', b''), ('notes.txt', b'x')):
+        with open(os.path.join(scans, name), 'wb') as f: f.write(data)
+
+    summary = WatchDaemon(scans, store, workers=2, annotate=True, poll_interval=0.05).run(once=True)
+    assert (summary['graded'], summary['failed']) == (4, 1)
+    rows = read_summary(store)
+    assert [r['Image'] for r in rows] == sorted(list(truths) + [os.path.join(scans, 'torn.png')])  # Submission order
+    by_path = {r['Image']: r for r in rows}
+    for path, truth in truths.items():
+        assert by_path[path]['Status'] == 'OK' and by_path[path]['Roll Number'] == truth['roll_number']
+    assert by_path[os.path.join(scans, 'torn.png')]['Status'].startswith('Could not load image')
+    assert sorted(os.listdir(os.path.join(store, ANNOTATED_DIR))) == ['s2.jpg', 's3.jpg', 'station2_s4.jpg']
+
+    assert WatchDaemon(scans, store, workers=1, poll_interval=0.05).run(once=True)['graded'] == 0
+    drop_sheet(scans, 5)
+    assert WatchDaemon(scans, store, workers=1, poll_interval=0.05).run(once=True)['graded'] == 1
+    assert len(read_summary(store)) == 5
+
+def test_files_are_queued_only_once_settled(tmp_path):
+    scans = str(tmp_path / 'scans')
+    daemon = WatchDaemon(scans, str(tmp_path / 'store'), workers=1)
+    path, _ = drop_sheet(scans, 2)
+    open(os.path.join(scans, 'empty.png'), 'wb').close()
+    assert daemon._poll() == 0  # First sighting: size and mtime are not known to be stable yet
+    with open(path, 'ab') as f: f.write(b'\0')  # The scanner is still writing
+    assert daemon._poll() == 0
+    assert daemon._poll() == 1 and daemon.scans.get_nowait() == path
+    assert daemon._poll() == 0 and list(daemon.settling) == [os.path.join(scans, 'empty.png')]
+
+def test_running_daemon_grades_new_sheets_until_stopped(tmp_path):
+    scans, store = str(tmp_path / 'scans'), str(tmp_path / 'store')
+    os.makedirs(scans)
+    daemon = WatchDaemon(scans, store, workers=1, poll_interval=0.05)
+    summary = {}
+    thread = threading.Thread(target=lambda: summary.update(daemon.run()))
+    thread.start()
+    try:
+        path, truth = drop_sheet(scans, 6)
+        deadline = time.monotonic() + 60
+        while not read_summary(store) and time.monotonic() < deadline: time.sleep(0.05)
+    finally:
+        daemon.stop()
+        thread.join(60)
+    assert not thread.is_alive() and summary['graded'] == 1
+    assert [(r['Image'], r['Roll Number']) for r in read_summary(store)] == [(path, truth['roll_number'])]
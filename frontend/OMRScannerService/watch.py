@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from app import SHEET_QUESTIONS, decode_image, grade_omr_image, setup_logging
+from batch import IMAGE_EXTENSIONS, init_worker, load_completed
+from layout import load_layout
+from answer_key import load_answer_key
+from results_store import ResultsWriter
+from profiling import format_stage_table, stage_percentiles
+
+# --- Watch-Folder Daemon ---
+# Scanners drop files into a shared folder all exam day. Each sheet flows through four stages joined by bounded queues,
+# so a slow stage blocks the ones before it instead of letting work pile up in memory:
+#   watcher   polls the folder and queues files whose size and mtime have settled (the scanner finished writing them)
+#   decoder   thread: reads and decodes each image (cv2.imdecode releases the GIL, so disk reads overlap grading)
+#   pool      worker processes: align, grade and JPEG-encode the annotated sheet
+#   writer    thread: saves annotated images and hands results to the results store in submission order
+# Sheets already in the store are skipped, so a restarted daemon picks up where it stopped.
+ANNOTATED_DIR = 'annotated'
+
+def init_watch_worker():
+    init_worker()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C stops the daemon, which drains the pool; workers must not die mid-sheet
+
+def grade_decoded(image_path, image, decode_ms, layout_path=None, answer_key_path=None, annotate=False):
+    """Runs in a worker process: grades an already decoded sheet. The annotated image comes back as JPEG bytes."""
+    try:
+        layout = load_layout(layout_path) if layout_path else None
+        answer_key = load_answer_key(answer_key_path) if answer_key_path else None
+        result = grade_omr_image(image, annotate=annotate, layout=layout, answer_key=answer_key)
+        result['timings']['load'] = decode_ms
+    except Exception as e:
+        result = {'success': False, 'error': f"Unhandled error: {e}"}
+    result['image_path'] = image_path
+    annotated = result.pop('annotated_image', None)
+    if annotated is not None:
+        ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if ok: result['annotated_jpeg'] = buffer.tobytes()
+    return result
+
+class WatchDaemon:
+    """Grades every image that appears in watch_dir into the results store in output_dir until stop() is called."""
+    def __init__(self, watch_dir, output_dir, workers=None, layout_path=None, answer_key_path=None, annotate=False,
+                 poll_interval=1.0, queue_size=None):
+        if answer_key_path: load_answer_key(answer_key_path)  # Fail fast on a malformed key instead of once per sheet
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.layout_path = layout_path
+        self.answer_key_path = answer_key_path
+        self.annotate = annotate
+        self.poll_interval = poll_interval
+        queue_size = queue_size or 2 * self.workers
+        self.scans = queue.Queue(maxsize=queue_size)    # watcher -> decoder: paths
+        self.pending = queue.Queue(maxsize=queue_size)  # decoder -> writer: (path, future or failed result)
+        self.stopping = threading.Event()
+        self.seen = set()    # Paths handed to the pipeline (or already in the store)
+        self.settling = {}   # path -> (size, mtime) at the previous poll
+        self.graded = self.failed = self.review = 0
+        self.timings = []
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, once=False):
+        """Watches until stop(); with once=True grades what is in the folder now and returns. Returns a summary dict."""
+        self.seen = load_completed(self.output_dir)
+        if self.annotate: os.makedirs(os.path.join(self.output_dir, ANNOTATED_DIR), exist_ok=True)
+        start = time.perf_counter()
+        logging.info(f"Watching {self.watch_dir} on {self.workers} workers ({len(self.seen)} sheets already graded).")
+        with ResultsWriter(self.output_dir, SHEET_QUESTIONS, flush_interval=1.0) as store, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=init_watch_worker) as pool:
+            decoder = threading.Thread(target=self._decode, args=(pool,), name='omr-decoder', daemon=True)
+            writer = threading.Thread(target=self._write, args=(store,), name='omr-writer', daemon=True)
+            decoder.start(); writer.start()
+            try:
+                while not self.stopping.is_set():
+                    found = self._poll()
+                    if once and not found and not any(size for size, _ in self.settling.values()): break
+                    self.stopping.wait(self.poll_interval)
+            finally:
+                self._put(self.scans, None, force=True)  # Drain: everything queued so far is still graded and written
+                decoder.join(); writer.join()
+        elapsed = time.perf_counter() - start
+        summary = {'graded': self.graded, 'failed': self.failed, 'needs_review': self.review, 'seconds': round(elapsed, 2),
+                   'stages': stage_percentiles(self.timings) if self.timings else {}}
+        logging.info(f"Watch stopped: { {k: v for k, v in summary.items() if k != 'stages'} }")
+        if self.timings: logging.info(f"Stage timings over {len(self.timings)} sheets:\n{format_stage_table(summary['stages'])}")
+        return summary
+
+    # --- Stage 1: Watcher ---
+    def _poll(self):
+        """Queues files that did not change since the previous poll. Returns how many were queued."""
+        current = {}
+        for root, _, files in os.walk(self.watch_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if path in self.seen or name.startswith('.') or os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS: continue
+                try: st = os.stat(path)
+                except OSError: continue  # Moved or deleted between listing and stat
+                current[path] = (st.st_size, st.st_mtime_ns)
+        ready = sorted(p for p, sig in current.items() if sig[0] > 0 and self.settling.get(p) == sig)
+        self.settling = {p: sig for p, sig in current.items() if p not in ready}
+        for path in ready:
+            if not self._put(self.scans, path): break
+            self.seen.add(path)
+        return len(ready)
+
+    def _put(self, q, item, force=False):
+        """Blocking put that gives up when the daemon is stopping (unless force); this is where backpressure waits."""
+        while True:
+            try:
+                q.put(item, timeout=0.2); return True
+            except queue.Full:
+                if self.stopping.is_set() and not force: return False
+
+    # --- Stage 2: Decoder ---
+    def _decode(self, pool):
+        while True:
+            path = self.scans.get()
+            if path is None: break
+            start = time.perf_counter()
+            try: image = decode_image(np.fromfile(path, dtype=np.uint8), color=self.annotate, name=path)
+            except OSError: image = None
+            decode_ms = (time.perf_counter() - start) * 1000.0
+            if image is None:
+                logging.error(f"Could not load image from {path}")
+                future = {'success': False, 'error': f"Could not load image from {path}", 'image_path': path}
+            else:
+                try: future = pool.submit(grade_decoded, path, image, decode_ms, self.layout_path, self.answer_key_path, self.annotate)
+                except Exception as e: future = {'success': False, 'error': f"Unhandled error: {e}", 'image_path': path}
+            self._put(self.pending, (path, future), force=True)
+        self._put(self.pending, None, force=True)
+
+    # --- Stage 4: Writer ---
+    def _write(self, store):
+        failed_store = False
+        while True:
+            item = self.pending.get()
+            if item is None: break
+            path, future = item
+            try: result = future if isinstance(future, dict) else future.result()
+            except Exception as e: result = {'success': False, 'error': f"Unhandled error: {e}", 'image_path': path}
+            if failed_store: continue  # Keep draining so the decoder never blocks on a dead writer
+            jpeg = result.pop('annotated_jpeg', None)
+            try:
+                if jpeg is not None:
+                    name = os.path.splitext(os.path.relpath(path, self.watch_dir))[0].replace(os.sep, '_')
+                    with open(os.path.join(self.output_dir, ANNOTATED_DIR, f"{name}.jpg"), 'wb') as f: f.write(jpeg)
+                store.write(result)
+                if result.get('timings'): self.timings.append(result['timings'])
+            except Exception as e:
+                logging.error(f"Stopping: could not save results for {path}: {e}")
+                failed_store = True; self.stop(); continue
+            self.graded += 1; self.failed += 0 if result.get('success') else 1; self.review += 1 if result.get('needs_review') else 0
+            logging.info(f"Graded {result['image_path']}: roll {result.get('roll_number')}, score {result.get('score')}"
+                         + (" (needs review)" if result.get('needs_review') else "") + (f" - {result['error']}" if result.get('error') else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a scan folder and grade every sheet that appears in it.")
+    parser.add_argument('watch_dir', help="Folder the scanners write to (watched recursively)")
+    parser.add_argument('-o', '--output', default='watch_results', help="Results store directory (see results_store.py)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Grading processes (default: all cores)")
+    parser.add_argument('--answer-key', default=None, help="Answer key JSON for this exam/set; default: built-in key")
+    parser.add_argument('--layout', default=None, help="Calibrated layout file (see layout.py) enabling the fixed-geometry fast path")
+    parser.add_argument('--annotate', action='store_true', help=f"Also save annotated sheets to <output>/{ANNOTATED_DIR}/")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between folder polls")
+    parser.add_argument('--once', action='store_true', help="Grade what is in the folder now, then exit")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    daemon = WatchDaemon(args.watch_dir, args.output, args.workers, args.layout, args.answer_key, args.annotate, args.interval)
+    for sig in (signal.SIGINT, signal.SIGTERM): signal.signal(sig, lambda *_: daemon.stop())
+    print(json.dumps(daemon.run(once=args.once)))
+
+if __name__ == "__main__":
+    main()
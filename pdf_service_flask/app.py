@@ -12,10 +12,17 @@ from datetime import datetime
 import urllib.request
 import re 
 import io
+from functools import lru_cache
 
 from models.question_models import (
     QuestionPaperRequest,
     QuestionPaperResponse,
+    LayoutEstimateResponse,
+    QuestionPaperExportRequest,
+    QuestionPaperExportResponse,
+    StampedPaperRequest,
+    ShuffledSetsRequest,
+    ShuffledSetsResponse,
     Question,
     ExamSet,
     Exam
@@ -23,7 +30,8 @@ from models.question_models import (
 from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 from services.template_engine import TemplateEngine
-from services.pdf_generator import PDFGenerator
+from services.pdf_generator import PDFGenerator, PageRangeError, validate_page_spec
+from services.http_codec import FastJSONProvider, compress_response, decompress_request
 
 # Scholarship models (exact copy from FastAPI)
 class ScholarshipStudent(BaseModel):
@@ -64,10 +72,19 @@ CORS(app)
 app.config.update(
     PDF_SERVICE_HOST=os.getenv('PDF_SERVICE_HOST', '0.0.0.0'),
     PDF_SERVICE_PORT=int(os.getenv('PDF_SERVICE_PORT', 8000)),
-    DEBUG=os.getenv('DEBUG', 'False').lower() == 'true'
+    DEBUG=os.getenv('DEBUG', 'False').lower() == 'true',
+    MAX_DECOMPRESSED_BODY=int(os.getenv('MAX_DECOMPRESSED_BODY', 64 * 1024 * 1024)),
+    RESPONSE_COMPRESSION_MIN_SIZE=int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024)),
+    RESPONSE_COMPRESSION_LEVEL=int(os.getenv('RESPONSE_COMPRESSION_LEVEL', 6))
 )
 
+# Fast JSON codec and gzip/zstd body compression
+app.json = FastJSONProvider(app)
+app.before_request(decompress_request)
+app.after_request(compress_response)
+
 import matplotlib.pyplot as plt
+@lru_cache(maxsize=2048)
 def latex_to_svg_matplotlib(latex_expr: str) -> str:
     """
     Render a limited LaTeX math expression to inline SVG using Matplotlib.
@@ -94,7 +111,8 @@ def preprocess_latex_to_svg(payload):
             return latex_to_svg_matplotlib(expr)
 
         q["question"] = re.sub(pattern, repl, q["question"])
-        q["options"] = {k: re.sub(pattern, repl, v) for k, v in q["options"].items()}
+        if q.get("options"):
+            q["options"] = {k: re.sub(pattern, repl, v) for k, v in q["options"].items()}
 
     return payload
 
@@ -227,15 +245,23 @@ def download_question_paper():
         except ValidationError as e:
             return jsonify({"error": f"Invalid request data: {str(e)}"}), 400
         
+        pages = request.args.get('pages') or None
+        if pages:
+            try:
+                validate_page_spec(pages)
+            except PageRangeError as e:
+                return jsonify({"error": str(e)}), 400
+        
         logger.info(f"Generating and downloading question paper for exam: {pdf_request.exam.title}")
         
-        # Generate PDF (bytes)
+        # Generate PDF (bytes), optionally limited to ?pages=1 or ?pages=2-3
         import asyncio
         pdf_bytes = asyncio.run(pdf_generator.generate_question_paper(
             exam=pdf_request.exam,
             exam_set=pdf_request.exam_set,
             template_type=pdf_request.template_type,
-            customization=pdf_request.customization
+            customization=pdf_request.customization,
+            pages=pages
         ))
         
         # Create safe ASCII filename (no Bengali characters for HTTP header)
@@ -254,6 +280,9 @@ def download_question_paper():
         
         return response
         
+    except PageRangeError as e:
+        # Well-formed but outside the laid out document, which is only known after layout
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error downloading question paper: {str(e)}")
         return jsonify({"error": f"Failed to generate question paper: {str(e)}"}), 500
@@ -297,6 +326,237 @@ def preview_question_paper():
         logger.error(f"Error generating preview: {str(e)}")
         return jsonify({"error": f"Failed to generate preview: {str(e)}"}), 500
 
+@app.route("/generate-question-paper/export", methods=['POST'])
+def export_question_paper():
+    """
+    Write several PDFs (full paper, cover page, reprint ranges) from one layout
+    
+    Args:
+        request: QuestionPaperExportRequest with exam data and named targets
+        
+    Returns:
+        QuestionPaperExportResponse with one base64 PDF per target
+    """
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "Request body is required"}), 400
+        
+        request_data = preprocess_latex_to_svg(request_data)
+        try:
+            export_request = QuestionPaperExportRequest(**request_data)
+        except ValidationError as e:
+            return jsonify({"error": f"Invalid request data: {str(e)}"}), 400
+        
+        try:
+            for target in export_request.targets:
+                if target.pages:
+                    validate_page_spec(target.pages)
+        except PageRangeError as e:
+            return jsonify({"error": f"Invalid pages for target '{target.name}': {str(e)}"}), 400
+        
+        logger.info(f"Exporting {len(export_request.targets)} PDFs for exam: {export_request.exam.title}")
+        
+        import asyncio
+        export = asyncio.run(pdf_generator.export_question_paper(
+            exam=export_request.exam,
+            exam_set=export_request.exam_set,
+            targets=export_request.targets,
+            template_type=export_request.template_type,
+            customization=export_request.customization
+        ))
+        
+        response = QuestionPaperExportResponse(
+            success=True,
+            message="Question paper exported successfully",
+            exam_title=export_request.exam.title,
+            set_name=export_request.exam_set.set_name,
+            page_count=export["page_count"],
+            outputs=[
+                {
+                    "name": output["name"],
+                    "pages": output["pages"],
+                    "pdf_data": base64.b64encode(output["pdf_data"]).decode("utf-8"),
+                    "file_size": len(output["pdf_data"])
+                }
+                for output in export["outputs"]
+            ],
+            generated_at=datetime.now().isoformat()
+        )
+        
+        return jsonify(response.dict())
+        
+    except PageRangeError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting question paper: {str(e)}")
+        return jsonify({"error": f"Failed to export question paper: {str(e)}"}), 500
+
+@app.route("/generate-question-paper/stamped", methods=['POST'])
+def download_stamped_question_paper():
+    """
+    Generate and download a personalized print run with one stamped copy per entry
+    
+    Args:
+        request: StampedPaperRequest with exam data and per-copy stamps
+        
+    Returns:
+        Combined PDF file as Response
+    """
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "Request body is required"}), 400
+        
+        request_data = preprocess_latex_to_svg(request_data)
+        try:
+            stamped_request = StampedPaperRequest(**request_data)
+        except ValidationError as e:
+            return jsonify({"error": f"Invalid request data: {str(e)}"}), 400
+        
+        logger.info(f"Generating {len(stamped_request.copies)} stamped copies for exam: {stamped_request.exam.title}")
+        
+        import asyncio
+        pdf_bytes = asyncio.run(pdf_generator.generate_stamped_question_paper(
+            exam=stamped_request.exam,
+            exam_set=stamped_request.exam_set,
+            copies=stamped_request.copies,
+            template_type=stamped_request.template_type,
+            customization=stamped_request.customization,
+            stamp_options=stamped_request.stamp_options
+        ))
+        
+        safe_filename = f"Bengali_Exam_{stamped_request.exam_set.set_name}_{len(stamped_request.copies)}_copies_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        safe_filename = "".join(c for c in safe_filename if c.isascii() and (c.isalnum() or c in (' ', '-', '_'))).rstrip()
+        
+        return Response(
+            pdf_bytes,
+            mimetype="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename={safe_filename}",
+                "Content-Type": "application/pdf"
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Error generating stamped question paper: {str(e)}")
+        return jsonify({"error": f"Failed to generate stamped question paper: {str(e)}"}), 500
+
+@app.route("/generate-question-sets", methods=['POST'])
+def generate_question_sets():
+    """
+    Generate shuffled sets (Set A/B/C/D...) from one master set and a seed
+    
+    Args:
+        request: ShuffledSetsRequest with the master set, seed and set count
+        
+    Returns:
+        ShuffledSetsResponse with each set's question order, answer key and PDF
+    """
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "Request body is required"}), 400
+        
+        # Math is converted once on the master set and shared by every set
+        request_data = preprocess_latex_to_svg(request_data)
+        try:
+            sets_request = ShuffledSetsRequest(**request_data)
+        except ValidationError as e:
+            return jsonify({"error": f"Invalid request data: {str(e)}"}), 400
+        
+        logger.info(f"Generating {sets_request.set_count} shuffled sets for exam: {sets_request.exam.title}")
+        
+        import asyncio
+        sets = asyncio.run(pdf_generator.generate_shuffled_sets(
+            exam=sets_request.exam,
+            master_set=sets_request.exam_set,
+            seed=sets_request.seed,
+            set_count=sets_request.set_count,
+            set_names=sets_request.set_names,
+            shuffle_questions=sets_request.shuffle_questions,
+            shuffle_options=sets_request.shuffle_options,
+            include_pdf=sets_request.include_pdf,
+            template_type=sets_request.template_type,
+            customization=sets_request.customization
+        ))
+        
+        response = ShuffledSetsResponse(
+            success=True,
+            message="Question sets generated successfully",
+            exam_title=sets_request.exam.title,
+            seed=sets_request.seed,
+            total_questions=len(sets_request.exam_set.questions),
+            sets=[
+                {
+                    "set_name": generated["set_name"],
+                    "question_order": generated["question_order"],
+                    "answer_key": generated["answer_key"],
+                    "pdf_data": base64.b64encode(generated["pdf_data"]).decode("utf-8") if generated["pdf_data"] else None,
+                    "file_size": len(generated["pdf_data"]) if generated["pdf_data"] else None
+                }
+                for generated in sets
+            ],
+            generated_at=datetime.now().isoformat()
+        )
+        
+        return jsonify(response.dict())
+        
+    except Exception as e:
+        logger.error(f"Error generating question sets: {str(e)}")
+        return jsonify({"error": f"Failed to generate question sets: {str(e)}"}), 500
+
+@app.route("/generate-question-paper/layout", methods=['POST'])
+def estimate_question_paper_layout():
+    """
+    Dry run: lay out the question paper without writing a PDF
+    
+    Args:
+        request: QuestionPaperRequest containing exam and question data
+        
+    Returns:
+        LayoutEstimateResponse with page count and per-page overflow info
+    """
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "Request body is required"}), 400
+        
+        # Same preprocessing as the download endpoint so the layout matches the printed paper
+        request_data = preprocess_latex_to_svg(request_data)
+        try:
+            pdf_request = QuestionPaperRequest(**request_data)
+        except ValidationError as e:
+            return jsonify({"error": f"Invalid request data: {str(e)}"}), 400
+        
+        logger.info(f"Estimating layout for exam: {pdf_request.exam.title}")
+        
+        import asyncio
+        layout = asyncio.run(pdf_generator.estimate_question_paper_layout(
+            exam=pdf_request.exam,
+            exam_set=pdf_request.exam_set,
+            template_type=pdf_request.template_type,
+            customization=pdf_request.customization
+        ))
+        
+        response = LayoutEstimateResponse(
+            success=True,
+            message="Layout estimated successfully",
+            exam_title=pdf_request.exam.title,
+            set_name=pdf_request.exam_set.set_name,
+            total_questions=len(pdf_request.exam_set.questions),
+            page_count=layout["page_count"],
+            overflow=layout["overflow"],
+            pages=layout["pages"],
+            generated_at=datetime.now().isoformat()
+        )
+        
+        return jsonify(response.dict())
+        
+    except Exception as e:
+        logger.error(f"Error estimating layout: {str(e)}")
+        return jsonify({"error": f"Failed to estimate layout: {str(e)}"}), 500
+
 @app.route("/templates", methods=['GET'])
 def get_templates():
     """Get available templates"""
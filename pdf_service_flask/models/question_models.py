@@ -207,6 +207,104 @@ class QuestionPaperRequest(BaseModel):
         }
 
 
+class ExportTarget(BaseModel):
+    """A single output written from a shared question paper layout"""
+    name: str = Field(..., description="Output name, e.g. full, cover, reprint", min_length=1)
+    pages: Optional[str] = Field(None, description="Page ranges such as '1', '2-3' or '1,3-'; all pages if omitted")
+    title: Optional[str] = Field(None, description="PDF title metadata override")
+
+
+class QuestionPaperExportRequest(QuestionPaperRequest):
+    """Request model for writing several PDFs from one layout"""
+    targets: List[ExportTarget] = Field(..., description="Outputs to write", min_items=1)
+
+
+class CopyStamp(BaseModel):
+    """Per-copy stamp printed on a personalized question paper"""
+    text: Optional[str] = Field(None, description="Stamp text, e.g. student roll or center code")
+    qr_data: Optional[str] = Field(None, description="Data encoded in a QR code next to the text")
+    
+    @validator('qr_data', always=True)
+    def validate_not_empty(cls, v, values):
+        if not v and not values.get('text'):
+            raise ValueError('A copy stamp needs text or qr_data')
+        return v
+
+
+class StampOptions(BaseModel):
+    """Placement options for per-copy stamps"""
+    position: Literal["top-left", "top-right", "bottom-left", "bottom-right"] = Field(default="top-right", description="Page corner for the stamp")
+    font_size: float = Field(default=9, description="Stamp text size in points", gt=0, le=48)
+    qr_size: float = Field(default=42, description="QR code size in points", gt=0, le=200)
+    margin: float = Field(default=14, description="Distance from the page edge in points", ge=0)
+    all_pages: bool = Field(default=True, description="Stamp every page, or only the first page of each copy")
+
+
+class StampedPaperRequest(QuestionPaperRequest):
+    """Request model for a personalized, stamped print run"""
+    copies: List[CopyStamp] = Field(..., description="One stamp per printed copy, in print order", min_items=1, max_items=5000)
+    stamp_options: StampOptions = Field(default_factory=StampOptions, description="Stamp placement options")
+
+
+class ShuffledSetsRequest(BaseModel):
+    """Request model for generating shuffled sets from one master set"""
+    exam: Exam = Field(..., description="Exam information")
+    exam_set: ExamSet = Field(..., description="Master exam set with its answer key")
+    seed: int = Field(..., description="Seed making the shuffle reproducible")
+    set_count: int = Field(default=4, description="Number of sets to generate", ge=1, le=26)
+    set_names: Optional[List[str]] = Field(None, description="Set names, defaults to Set A, Set B, ...")
+    shuffle_questions: bool = Field(default=True, description="Shuffle question order per set")
+    shuffle_options: bool = Field(default=True, description="Shuffle A-D options per set")
+    include_pdf: bool = Field(default=True, description="Render a PDF for every set")
+    template_type: str = Field(default="default", description="Template type to use")
+    customization: PaperCustomization = Field(default_factory=PaperCustomization, description="Customization options")
+    
+    @validator('set_names')
+    def validate_set_names(cls, v, values):
+        if v is not None and 'set_count' in values and len(v) != values['set_count']:
+            raise ValueError('set_names must have one name per set')
+        return v
+
+
+class GeneratedSet(BaseModel):
+    """A single shuffled set"""
+    set_name: str = Field(..., description="Set name")
+    question_order: List[int] = Field(..., description="Master question numbers in this set's order")
+    answer_key: Dict[str, str] = Field(..., description="Answer key for this set")
+    pdf_data: Optional[str] = Field(None, description="Generated PDF data (base64 encoded)")
+    file_size: Optional[int] = Field(None, description="PDF file size in bytes")
+
+
+class ShuffledSetsResponse(BaseModel):
+    """Response model for shuffled set generation"""
+    success: bool = Field(..., description="Whether the operation was successful")
+    message: str = Field(..., description="Response message")
+    exam_title: str = Field(..., description="Exam title")
+    seed: int = Field(..., description="Seed used for the shuffle")
+    total_questions: int = Field(..., description="Questions per set")
+    sets: List[GeneratedSet] = Field(..., description="Generated sets")
+    generated_at: str = Field(..., description="Generation timestamp")
+
+
+class ExportedPDF(BaseModel):
+    """A single exported PDF"""
+    name: str = Field(..., description="Output name")
+    pages: List[int] = Field(..., description="Page numbers included (1-based)")
+    pdf_data: str = Field(..., description="Generated PDF data (base64 encoded)")
+    file_size: int = Field(..., description="PDF file size in bytes")
+
+
+class QuestionPaperExportResponse(BaseModel):
+    """Response model for multi-target export"""
+    success: bool = Field(..., description="Whether the operation was successful")
+    message: str = Field(..., description="Response message")
+    exam_title: str = Field(..., description="Exam title")
+    set_name: str = Field(..., description="Set name")
+    page_count: int = Field(..., description="Number of pages in the full layout")
+    outputs: List[ExportedPDF] = Field(..., description="Exported PDFs")
+    generated_at: str = Field(..., description="Generation timestamp")
+
+
 class QuestionPaperResponse(BaseModel):
     """Response model for question paper generation"""
     success: bool = Field(..., description="Whether the operation was successful")
@@ -226,6 +324,30 @@ class QuestionPaperResponse(BaseModel):
         }
 
 
+class PageLayoutInfo(BaseModel):
+    """Layout information for a single rendered page"""
+    page_number: int = Field(..., description="Page number (1-based)")
+    width: float = Field(..., description="Page width in CSS px")
+    height: float = Field(..., description="Page height in CSS px")
+    question_count: int = Field(default=0, description="Number of questions placed on this page")
+    overflow: bool = Field(default=False, description="Whether any box overflows the page content area")
+    overflowing_boxes: List[Dict[str, Any]] = Field(default_factory=list, description="Outermost overflowing boxes")
+    inspected: bool = Field(default=True, description="False when only the page size was available (question count and overflow not checked)")
+
+
+class LayoutEstimateResponse(BaseModel):
+    """Response model for layout-only dry runs"""
+    success: bool = Field(..., description="Whether the operation was successful")
+    message: str = Field(..., description="Response message")
+    exam_title: str = Field(..., description="Exam title")
+    set_name: str = Field(..., description="Set name")
+    total_questions: int = Field(..., description="Total number of questions")
+    page_count: int = Field(..., description="Number of pages the paper will take")
+    overflow: bool = Field(..., description="Whether any page overflows")
+    pages: List[PageLayoutInfo] = Field(default_factory=list, description="Per-page layout information")
+    generated_at: str = Field(..., description="Generation timestamp")
+
+
 class TemplateInfo(BaseModel):
     """Template information model"""
     name: str = Field(..., description="Template name")
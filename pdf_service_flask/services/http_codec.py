@@ -0,0 +1,186 @@
+"""
+HTTP body codec for the PDF service
+Fast JSON serialization plus gzip/zstd request and response compression
+"""
+
+import gzip
+import io
+import logging
+from typing import Optional
+
+from flask import current_app, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+# Try to import orjson, fallback to the standard json module if not available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Try to import zstandard, fallback to gzip only if not available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html"}
+
+
+class RequestBodyTooLarge(ValueError):
+    """Raised when a compressed request body inflates past the size limit"""
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    Used by both ``request.get_json()`` and ``jsonify``. Output is UTF-8
+    instead of ``\\uXXXX`` escapes, which roughly halves the size of
+    Bengali question text. Keys stay sorted and dates and dataclasses go
+    through the default provider's ``default`` hook, so dates are still
+    written as HTTP dates. Falls back to the default provider when orjson
+    is not installed or when stdlib-specific keyword arguments are given.
+    """
+
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        if not ORJSON_AVAILABLE or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if not ORJSON_AVAILABLE or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not ORJSON_AVAILABLE or self._app.debug or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+    def _dumps_bytes(self, obj) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+def decompress_request():
+    """
+    ``before_request`` hook that transparently inflates gzip/zstd request bodies
+
+    Handlers keep calling ``request.get_json()`` unchanged. The inflated
+    size is capped by ``MAX_DECOMPRESSED_BODY`` to guard against
+    decompression bombs. Rejections are returned from inside the request
+    cycle so they still get CORS and the other ``after_request`` hooks.
+    """
+    encoding = request.headers.get("Content-Encoding", "").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+
+    environ = request.environ
+    max_size = current_app.config.get("MAX_DECOMPRESSED_BODY", 64 * 1024 * 1024)
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length) if length else environ["wsgi.input"].read()
+        data = decompress_body(body, encoding, max_size)
+    except RequestBodyTooLarge as e:
+        logger.warning(f"Rejected compressed request body: {str(e)}")
+        return jsonify({"error": str(e), "success": False}), 413
+    except ValueError as e:
+        logger.warning(f"Rejected compressed request body: {str(e)}")
+        return jsonify({"error": str(e), "success": False}), 415
+    except Exception as e:
+        logger.warning(f"Could not decompress request body: {str(e)}")
+        return jsonify({"error": f"Invalid {encoding} request body", "success": False}), 400
+
+    environ["wsgi.input"] = io.BytesIO(data)
+    environ["CONTENT_LENGTH"] = str(len(data))
+    del environ["HTTP_CONTENT_ENCODING"]
+    return None
+
+
+def decompress_body(body: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Decompress a request body
+
+    Args:
+        body: Raw (compressed) request body
+        encoding: Value of the Content-Encoding header
+        max_size: Maximum allowed inflated size in bytes
+
+    Returns:
+        Decompressed body bytes
+    """
+    if encoding in ("gzip", "x-gzip"):
+        reader = gzip.GzipFile(fileobj=io.BytesIO(body))
+    elif encoding == "zstd" and ZSTD_AVAILABLE:
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+    else:
+        raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+    with reader:
+        data = reader.read(max_size + 1)
+    if len(data) > max_size:
+        raise RequestBodyTooLarge(f"Decompressed body exceeds {max_size} bytes")
+    return data
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best response encoding the client accepts (zstd, then gzip)"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+
+    if ZSTD_AVAILABLE and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    """
+    ``after_request`` hook compressing JSON and HTML responses
+
+    Only applies to buffered responses above ``RESPONSE_COMPRESSION_MIN_SIZE``
+    bytes whose client sent a matching ``Accept-Encoding``. PDF downloads are
+    left alone since they are already deflate-compressed.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024):
+        return response
+
+    level = current_app.config.get("RESPONSE_COMPRESSION_LEVEL", 6)
+    if encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=level).compress(data)
+    else:
+        compressed = gzip.compress(data, compresslevel=level)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
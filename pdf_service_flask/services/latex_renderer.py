@@ -6,6 +6,7 @@ Converts LaTeX expressions to SVG format for embedding in PDFs
 import io
 import re
 import logging
+from functools import lru_cache
 from typing import List, Tuple
 
 logger = logging.getLogger(__name__)
@@ -34,12 +35,21 @@ class LaTeXRenderer:
         """
         Convert LaTeX expression to SVG using matplotlib
         
+        Results are memoized, so an expression shared by several sets or
+        requests is only rendered once.
+        
         Args:
             latex_expr: LaTeX expression without $$ wrappers
             
         Returns:
             SVG string for embedding
         """
+        return self._render_svg(latex_expr)
+    
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _render_svg(latex_expr: str) -> str:
+        """Render an expression with matplotlib (memoized per expression)"""
         if not MATPLOTLIB_AVAILABLE:
             logger.warning(f"Matplotlib not available, returning original LaTeX: {latex_expr}")
             return f"$${latex_expr}$$"
@@ -3,13 +3,20 @@ PDF generation service using WeasyPrint
 """
 
 import io
+import copy
+import hashlib
 import logging
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
-from models.question_models import Exam, ExamSet, PaperCustomization
+from models.question_models import Exam, ExamSet, PaperCustomization, ExportTarget, CopyStamp, StampOptions
 from services.template_engine import TemplateEngine
+from services.pdf_stamper import PDFStamper
+from services.set_shuffler import ExamSetShuffler
 
 # Try to import WeasyPrint, fallback to basic HTML if not available
 try:
@@ -20,6 +27,13 @@ except ImportError:
     WEASYPRINT_AVAILABLE = False
     print("Warning: WeasyPrint not fully available. PDF generation may be limited.")
 
+# Per-box layout inspection walks WeasyPrint's box tree (tested against the range in
+# requirements.txt); without it layout estimates fall back to page counts only
+try:
+    from weasyprint.formatting_structure import boxes
+except ImportError:
+    boxes = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +44,11 @@ class PDFGenerator:
         self.template_engine = template_engine or TemplateEngine()
         self.executor = ThreadPoolExecutor(max_workers=4)
         
+        # Laid out documents, reused to write page subsets without re-rendering
+        self.document_cache = DocumentCache()
+        self.stamper = PDFStamper()
+        self.set_shuffler = ExamSetShuffler()
+        
         # Font configuration for better font support
         if WEASYPRINT_AVAILABLE:
             self.font_config = FontConfiguration()
@@ -43,7 +62,9 @@ class PDFGenerator:
         exam: Exam,
         exam_set: ExamSet,
         template_type: str = "default",
-        customization: Optional[PaperCustomization] = None
+        customization: Optional[PaperCustomization] = None,
+        pages: Optional[str] = None,
+        latex_processed: bool = False
     ) -> bytes:
         """
         Generate PDF question paper
@@ -53,6 +74,9 @@ class PDFGenerator:
             exam_set: Exam set with questions
             template_type: Type of template to use
             customization: Customization options
+            pages: Optional page ranges to include, e.g. "1" or "2-3,5"
+            latex_processed: LaTeX in the questions was already converted
+                (see TemplateEngine.process_exam_set_latex)
             
         Returns:
             PDF data as bytes
@@ -69,19 +93,256 @@ class PDFGenerator:
                 exam=exam,
                 exam_set=exam_set,
                 template_type=template_type,
-                customization=customization
+                customization=customization,
+                latex_processed=latex_processed
             )
             
             # Generate PDF from HTML
-            pdf_data = await self._html_to_pdf(html_content, customization)
+            pdf_data = await self._html_to_pdf(html_content, customization, pages)
             
             logger.info(f"Successfully generated PDF for exam: {exam.title}")
             return pdf_data
             
+        except PageRangeError:
+            raise
         except Exception as e:
             logger.error(f"Error generating PDF: {str(e)}")
             raise Exception(f"Failed to generate PDF: {str(e)}")
     
+    async def export_question_paper(
+        self,
+        exam: Exam,
+        exam_set: ExamSet,
+        targets: List[ExportTarget],
+        template_type: str = "default",
+        customization: Optional[PaperCustomization] = None
+    ) -> dict:
+        """
+        Write several PDFs (page subsets, alternate metadata) from one layout
+        
+        Args:
+            exam: Exam information
+            exam_set: Exam set with questions
+            targets: Outputs to write, each naming its page ranges
+            template_type: Type of template to use
+            customization: Customization options
+            
+        Returns:
+            Dictionary with page count and list of written outputs
+        """
+        try:
+            logger.info(f"Starting multi-target export for exam: {exam.title}")
+            
+            if customization is None:
+                customization = PaperCustomization()
+            
+            html_content = await self.template_engine.render_question_paper_template(
+                exam=exam,
+                exam_set=exam_set,
+                template_type=template_type,
+                customization=customization
+            )
+            
+            loop = asyncio.get_event_loop()
+            export = await loop.run_in_executor(
+                self.executor,
+                self._export_targets_sync,
+                html_content,
+                customization,
+                targets
+            )
+            
+            logger.info(f"Exported {len(export['outputs'])} PDFs for exam: {exam.title}")
+            return export
+            
+        except PageRangeError:
+            raise
+        except Exception as e:
+            logger.error(f"Error exporting PDF targets: {str(e)}")
+            raise Exception(f"Failed to export PDF targets: {str(e)}")
+
+    async def generate_stamped_question_paper(
+        self,
+        exam: Exam,
+        exam_set: ExamSet,
+        copies: List[CopyStamp],
+        template_type: str = "default",
+        customization: Optional[PaperCustomization] = None,
+        stamp_options: Optional[StampOptions] = None
+    ) -> bytes:
+        """
+        Generate a personalized print run: one layout, one PDF-level stamp per copy
+        
+        Args:
+            exam: Exam information
+            exam_set: Exam set with questions
+            copies: Per-copy stamps (roll, center code, QR data)
+            template_type: Type of template to use
+            customization: Customization options
+            stamp_options: Stamp placement options
+            
+        Returns:
+            Combined PDF data as bytes
+        """
+        try:
+            logger.info(f"Starting stamped print run of {len(copies)} copies for exam: {exam.title}")
+            
+            base_pdf = await self.generate_question_paper(
+                exam=exam,
+                exam_set=exam_set,
+                template_type=template_type,
+                customization=customization
+            )
+            if not base_pdf.startswith(b'%PDF-'):
+                raise Exception("Base paper could not be rendered as PDF")
+            
+            loop = asyncio.get_event_loop()
+            pdf_data = await loop.run_in_executor(
+                self.executor,
+                self.stamper.stamp_copies,
+                base_pdf,
+                copies,
+                stamp_options
+            )
+            
+            logger.info(f"Successfully stamped {len(copies)} copies for exam: {exam.title}")
+            return pdf_data
+            
+        except Exception as e:
+            logger.error(f"Error generating stamped PDF: {str(e)}")
+            raise Exception(f"Failed to generate stamped PDF: {str(e)}")
+
+    async def generate_shuffled_sets(
+        self,
+        exam: Exam,
+        master_set: ExamSet,
+        seed: int,
+        set_count: int,
+        set_names: Optional[List[str]] = None,
+        shuffle_questions: bool = True,
+        shuffle_options: bool = True,
+        include_pdf: bool = True,
+        template_type: str = "default",
+        customization: Optional[PaperCustomization] = None
+    ) -> List[dict]:
+        """
+        Generate shuffled sets and their answer keys from one master set
+        
+        Question and option text goes through the LaTeX pass once, on the
+        master set; the sets only reorder the converted content. Each set is
+        still laid out on its own, since pagination depends on the order.
+        
+        Args:
+            exam: Exam information
+            master_set: Master exam set with its answer key
+            seed: Seed making the shuffle reproducible
+            set_count: Number of sets to generate
+            set_names: Optional set names
+            shuffle_questions: Shuffle question order per set
+            shuffle_options: Shuffle A-D options per set
+            include_pdf: Render a PDF for every set
+            template_type: Type of template to use
+            customization: Customization options
+            
+        Returns:
+            List of dictionaries with set_name, question_order, answer_key and pdf_data
+        """
+        try:
+            logger.info(f"Starting generation of {set_count} shuffled sets for exam: {exam.title}")
+            
+            if include_pdf:
+                master_set = self.template_engine.process_exam_set_latex(master_set)
+            
+            sets = self.set_shuffler.build_sets(
+                master=master_set,
+                seed=seed,
+                set_count=set_count,
+                shuffle_questions=shuffle_questions,
+                shuffle_options=shuffle_options,
+                set_names=set_names
+            )
+            
+            # Sets are laid out concurrently; the executor bounds how many render at once
+            pdfs = [None] * len(sets)
+            if include_pdf:
+                pdfs = await asyncio.gather(*(
+                    self.generate_question_paper(
+                        exam=exam,
+                        exam_set=shuffled["exam_set"],
+                        template_type=template_type,
+                        customization=customization,
+                        latex_processed=True
+                    )
+                    for shuffled in sets
+                ))
+            
+            results = [
+                {
+                    "set_name": shuffled["exam_set"].set_name,
+                    "question_order": shuffled["question_order"],
+                    "answer_key": shuffled["answer_key"],
+                    "pdf_data": pdf_data
+                }
+                for shuffled, pdf_data in zip(sets, pdfs)
+            ]
+            
+            logger.info(f"Successfully generated {set_count} shuffled sets for exam: {exam.title}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error generating shuffled sets: {str(e)}")
+            raise Exception(f"Failed to generate shuffled sets: {str(e)}")
+
+    async def estimate_question_paper_layout(
+        self,
+        exam: Exam,
+        exam_set: ExamSet,
+        template_type: str = "default",
+        customization: Optional[PaperCustomization] = None
+    ) -> dict:
+        """
+        Lay out the question paper without writing a PDF
+
+        Runs template rendering and WeasyPrint layout only, skipping
+        ``write_pdf`` (font subsetting and PDF encoding).
+        
+        Args:
+            exam: Exam information
+            exam_set: Exam set with questions
+            template_type: Type of template to use
+            customization: Customization options
+            
+        Returns:
+            Dictionary with page count and per-page overflow information
+        """
+        try:
+            logger.info(f"Starting layout estimation for exam: {exam.title}")
+            
+            if customization is None:
+                customization = PaperCustomization()
+            
+            html_content = await self.template_engine.render_question_paper_template(
+                exam=exam,
+                exam_set=exam_set,
+                template_type=template_type,
+                customization=customization
+            )
+            
+            loop = asyncio.get_event_loop()
+            layout = await loop.run_in_executor(
+                self.executor,
+                self._estimate_layout_sync,
+                html_content,
+                customization
+            )
+            
+            logger.info(f"Estimated {layout['page_count']} pages for exam: {exam.title}")
+            return layout
+            
+        except Exception as e:
+            logger.error(f"Error estimating layout: {str(e)}")
+            raise Exception(f"Failed to estimate layout: {str(e)}")
+
     async def generate_scholarship_pdf(self, scholarship_request) -> bytes:
         """
         Generate PDF scholarship result list
@@ -382,7 +643,8 @@ class PDFGenerator:
     async def _html_to_pdf(
         self, 
         html_content: str, 
-        customization: PaperCustomization
+        customization: PaperCustomization,
+        pages: Optional[str] = None
     ) -> bytes:
         """
         Convert HTML content to PDF using WeasyPrint
@@ -390,6 +652,7 @@ class PDFGenerator:
         Args:
             html_content: HTML content to convert
             customization: Customization options
+            pages: Optional page ranges to include
             
         Returns:
             PDF data as bytes
@@ -401,11 +664,14 @@ class PDFGenerator:
                 self.executor,
                 self._generate_pdf_sync,
                 html_content,
-                customization
+                customization,
+                pages
             )
             
             return pdf_data
             
+        except PageRangeError:
+            raise
         except Exception as e:
             logger.error(f"Error converting HTML to PDF: {str(e)}")
             raise Exception(f"Failed to convert HTML to PDF: {str(e)}")
@@ -413,7 +679,8 @@ class PDFGenerator:
     def _generate_pdf_sync(
         self, 
         html_content: str, 
-        customization: PaperCustomization
+        customization: PaperCustomization,
+        pages: Optional[str] = None
     ) -> bytes:
         """
         Synchronous PDF generation
@@ -421,6 +688,7 @@ class PDFGenerator:
         Args:
             html_content: HTML content
             customization: Customization options
+            pages: Optional page ranges to include
             
         Returns:
             PDF data as bytes
@@ -431,33 +699,241 @@ class PDFGenerator:
                 logger.warning("WeasyPrint not available, returning HTML content")
                 return html_content.encode('utf-8')
             
-            # Create HTML object
-            html_doc = HTML(string=html_content)
+            document = self._get_document_sync(html_content, customization)
+            if pages:
+                document = document.copy([document.pages[i] for i in parse_page_ranges(pages, len(document.pages))])
             
-            # Create CSS for additional styling
-            css_content = self._generate_css(customization)
-            css_doc = CSS(string=css_content, font_config=self.font_config)
-            
-            # Generate PDF
-            pdf_buffer = io.BytesIO()
-            html_doc.write_pdf(
-                target=pdf_buffer,
-                stylesheets=[css_doc],
-                font_config=self.font_config,
-                optimize_size=['fonts']
-            )
-            
-            pdf_data = pdf_buffer.getvalue()
-            pdf_buffer.close()
-            
-            return pdf_data
+            return self._write_document_pdf(document)
             
+        except PageRangeError:
+            raise
         except Exception as e:
             logger.error(f"Error in synchronous PDF generation: {str(e)}")
             # Fallback: return HTML content
             logger.warning("PDF generation failed, returning HTML content as fallback")
             return html_content.encode('utf-8')
     
+    def _render_document_sync(
+        self,
+        html_content: str,
+        customization: PaperCustomization
+    ):
+        """
+        Run WeasyPrint layout for a question paper
+        
+        Args:
+            html_content: HTML content
+            customization: Customization options
+            
+        Returns:
+            Laid out WeasyPrint Document
+        """
+        html_doc = HTML(string=html_content)
+        css_content = self._generate_css(customization)
+        css_doc = CSS(string=css_content, font_config=self.font_config)
+        return html_doc.render(stylesheets=[css_doc], font_config=self.font_config)
+    
+    def _get_document_sync(
+        self,
+        html_content: str,
+        customization: PaperCustomization
+    ):
+        """
+        Return the laid out Document for this content, rendering only on a cache miss
+        
+        Args:
+            html_content: HTML content
+            customization: Customization options
+            
+        Returns:
+            Laid out WeasyPrint Document; a copy, never the cached instance
+        """
+        key = hashlib.sha256(
+            html_content.encode('utf-8') + b'\0' + self._generate_css(customization).encode('utf-8')
+        ).hexdigest()
+        
+        document = self.document_cache.get(key)
+        if document is None:
+            document = self._render_document_sync(html_content, customization)
+            self.document_cache.put(key, document)
+            document = document.copy()
+        else:
+            logger.info("Reusing cached document layout")
+        return document
+    
+    def _write_document_pdf(self, document, title: Optional[str] = None) -> bytes:
+        """
+        Write a laid out Document (or page subset) to PDF bytes
+        
+        The document is copied first, metadata included, so writing never
+        touches a Document that other requests may share through the cache.
+        
+        Args:
+            document: WeasyPrint Document
+            title: Optional PDF title overriding the document metadata
+            
+        Returns:
+            PDF data as bytes
+        """
+        document = document.copy()
+        document.metadata = copy.copy(document.metadata)
+        if title:
+            document.metadata.title = title
+        
+        pdf_buffer = io.BytesIO()
+        document.write_pdf(target=pdf_buffer, optimize_size=['fonts'])
+        pdf_data = pdf_buffer.getvalue()
+        pdf_buffer.close()
+        
+        return pdf_data
+    
+    def _export_targets_sync(
+        self,
+        html_content: str,
+        customization: PaperCustomization,
+        targets: List[ExportTarget]
+    ) -> dict:
+        """
+        Synchronous multi-target export from a single layout
+        
+        Args:
+            html_content: HTML content
+            customization: Customization options
+            targets: Outputs to write
+            
+        Returns:
+            Dictionary with page count and list of written outputs
+        """
+        if not WEASYPRINT_AVAILABLE:
+            raise Exception("WeasyPrint is required for page-range export")
+        
+        document = self._get_document_sync(html_content, customization)
+        page_count = len(document.pages)
+        
+        outputs = []
+        for target in targets:
+            indexes = parse_page_ranges(target.pages, page_count) if target.pages else list(range(page_count))
+            subset = document.copy([document.pages[i] for i in indexes])
+            pdf_data = self._write_document_pdf(subset, title=target.title)
+            outputs.append({
+                "name": target.name,
+                "pages": [i + 1 for i in indexes],
+                "pdf_data": pdf_data
+            })
+        
+        return {"page_count": page_count, "outputs": outputs}
+    
+    def _estimate_layout_sync(
+        self,
+        html_content: str,
+        customization: PaperCustomization
+    ) -> dict:
+        """
+        Synchronous layout-only rendering
+        
+        Args:
+            html_content: HTML content
+            customization: Customization options
+            
+        Returns:
+            Dictionary with page count and per-page layout information
+        """
+        if not WEASYPRINT_AVAILABLE:
+            raise Exception("WeasyPrint is required for layout estimation")
+        
+        document = self._get_document_sync(html_content, customization)
+        margins = self._page_margins(customization)
+        pages = [self._page_layout_info(page, index + 1, margins) for index, page in enumerate(document.pages)]
+        
+        return {
+            "page_count": len(pages),
+            "overflow": any(page["overflow"] for page in pages),
+            "pages": pages
+        }
+    
+    def _page_layout_info(self, page, page_number: int, margins: tuple, max_boxes: int = 10) -> dict:
+        """
+        Collect question count and overflowing boxes for a laid out page
+        
+        The content area comes from the public page size and the @page margins
+        of our stylesheet. Only the walk over the laid out boxes needs the page's
+        box tree, which WeasyPrint does not expose publicly.
+        
+        Args:
+            page: WeasyPrint Page
+            page_number: Page number (1-based)
+            margins: (top, right, bottom, left) page margins in CSS pixels
+            max_boxes: Maximum number of overflowing boxes to report
+            
+        Returns:
+            Page layout information dictionary; only page size and number when the
+            box tree cannot be read
+        """
+        info = {
+            "page_number": page_number,
+            "width": round(page.width, 1),
+            "height": round(page.height, 1),
+            "question_count": 0,
+            "overflow": False,
+            "overflowing_boxes": [],
+            "inspected": False
+        }
+        
+        page_box = getattr(page, '_page_box', None)
+        margin_box_type = getattr(boxes, 'MarginBox', None)
+        if page_box is None or margin_box_type is None:
+            return info
+        
+        top, right, bottom, left = margins
+        content_right = page.width - right
+        content_bottom = page.height - bottom
+        
+        try:
+            overflowing = []
+            questions = set()
+            for child in getattr(page_box, 'children', []):
+                if isinstance(child, margin_box_type):
+                    continue
+                self._find_overflowing_boxes(child, content_right, content_bottom, overflowing)
+                descendants = getattr(child, 'descendants', None)
+                for box in (descendants() if descendants else []):
+                    element = getattr(box, 'element', None)
+                    if element is not None and 'question' in (element.get('class') or '').split():
+                        questions.add(id(element))
+        except (AttributeError, TypeError) as e:
+            logger.warning(f"Could not inspect layout of page {page_number}, reporting page count only: {str(e)}")
+            return info
+        
+        overflowing.sort(key=lambda item: max(item["overflow_x"], item["overflow_y"]), reverse=True)
+        info.update({
+            "question_count": len(questions),
+            "overflow": bool(overflowing),
+            "overflowing_boxes": overflowing[:max_boxes],
+            "inspected": True
+        })
+        return info
+    
+    def _find_overflowing_boxes(self, box, content_right: float, content_bottom: float, found: list):
+        """Record the outermost boxes extending past the page content area"""
+        try:
+            overflow_x = box.border_box_x() + box.border_width() - content_right
+            overflow_y = box.border_box_y() + box.border_height() - content_bottom
+        except (AttributeError, TypeError):
+            overflow_x = overflow_y = 0
+        
+        if overflow_x > 0.5 or overflow_y > 0.5:
+            element = getattr(box, 'element', None)
+            classes = (element.get('class') or '').split() if element is not None else []
+            found.append({
+                "element": (getattr(box, 'element_tag', None) or type(box).__name__) + ''.join(f".{c}" for c in classes),
+                "overflow_x": round(max(overflow_x, 0), 1),
+                "overflow_y": round(max(overflow_y, 0), 1)
+            })
+            return
+        
+        for child in getattr(box, 'children', []):
+            self._find_overflowing_boxes(child, content_right, content_bottom, found)
+    
     def _generate_css(self, customization: PaperCustomization) -> str:
         """
         Generate additional CSS for PDF styling with Bengali font support
@@ -567,6 +1043,21 @@ class PDFGenerator:
         
         return css_content
     
+    def _page_margins(self, customization: PaperCustomization) -> tuple:
+        """
+        Resolve the @page margin of our stylesheet to CSS pixels
+        
+        Args:
+            customization: Customization options
+            
+        Returns:
+            (top, right, bottom, left) margins in CSS pixels
+        """
+        values = [css_length_to_px(v) for v in self._get_margin_value(customization.margin_type).split()]
+        # CSS shorthand: one to four values expand to top, right, bottom, left
+        expand = {1: (0, 0, 0, 0), 2: (0, 1, 0, 1), 3: (0, 1, 2, 1), 4: (0, 1, 2, 3)}
+        return tuple(values[i] for i in expand[len(values)])
+    
     def _get_margin_value(self, margin_type: str) -> str:
         """Get margin value based on margin type"""
         margin_map = {
@@ -660,9 +1151,146 @@ class PDFGenerator:
         """Cleanup resources"""
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=True)
+        if hasattr(self, 'document_cache'):
+            self.document_cache.clear()
         logger.info("PDF generator cleanup completed")
 
 
+class PageRangeError(ValueError):
+    """A page range specification that is malformed or selects pages outside the document"""
+
+
+def _parse_page_spec(spec: str) -> List[tuple]:
+    """
+    Split a page range specification into (part, first, last) tuples
+    
+    Args:
+        spec: Comma separated pages and ranges, e.g. "1", "2-4", "1,3-", "-2"
+        
+    Returns:
+        One tuple per part; first is 1 and last is None where the range is open
+    """
+    parts = []
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                start, end = part.split('-', 1)
+                first = int(start) if start else 1
+                last = int(end) if end else None
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise PageRangeError(f"Invalid page range: '{part}'")
+        
+        if first < 1 or (last is not None and first > last):
+            raise PageRangeError(f"Invalid page range: '{part}'")
+        parts.append((part, first, last))
+    
+    if not parts:
+        raise PageRangeError("Page range selects no pages")
+    return parts
+
+
+def validate_page_spec(spec: str) -> str:
+    """
+    Check a page range specification before any rendering
+    
+    Args:
+        spec: Comma separated pages and ranges
+        
+    Returns:
+        The unchanged specification; raises PageRangeError if it is malformed
+    """
+    _parse_page_spec(spec)
+    return spec
+
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a page range specification into zero-based page indexes
+    
+    Args:
+        spec: Comma separated pages and ranges, e.g. "1", "2-4", "1,3-", "-2"
+        page_count: Number of pages in the document
+        
+    Returns:
+        List of zero-based page indexes in the requested order
+    """
+    indexes = []
+    for part, first, last in _parse_page_spec(spec):
+        last = page_count if last is None else last
+        if last > page_count or first > last:
+            raise PageRangeError(f"Page range '{part}' is outside the document (1-{page_count})")
+        indexes.extend(range(first - 1, last))
+    return indexes
+
+
+# CSS pixels per unit (WeasyPrint lays out in CSS pixels, 96 per inch)
+CSS_UNITS = {"px": 1.0, "in": 96.0, "cm": 96.0 / 2.54, "mm": 96.0 / 25.4, "pt": 96.0 / 72.0, "pc": 16.0}
+
+
+def css_length_to_px(value: str) -> float:
+    """
+    Convert an absolute CSS length such as "0.5in" or "12mm" to CSS pixels
+    
+    Args:
+        value: CSS length; a bare 0 is allowed
+        
+    Returns:
+        Length in CSS pixels
+    """
+    value = value.strip().lower()
+    if value == "0":
+        return 0.0
+    for unit, scale in CSS_UNITS.items():
+        if value.endswith(unit):
+            return float(value[:-len(unit)]) * scale
+    raise ValueError(f"Unsupported CSS length '{value}'")
+
+
+class DocumentCache:
+    """
+    Small thread-safe LRU cache of laid out documents with a time-to-live
+    
+    Callers get a copy of the cached Document, so concurrent requests never
+    share (or modify) the same instance.
+    """
+    
+    def __init__(self, max_entries: int = 8, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str):
+        """Return a copy of the cached document for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, document = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return document.copy()
+    
+    def put(self, key: str, document):
+        """Store a document, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), document)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached documents"""
+        with self._lock:
+            self._entries.clear()
+
+
 class PDFOptimizer:
     """PDF optimization utilities"""
     
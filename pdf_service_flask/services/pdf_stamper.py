@@ -0,0 +1,210 @@
+"""
+Per-copy PDF stamping service
+Overlays roll numbers, center codes or QR codes onto an already rendered paper
+"""
+
+import io
+import logging
+from typing import List, Optional, Tuple
+
+from models.question_models import CopyStamp, StampOptions
+
+# Try to import ReportLab and pypdf, stamping is disabled if not available
+try:
+    from reportlab.graphics import renderPDF
+    from reportlab.graphics.barcode import qr
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.pdfbase.pdfdoc import xObjectName
+    from reportlab.pdfgen import canvas
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+    STAMPING_AVAILABLE = True
+except ImportError:
+    STAMPING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+STAMP_XOBJECT = "/PaperStamp"
+
+
+class PDFStamper:
+    """
+    Stamp many personalized copies of one base PDF
+
+    Copy pages are added with PdfWriter.add_page, so they keep the base
+    page's annotations, transparency group, rotation and boxes while sharing
+    its content streams and resources. Each copy only adds its own stamp,
+    a small Form XObject drawn after the base content, so a 1,000-copy run
+    costs one layout and one small overlay per copy instead of 1,000 layouts.
+    """
+
+    def stamp_copies(
+        self,
+        base_pdf: bytes,
+        copies: List[CopyStamp],
+        options: Optional[StampOptions] = None
+    ) -> bytes:
+        """
+        Build a single print-ready PDF with one stamped copy per entry
+
+        Args:
+            base_pdf: Rendered question paper
+            copies: Per-copy stamp text / QR payloads, in print order
+            options: Stamp placement options
+
+        Returns:
+            Combined PDF data as bytes
+        """
+        if not STAMPING_AVAILABLE:
+            raise Exception("ReportLab and pypdf are required for PDF stamping")
+
+        if options is None:
+            options = StampOptions()
+
+        base_reader = PdfReader(io.BytesIO(base_pdf))
+        base_pages = base_reader.pages
+        stamped_pages = [index for index in range(len(base_pages)) if options.all_pages or index == 0]
+        placements = {index: self._page_placement(base_pages[index]) for index in stamped_pages}
+        page_sizes = sorted({size for size, _ in placements.values()})
+
+        overlay_reader = PdfReader(io.BytesIO(self._render_overlays(copies, page_sizes, options)))
+
+        writer = PdfWriter()
+        head = self._content_stream(b"q")
+        tails = {}
+        stamped_contents = {}
+
+        for copy_index, overlay_page in enumerate(overlay_reader.pages):
+            forms = overlay_page["/Resources"]["/XObject"]
+            for page_index, base_page in enumerate(base_pages):
+                page = writer.add_page(base_page)
+                if page_index not in placements:
+                    continue
+                size, matrix = placements[page_index]
+                form_name = "/" + xObjectName(f"Stamp{copy_index}_{page_sizes.index(size)}")
+                self._attach_stamp(writer, page, forms[form_name])
+
+                if page_index in stamped_contents:
+                    page[NameObject("/Contents")] = stamped_contents[page_index]
+                    continue
+                if matrix not in tails:
+                    tails[matrix] = self._content_stream(
+                        b"Q q %s cm %s Do Q" % (" ".join(f"{v:g}" for v in matrix).encode(), STAMP_XOBJECT.encode())
+                    )
+                self._wrap_contents(page, head, tails[matrix])
+                stamped_contents[page_index] = page.raw_get("/Contents")
+
+        output = io.BytesIO()
+        writer.write(output)
+        logger.info(f"Stamped {len(copies)} copies of a {len(base_pages)}-page paper")
+        return output.getvalue()
+
+    def _page_placement(self, page) -> Tuple[Tuple[float, float], Tuple[float, ...]]:
+        """
+        Work out where a stamp goes on a base page
+
+        Returns:
+            The page size as displayed (width and height swap for 90 / 270
+            degree rotation) and the matrix mapping that displayed space into
+            the page's default user space
+        """
+        box = page.mediabox
+        width, height = float(box.width), float(box.height)
+        left, bottom = float(box.left), float(box.bottom)
+        rotation = (page.rotation or 0) % 360
+
+        if rotation == 90:
+            return (height, width), (0, 1, -1, 0, left + width, bottom)
+        if rotation == 180:
+            return (width, height), (-1, 0, 0, -1, left + width, bottom + height)
+        if rotation == 270:
+            return (height, width), (0, -1, 1, 0, left, bottom + height)
+        return (width, height), (1, 0, 0, 1, left, bottom)
+
+    def _attach_stamp(self, writer, page, stamp_form):
+        """Add stamp_form to a copy page's resources without touching the resources it shares with other copies"""
+        resources = page.get("/Resources")
+        resources = DictionaryObject(resources.get_object()) if resources is not None else DictionaryObject()
+        xobjects = resources.get("/XObject")
+        xobjects = DictionaryObject(xobjects.get_object()) if xobjects is not None else DictionaryObject()
+        xobjects[NameObject(STAMP_XOBJECT)] = stamp_form.clone(writer).indirect_reference
+        resources[NameObject("/XObject")] = xobjects
+        page[NameObject("/Resources")] = resources
+
+    def _wrap_contents(self, page, head, tail):
+        """
+        Point a page at [head, base content streams..., tail]
+
+        The base streams are kept as they are; head saves the graphics state
+        and tail restores it before drawing the stamp, so whatever the base
+        content leaves behind (WeasyPrint flips the y axis) cannot move it.
+        """
+        contents = page.pop("/Contents", None)
+        if contents is None:
+            base_streams = []
+        elif isinstance(contents.get_object(), ArrayObject):
+            base_streams = list(contents.get_object())
+        else:
+            base_streams = [contents]
+        page.replace_contents(ArrayObject([head, *base_streams, tail]))
+
+    def _content_stream(self, data: bytes):
+        """Create a content stream that is added to the writer on first use and shared after that"""
+        stream = DecodedStreamObject()
+        stream.set_data(data)
+        return stream
+
+    def _render_overlays(
+        self,
+        copies: List[CopyStamp],
+        page_sizes: List[Tuple[float, float]],
+        options: StampOptions
+    ) -> bytes:
+        """
+        Render all stamps into one PDF sharing font resources
+
+        Page k holds the Form XObjects of copy k, one per displayed page size,
+        named Stamp<k>_<size index>.
+        """
+        buffer = io.BytesIO()
+        overlay = canvas.Canvas(buffer, pageCompression=1)
+        margin = options.margin
+
+        for copy_index, stamp in enumerate(copies):
+            qr_size = options.qr_size if stamp.qr_data else 0
+            text_width = overlay.stringWidth(stamp.text or "", "Helvetica-Bold", options.font_size)
+            block_width = max(qr_size, text_width)
+            block_height = qr_size + (options.font_size + 2 if stamp.text else 0)
+
+            for size_index, (width, height) in enumerate(page_sizes):
+                form_name = f"Stamp{copy_index}_{size_index}"
+                overlay.setPageSize((width, height))
+                overlay.beginForm(form_name)
+
+                x = margin if options.position.endswith("left") else width - margin - block_width
+                y = height - margin - block_height if options.position.startswith("top") else margin
+
+                if stamp.qr_data:
+                    self._draw_qr(overlay, stamp.qr_data, x + block_width - qr_size, y + block_height - qr_size, qr_size)
+
+                if stamp.text:
+                    overlay.setFont("Helvetica-Bold", options.font_size)
+                    overlay.setFillGray(0.2)
+                    overlay.drawRightString(x + block_width, y, stamp.text)
+
+                overlay.endForm()
+                overlay.doForm(form_name)
+
+            overlay.showPage()
+
+        overlay.save()
+        return buffer.getvalue()
+
+    def _draw_qr(self, overlay, data: str, x: float, y: float, size: float, border: int = 4):
+        """Draw a QR code with its quiet zone as a size x size square at (x, y)"""
+        widget = qr.QrCodeWidget(data, barLevel="M", barBorder=border)
+        left, bottom, right, top = widget.getBounds()
+        drawing = Drawing(size, size, transform=[size / (right - left), 0, 0, size / (top - bottom), 0, 0])
+        drawing.add(widget)
+        renderPDF.draw(drawing, overlay, x, y)
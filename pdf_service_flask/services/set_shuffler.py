@@ -0,0 +1,146 @@
+"""
+Server-side shuffled exam set generation
+Builds Set A/B/C/D... from one master set with deterministic, vectorized permutations
+"""
+
+import logging
+import string
+from typing import List, Optional
+
+import numpy as np
+
+from models.question_models import ExamSet, QuestionType
+
+logger = logging.getLogger(__name__)
+
+OPTION_KEYS = ['A', 'B', 'C', 'D']
+
+
+def batch_permutations(rng: np.random.Generator, shape: tuple) -> np.ndarray:
+    """
+    Generate many independent permutations at once
+
+    Args:
+        rng: Seeded NumPy generator
+        shape: Leading batch dimensions plus the permutation length as the last axis
+
+    Returns:
+        Integer array of the given shape where each last-axis row is a permutation
+    """
+    return np.argsort(rng.random(shape), axis=-1, kind='stable')
+
+
+class ExamSetShuffler:
+    """Derive shuffled exam sets and their answer keys from a master set"""
+
+    def build_sets(
+        self,
+        master: ExamSet,
+        seed: int,
+        set_count: int,
+        shuffle_questions: bool = True,
+        shuffle_options: bool = True,
+        set_names: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Build shuffled sets from a master set
+
+        Args:
+            master: Master exam set (question text already preprocessed)
+            seed: Seed making the shuffle reproducible
+            set_count: Number of sets to build
+            shuffle_questions: Shuffle question order per set
+            shuffle_options: Shuffle A-D options per question per set
+            set_names: Optional set names, defaults to "Set A", "Set B", ...
+
+        Returns:
+            List of dictionaries with exam_set, question_order and answer_key
+        """
+        questions = master.questions
+        n = len(questions)
+        # Independent streams, so turning one shuffle on or off never changes the other's draws
+        question_rng, option_rng = (np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(2))
+
+        # (sets x questions): position j of set s shows master question order[s, j]
+        if shuffle_questions:
+            order = batch_permutations(question_rng, (set_count, n))
+        else:
+            order = np.broadcast_to(np.arange(n), (set_count, n))
+
+        # (sets x questions x 4): new option slot k of master question q shows option_perm[s, q, k]
+        option_perm = np.broadcast_to(np.arange(4), (set_count, n, 4)).copy()
+        shuffleable = np.array([self._has_full_options(q) for q in questions], dtype=bool)
+        if shuffle_options and shuffleable.any():
+            option_perm[:, shuffleable] = batch_permutations(option_rng, (set_count, int(shuffleable.sum()), 4))
+        inverse_perm = np.argsort(option_perm, axis=-1)
+
+        # Master answer index per question (-1 when missing or not a single A-D letter)
+        master_answers = [master.answer_key.get(str(q.qno)) for q in questions]
+        answer_index = np.array(
+            [OPTION_KEYS.index(a.strip().upper()) if a and a.strip().upper() in OPTION_KEYS else -1 for a in master_answers]
+        )
+        # (sets x questions): new option index of each master question's answer
+        new_answer_index = np.take_along_axis(
+            inverse_perm, np.maximum(answer_index, 0)[None, :, None].repeat(set_count, axis=0), axis=-1
+        )[..., 0]
+
+        names = set_names or [f"Set {string.ascii_uppercase[i % 26]}" for i in range(set_count)]
+        sets = []
+        for s in range(set_count):
+            shuffled_questions = []
+            answer_key = {}
+            for position, q_index in enumerate(order[s].tolist()):
+                question = questions[q_index]
+                new_qno = position + 1
+                perm = option_perm[s, q_index]
+                update = {"qno": new_qno}
+                if shuffleable[q_index]:
+                    update["options"] = {OPTION_KEYS[k]: question.options[OPTION_KEYS[perm[k]]] for k in range(4)}
+                    if self._is_letter_answer(question.correct_answer):
+                        update["correct_answer"] = self._remap_answer(question.correct_answer, inverse_perm[s, q_index])
+                shuffled_questions.append(question.copy(update=update))
+
+                master_answer = master_answers[q_index]
+                if master_answer is None:
+                    continue
+                if answer_index[q_index] >= 0:
+                    answer_key[str(new_qno)] = OPTION_KEYS[new_answer_index[s, q_index]]
+                else:
+                    answer_key[str(new_qno)] = self._remap_answer(master_answer, inverse_perm[s, q_index])
+
+            exam_set = master.copy(update={
+                "set_name": names[s],
+                "questions": shuffled_questions,
+                "answer_key": answer_key
+            })
+            sets.append({
+                "exam_set": exam_set,
+                "question_order": [questions[i].qno for i in order[s].tolist()],
+                "answer_key": answer_key
+            })
+
+        logger.info(f"Built {set_count} shuffled sets of {n} questions with seed {seed}")
+        return sets
+
+    @staticmethod
+    def _has_full_options(question) -> bool:
+        """Only MCQs with all of A-D are option-shuffled"""
+        return (
+            question.question_type == QuestionType.MCQ
+            and question.options is not None
+            and all(question.options.get(k) is not None for k in OPTION_KEYS)
+        )
+
+    @staticmethod
+    def _is_letter_answer(answer: Optional[str]) -> bool:
+        """True for answers given as option letters ("B", "A,C"); free-text answers are left as written"""
+        return bool(answer) and all(token.strip().upper() in OPTION_KEYS for token in answer.split(','))
+
+    @staticmethod
+    def _remap_answer(answer: str, inverse: np.ndarray) -> str:
+        """Remap multi-letter answers such as "A,C" letter by letter"""
+        mapped = []
+        for token in answer.split(','):
+            key = token.strip().upper()
+            mapped.append(OPTION_KEYS[inverse[OPTION_KEYS.index(key)]] if key in OPTION_KEYS else token.strip())
+        return ','.join(sorted(mapped))
@@ -42,7 +42,8 @@ class TemplateEngine:
         exam: Exam,
         exam_set: ExamSet,
         template_type: str = "default",
-        customization: Optional[PaperCustomization] = None
+        customization: Optional[PaperCustomization] = None,
+        latex_processed: bool = False
     ) -> str:
         """
         Render question paper template to HTML
@@ -52,6 +53,8 @@ class TemplateEngine:
             exam_set: Exam set with questions
             template_type: Type of template to use
             customization: Customization options
+            latex_processed: The questions already went through
+                process_exam_set_latex, so skip the LaTeX pass
             
         Returns:
             Rendered HTML content
@@ -62,22 +65,13 @@ class TemplateEngine:
                 customization = PaperCustomization()
             
             # Process questions to convert LaTeX expressions to SVG
-            processed_exam_set = exam_set.copy() if hasattr(exam_set, 'copy') else exam_set
-            if hasattr(processed_exam_set, 'questions') and processed_exam_set.questions:
-                # Convert questions to list of dicts for processing
-                questions_data = []
-                for question in processed_exam_set.questions:
-                    if hasattr(question, 'dict'):
-                        questions_data.append(question.dict())
-                    elif hasattr(question, '__dict__'):
-                        questions_data.append(question.__dict__)
-                    else:
-                        questions_data.append(question)
-                
+            questions_data = self._questions_data(exam_set)
+            if latex_processed:
+                processed_questions = questions_data
+            elif questions_data:
                 # Process LaTeX expressions in questions
                 processed_questions = latex_renderer.process_questions_list(questions_data)
                 
-                # Update exam_set with processed questions
                 # Note: We'll pass both original and processed questions to template
                 logger.info(f"Processed {len(processed_questions)} questions for LaTeX expressions")
             else:
@@ -113,6 +107,45 @@ class TemplateEngine:
             logger.error(f"Error rendering template: {str(e)}")
             raise Exception(f"Failed to render template: {str(e)}")
     
+    def process_exam_set_latex(self, exam_set: ExamSet) -> ExamSet:
+        """
+        Convert LaTeX in an exam set's questions and options to SVG up front
+        
+        Used for shuffled sets: the master is converted once and every set
+        only reorders the converted content (rendered with latex_processed).
+        
+        Args:
+            exam_set: Exam set with questions
+            
+        Returns:
+            Copy of the exam set with converted question and option text
+        """
+        processed = latex_renderer.process_questions_list(self._questions_data(exam_set))
+        questions = []
+        for question, data in zip(exam_set.questions, processed):
+            update = {"question": data["question"]}
+            if question.options is not None:
+                # Missing options stay None instead of becoming the string "None"
+                update["options"] = {
+                    key: data["options"][key] if value is not None else None
+                    for key, value in question.options.items()
+                }
+            questions.append(question.copy(update=update))
+        return exam_set.copy(update={"questions": questions})
+    
+    @staticmethod
+    def _questions_data(exam_set) -> list:
+        """Exam set questions as a list of dicts, the form the LaTeX pass and templates use"""
+        questions_data = []
+        for question in getattr(exam_set, 'questions', None) or []:
+            if hasattr(question, 'dict'):
+                questions_data.append(question.dict())
+            elif hasattr(question, '__dict__'):
+                questions_data.append(question.__dict__)
+            else:
+                questions_data.append(question)
+        return questions_data
+    
     async def render_scholarship_template(self, scholarship_request) -> str:
         """
         Render scholarship template to HTML
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests that cached layouts are only ever handed out and written as copies
+"""
+
+import copy
+
+from services.pdf_generator import DocumentCache, PDFGenerator
+
+
+class FakeMetadata:
+    def __init__(self, title):
+        self.title = title
+
+
+class FakeDocument:
+    """Mimics weasyprint.Document.copy(): a new Document sharing the pages and the metadata object"""
+
+    def __init__(self, pages, metadata):
+        self.pages = pages
+        self.metadata = metadata
+        self.written_titles = []
+
+    def copy(self, pages="all"):
+        return FakeDocument(self.pages if pages == "all" else list(pages), self.metadata)
+
+    def write_pdf(self, target, **options):
+        self.written_titles.append(self.metadata.title)
+        target.write(f"%PDF {self.metadata.title} {len(self.pages)}".encode())
+
+
+def test_cache_hands_out_copies():
+    cache = DocumentCache()
+    document = FakeDocument([1, 2, 3], FakeMetadata("Exam"))
+    cache.put("key", document)
+    first, second = cache.get("key"), cache.get("key")
+    assert first is not document and second is not first
+    assert first.pages == document.pages
+    assert cache.get("missing") is None
+
+
+def test_get_document_never_returns_the_cached_instance(monkeypatch):
+    generator = PDFGenerator()
+    rendered = FakeDocument([1, 2], FakeMetadata("Exam"))
+    monkeypatch.setattr(generator, "_render_document_sync", lambda html, customization: rendered)
+    monkeypatch.setattr(generator, "_generate_css", lambda customization: "")
+    miss = generator._get_document_sync("<p>x</p>", None)
+    hit = generator._get_document_sync("<p>x</p>", None)
+    assert miss is not rendered and hit is not rendered and hit is not miss
+
+
+def test_writing_does_not_touch_the_shared_document():
+    generator = PDFGenerator()
+    document = FakeDocument([1, 2], FakeMetadata("Exam"))
+    before = copy.copy(document.metadata.__dict__)
+    assert generator._write_document_pdf(document, title="Teacher copy") == b"%PDF Teacher copy 2"
+    assert generator._write_document_pdf(document) == b"%PDF Exam 2"
+    assert document.metadata.__dict__ == before and document.written_titles == []
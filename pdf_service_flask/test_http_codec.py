@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for request/response compression and the orjson JSON provider
+"""
+
+import datetime
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from services import http_codec
+from services.http_codec import (
+    FastJSONProvider,
+    RequestBodyTooLarge,
+    choose_encoding,
+    compress_response,
+    decompress_body,
+    decompress_request,
+)
+
+needs_zstd = pytest.mark.skipif(not http_codec.ZSTD_AVAILABLE, reason="zstandard not installed")
+
+
+@needs_zstd
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate, br, zstd", "zstd"),
+    ("zstd;q=0, gzip", "gzip"),
+    ("ZSTD", "zstd"),
+])
+def test_choose_encoding_prefers_zstd(accept, expected):
+    assert choose_encoding(accept) == expected
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=0.5", "gzip"),
+    ("gzip; q=0", None),
+    ("*", "gzip"),
+    ("br, deflate", None),
+    ("", None),
+    ("identity", None),
+])
+def test_choose_encoding_gzip(accept, expected):
+    assert choose_encoding(accept) == expected
+
+
+def test_choose_encoding_without_zstandard(monkeypatch):
+    monkeypatch.setattr(http_codec, "ZSTD_AVAILABLE", False)
+    assert choose_encoding("zstd, gzip") == "gzip"
+    assert choose_encoding("zstd") is None
+
+
+def test_decompress_body_gzip_and_limit():
+    body = gzip.compress(b"x" * 1000)
+    assert decompress_body(body, "gzip", 1000) == b"x" * 1000
+    with pytest.raises(RequestBodyTooLarge):
+        decompress_body(body, "x-gzip", 999)
+    with pytest.raises(ValueError):
+        decompress_body(body, "br", 1000)
+
+
+@needs_zstd
+def test_decompress_body_zstd():
+    body = http_codec.zstandard.ZstdCompressor().compress(b"payload" * 100)
+    assert decompress_body(body, "zstd", 1000) == b"payload" * 100
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.update(MAX_DECOMPRESSED_BODY=4096, RESPONSE_COMPRESSION_MIN_SIZE=100)
+    app.before_request(decompress_request)
+    app.after_request(compress_response)
+
+    @app.after_request
+    def add_cors(response):
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        return jsonify(request.get_json())
+
+    return app.test_client()
+
+
+def test_compressed_request_round_trip(client):
+    payload = {"text": "বাংলা প্রশ্ন", "items": list(range(100))}
+    response = client.post(
+        "/echo",
+        data=gzip.compress(json.dumps(payload).encode()),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json", "Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.get_data())) == payload
+
+
+@pytest.mark.parametrize("encoding, body, status", [
+    ("gzip", b"not gzip", 400),
+    ("br", b"x", 415),
+    ("gzip", gzip.compress(b" " * 5000), 413),
+])
+def test_rejected_bodies_still_get_after_request_headers(client, encoding, body, status):
+    response = client.post("/echo", data=body, headers={"Content-Encoding": encoding, "Content-Type": "application/json"})
+    assert response.status_code == status
+    assert response.headers["Access-Control-Allow-Origin"] == "*"
+    assert response.get_json()["success"] is False
+
+
+def test_json_provider_keeps_default_formats():
+    app = Flask(__name__)
+    reference = DefaultJSONProvider(app)
+    reference.ensure_ascii = False
+    obj = {"b": 1, "a": {"when": datetime.datetime(2024, 1, 2, 3, 4, 5), "day": datetime.date(2024, 1, 2)}, "ছ": "বাংলা"}
+    output = FastJSONProvider(app).dumps(obj)
+    assert output == json.dumps(json.loads(reference.dumps(obj)), ensure_ascii=False, separators=(",", ":"))
+    assert '"when":"Tue, 02 Jan 2024 03:04:05 GMT"' in output
+    assert FastJSONProvider(app).loads(output.encode("utf-8"))["ছ"] == "বাংলা"
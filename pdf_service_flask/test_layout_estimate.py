@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the layout-only (dry run) question paper estimate
+"""
+
+import types
+
+import pytest
+
+from models.question_models import MarginType, PaperCustomization
+from services import pdf_generator
+from services.pdf_generator import PDFGenerator, css_length_to_px
+
+
+class FakeBox:
+    """Laid out box with the geometry methods the estimate reads"""
+
+    def __init__(self, x, y, width, height, classes="", tag="div", children=()):
+        self.x, self.y, self.w, self.h = x, y, width, height
+        self.element = {"class": classes}
+        self.element_tag = tag
+        self.children = list(children)
+
+    def border_box_x(self):
+        return self.x
+
+    def border_box_y(self):
+        return self.y
+
+    def border_width(self):
+        return self.w
+
+    def border_height(self):
+        return self.h
+
+    def descendants(self):
+        yield self
+        for child in self.children:
+            yield from child.descendants()
+
+
+class FakeMarginBox(FakeBox):
+    pass
+
+
+def make_page(*children, width=794.0, height=1123.0):
+    return types.SimpleNamespace(width=width, height=height, _page_box=types.SimpleNamespace(children=list(children)))
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    generator = PDFGenerator()
+    monkeypatch.setattr(pdf_generator, "WEASYPRINT_AVAILABLE", True)
+    monkeypatch.setattr(pdf_generator, "boxes", types.SimpleNamespace(MarginBox=FakeMarginBox))
+    return generator
+
+
+@pytest.mark.parametrize("value, expected", [("1in", 96), ("0.5in", 48), ("2.54cm", 96), ("25.4mm", 96), ("72pt", 96), ("0", 0)])
+def test_css_lengths(value, expected):
+    assert css_length_to_px(value) == pytest.approx(expected)
+
+
+def test_margins_follow_the_customization(generator):
+    assert generator._page_margins(PaperCustomization(margin_type=MarginType.NARROW)) == (48, 48, 48, 48)
+    assert generator._page_margins(PaperCustomization()) == (96, 96, 96, 96)
+
+
+def test_estimate_reports_questions_and_overflow(generator, monkeypatch):
+    # Normal margins: the content area of an A4 page ends at x = 698, y = 1027
+    fits = FakeBox(96, 96, 600, 900, children=[FakeBox(96, 96, 600, 40, "question"), FakeBox(96, 140, 600, 40, "question")])
+    too_wide = FakeBox(96, 96, 640, 200, "question wide-table", tag="table")
+    too_long = FakeBox(96, 900, 600, 140, children=[FakeBox(96, 900, 600, 140, "question")])
+    footer = FakeMarginBox(96, 1060, 600, 40, "question")  # Margin boxes are outside the content area by design
+    document = types.SimpleNamespace(pages=[make_page(fits, footer), make_page(too_wide, too_long)])
+    monkeypatch.setattr(generator, "_get_document_sync", lambda html, customization: document)
+
+    estimate = generator._estimate_layout_sync("<html></html>", PaperCustomization())
+    assert estimate["page_count"] == 2 and estimate["overflow"]
+    first, second = estimate["pages"]
+    assert first["inspected"] and not first["overflow"] and first["question_count"] == 2
+    assert second["question_count"] == 2
+    assert second["overflowing_boxes"] == [
+        {"element": "table.question.wide-table", "overflow_x": 38.0, "overflow_y": 0},
+        {"element": "div", "overflow_x": 0, "overflow_y": 13.0},
+    ]
+
+
+def test_estimate_without_the_box_tree_reports_page_count_only(generator, monkeypatch):
+    pages = [types.SimpleNamespace(width=794.0, height=1123.0) for _ in range(3)]
+    monkeypatch.setattr(generator, "_get_document_sync", lambda html, customization: types.SimpleNamespace(pages=pages))
+
+    estimate = generator._estimate_layout_sync("<html></html>", PaperCustomization())
+    assert estimate["page_count"] == 3 and not estimate["overflow"]
+    assert [page["inspected"] for page in estimate["pages"]] == [False, False, False]
+    assert estimate["pages"][0]["width"] == 794.0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for page range parsing used by the download and export endpoints
+"""
+
+import pytest
+
+from services.pdf_generator import PageRangeError, parse_page_ranges, validate_page_spec
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("1", [0]),
+    ("2-4", [1, 2, 3]),
+    ("1,3-", [0, 2, 3, 4]),
+    ("-2", [0, 1]),
+    ("5", [4]),
+    (" 1 , 4 - 5 ", [0, 3, 4]),
+    ("3,1", [2, 0]),
+    ("2,2", [1, 1]),
+    ("1,,2,", [0, 1]),
+    ("-", [0, 1, 2, 3, 4]),
+])
+def test_parse_page_ranges(spec, expected):
+    assert parse_page_ranges(spec, 5) == expected
+
+
+@pytest.mark.parametrize("spec", ["", ",", "0", "0-2", "3-2", "a", "1-b", "1.5", "2--3"])
+def test_malformed_specs_are_rejected(spec):
+    with pytest.raises(PageRangeError):
+        validate_page_spec(spec)
+    with pytest.raises(PageRangeError):
+        parse_page_ranges(spec, 5)
+
+
+@pytest.mark.parametrize("spec", ["6", "4-6", "1,9-"])
+def test_ranges_outside_the_document_are_rejected(spec):
+    assert validate_page_spec(spec) == spec
+    with pytest.raises(PageRangeError):
+        parse_page_ranges(spec, 5)
+
+
+def test_page_range_error_is_a_value_error():
+    assert issubclass(PageRangeError, ValueError)
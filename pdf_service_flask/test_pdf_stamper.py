@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for per-copy PDF stamping
+"""
+
+import io
+
+import pytest
+
+from models.question_models import CopyStamp, StampOptions
+from services import pdf_stamper
+from services.pdf_stamper import PDFStamper
+
+pytestmark = pytest.mark.skipif(not pdf_stamper.STAMPING_AVAILABLE, reason="ReportLab and pypdf are required")
+
+
+def make_base() -> bytes:
+    """Portrait page with a link and a y-flipped CTM (like WeasyPrint), then a rotated page"""
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(595, 842))
+    pdf.translate(0, 842)
+    pdf.scale(1, -1)
+    pdf.drawString(72, 72, "Page one")
+    pdf.linkURL("https://example.com", (72, 60, 200, 90))
+    pdf.showPage()
+    pdf.setPageRotation(90)
+    pdf.drawString(72, 72, "Page two")
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def read(data: bytes):
+    from pypdf import PdfReader
+    return PdfReader(io.BytesIO(data)).pages
+
+
+def test_every_copy_gets_its_own_stamp():
+    copies = [CopyStamp(text=f"Roll: 1000{k}", qr_data=f"1000{k}" if k % 2 else None) for k in range(4)]
+    pages = read(PDFStamper().stamp_copies(make_base(), copies, StampOptions(all_pages=True)))
+
+    assert len(pages) == 8
+    for k in range(4):
+        first, second = pages[2 * k].extract_text(), pages[2 * k + 1].extract_text()
+        assert "Page one" in first and f"Roll: 1000{k}" in first
+        assert "Page two" in second and f"Roll: 1000{k}" in second
+        assert all(f"Roll: 1000{other}" not in first for other in range(4) if other != k)
+
+
+def test_page_attributes_survive_stamping():
+    copies = [CopyStamp(text="Roll: A"), CopyStamp(text="Roll: B")]
+    pages = read(PDFStamper().stamp_copies(make_base(), copies, StampOptions(all_pages=False)))
+
+    assert [page.rotation for page in pages] == [0, 90, 0, 90]
+    assert all("/Annots" in pages[i] for i in (0, 2))
+    # Without all_pages only the first page of each copy is stamped
+    assert "Roll" not in pages[1].extract_text() and "Roll: B" in pages[2].extract_text()
+
+
+def test_copies_share_the_base_content():
+    base = make_base()
+    one = PDFStamper().stamp_copies(base, [CopyStamp(text="Roll: 1")])
+    many = PDFStamper().stamp_copies(base, [CopyStamp(text=f"Roll: {k}") for k in range(50)])
+    assert (len(many) - len(one)) / 49 < 1500
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for shuffled exam set generation and answer key remapping
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from models.question_models import Exam, ExamSet, Question, QuestionType
+from services import latex_renderer as latex_module
+from services.pdf_generator import PDFGenerator
+from services.set_shuffler import OPTION_KEYS, ExamSetShuffler, batch_permutations
+
+
+def make_master() -> ExamSet:
+    """Six questions: single and multi-letter keys, a free-text answer, a short MCQ and an unkeyed question"""
+    questions = [
+        Question(qno=q, question=f"Question {q}", options={k: f"Q{q} option {k}" for k in OPTION_KEYS}, correct_answer=answer)
+        for q, answer in ((1, "B"), (2, "A,C"), (3, "D"), (4, None))
+    ]
+    questions.append(Question(qno=5, question="Question 5", options={"A": "Yes", "B": "No"}, correct_answer="B"))
+    questions.append(Question(qno=6, question="Explain", question_type=QuestionType.SHORT_ANSWER, correct_answer="Photosynthesis"))
+    return ExamSet(
+        set_name="Master",
+        questions=questions,
+        answer_key={"1": "B", "2": "A,C", "3": "D", "5": "B", "6": "Photosynthesis"},
+    )
+
+
+def option_texts(question, answer):
+    return sorted(question.options[key] for key in answer.split(","))
+
+
+@pytest.mark.parametrize("shuffle_questions, shuffle_options", [(True, True), (False, True), (True, False)])
+def test_answer_keys_follow_the_shuffled_options(shuffle_questions, shuffle_options):
+    master = make_master()
+    by_qno = {q.qno: q for q in master.questions}
+    sets = ExamSetShuffler().build_sets(master, seed=42, set_count=4,
+                                        shuffle_questions=shuffle_questions, shuffle_options=shuffle_options)
+
+    for built in sets:
+        exam_set = built["exam_set"]
+        assert sorted(built["question_order"]) == [1, 2, 3, 4, 5, 6]
+        if not shuffle_questions:
+            assert built["question_order"] == [1, 2, 3, 4, 5, 6]
+        for position, master_qno in enumerate(built["question_order"], start=1):
+            original, shuffled = by_qno[master_qno], exam_set.questions[position - 1]
+            assert shuffled.qno == position and shuffled.question == original.question
+            if original.options is not None:
+                assert sorted(shuffled.options.values()) == sorted(original.options.values())
+            master_answer = master.answer_key.get(str(master_qno))
+            if master_answer is None:
+                assert str(position) not in built["answer_key"]
+            elif master_answer == "Photosynthesis":
+                assert built["answer_key"][str(position)] == shuffled.correct_answer == "Photosynthesis"
+            else:
+                # The inverse permutation must point the key at the same option text as in the master
+                new_answer = built["answer_key"][str(position)]
+                assert option_texts(shuffled, new_answer) == option_texts(original, master_answer)
+                assert shuffled.correct_answer == new_answer
+        assert exam_set.answer_key == built["answer_key"]
+
+
+def test_short_option_lists_are_not_shuffled():
+    for built in ExamSetShuffler().build_sets(make_master(), seed=3, set_count=3):
+        position = built["question_order"].index(5) + 1
+        question = built["exam_set"].questions[position - 1]
+        assert question.options == {"A": "Yes", "B": "No"} and built["answer_key"][str(position)] == "B"
+
+
+def test_same_seed_gives_the_same_sets():
+    first = ExamSetShuffler().build_sets(make_master(), seed=7, set_count=3, set_names=["P", "Q", "R"])
+    second = ExamSetShuffler().build_sets(make_master(), seed=7, set_count=3, set_names=["P", "Q", "R"])
+    assert [s["exam_set"].set_name for s in first] == ["P", "Q", "R"]
+    assert [(s["question_order"], s["answer_key"]) for s in first] == [(s["question_order"], s["answer_key"]) for s in second]
+    assert [s["exam_set"].questions for s in first] == [s["exam_set"].questions for s in second]
+
+
+def test_toggling_question_shuffle_keeps_the_option_shuffle():
+    shuffled = ExamSetShuffler().build_sets(make_master(), seed=11, set_count=4, shuffle_questions=True)
+    in_order = ExamSetShuffler().build_sets(make_master(), seed=11, set_count=4, shuffle_questions=False)
+    for a, b in zip(shuffled, in_order):
+        options_a = {qno: q.options for qno, q in zip(a["question_order"], a["exam_set"].questions)}
+        options_b = {qno: q.options for qno, q in zip(b["question_order"], b["exam_set"].questions)}
+        assert options_a == options_b
+        keys_a = {qno: a["answer_key"].get(str(position)) for position, qno in enumerate(a["question_order"], start=1)}
+        keys_b = {qno: b["answer_key"].get(str(position)) for position, qno in enumerate(b["question_order"], start=1)}
+        assert keys_a == keys_b
+
+
+def test_remap_answer_uses_the_inverse_permutation():
+    perm = np.array([2, 0, 3, 1])       # new slot k shows master option perm[k]
+    inverse = np.argsort(perm)          # master option j is now in slot inverse[j]
+    assert ExamSetShuffler._remap_answer("A", inverse) == "B"
+    assert ExamSetShuffler._remap_answer("c, b", inverse) == "A,D"
+
+
+def test_batch_permutations_are_permutations():
+    perms = batch_permutations(np.random.default_rng(0), (5, 7, 4))
+    assert perms.shape == (5, 7, 4)
+    assert (np.sort(perms, axis=-1) == np.arange(4)).all()
+
+
+def test_sets_share_one_latex_pass(monkeypatch):
+    renderer = latex_module.latex_renderer
+    calls = []
+    real_process = renderer.process_questions_list
+    monkeypatch.setattr(renderer, "latex_to_svg_matplotlib", lambda expr: f"<svg>{expr}</svg>")
+    monkeypatch.setattr(renderer, "process_questions_list", lambda questions: calls.append(len(questions)) or real_process(questions))
+
+    master = make_master()
+    master.questions[0] = master.questions[0].copy(update={"question": "Solve $$x^2$$", "options": {k: f"$${k}$$" for k in OPTION_KEYS}})
+    generator = PDFGenerator()
+
+    async def html_only(html_content, customization, pages=None):
+        return html_content.encode("utf-8")
+    monkeypatch.setattr(generator, "_html_to_pdf", html_only)
+
+    exam = Exam(title="Test", class_name="Ten", year=2025, question_count=6)
+    sets = asyncio.run(generator.generate_shuffled_sets(exam, master, seed=1, set_count=3))
+    assert calls == [6]
+    for built in sets:
+        html = built["pdf_data"].decode("utf-8")
+        assert "Solve <svg>x^2</svg>" in html and all(f"<svg>{k}</svg>" in html for k in OPTION_KEYS)
+        assert "$$" not in html